@@ -0,0 +1,124 @@
+"""
+Pre-decoded addresses shared by every cache config in a sweep.
+
+_get_set_and_tag does two divisions and a modulo per access, and a sweep repeats
+that identically in every pass. DecodedTrace turns the whole trace into block
+numbers once (a shift when the block size is a power of two, // otherwise);
+set_and_tag(sets) then derives the set index and tag columns for a set count
+with a mask and a shift when it's a power of two (plain % and // otherwise) and
+keeps them, 12 bytes per reference per set count. decode_trace keeps the last
+DecodedTrace per trace and block size, so the WB and WT sweeps of the same
+trace decode it once between them and the second sweep reuses every column.
+"""
+from array import array
+
+_decoded_traces = {}  # (trace digest, block size) -> DecodedTrace, just the last one decode_trace made
+
+
+def log2_exact(n):
+    # log2 of n if n is a power of two, else None
+    return n.bit_length() - 1 if n > 0 and n & (n - 1) == 0 else None
+
+
+class DecodedTrace:
+    """
+    A trace decoded into block numbers for one block size.
+
+    - ops: array('B') of reference types
+    - blocks: array('Q') of address // block_size_bytes
+    """
+
+    def __init__(self, trace_lines, block_size_bytes):
+        self.block_size_bytes = block_size_bytes
+        if hasattr(trace_lines, 'addresses'):
+            # BinaryTrace: the columns are already laid out, no need to go through tuples
+            self.ops = array('B', trace_lines.ops)
+            addresses = trace_lines.addresses
+        else:
+            self.ops, addresses = array('B'), array('Q')
+            for reference_type, address in trace_lines:
+                self.ops.append(reference_type)
+                addresses.append(address)
+
+        shift = log2_exact(block_size_bytes)
+        if shift is not None:
+            self.blocks = array('Q', [address >> shift for address in addresses])
+        else:
+            self.blocks = array('Q', [address // block_size_bytes for address in addresses])
+        self._set_and_tag = {}
+
+    def __len__(self):
+        return len(self.ops)
+
+    def set_and_tag(self, sets):
+        """
+        Returns the (set_indices, tags) columns for a cache with this many sets,
+        computing them on first use and caching them for later configs.
+        """
+        columns = self._set_and_tag.get(sets)
+        if columns is None:
+            bits = log2_exact(sets)
+            if bits is not None:
+                mask = sets - 1
+                columns = (array('I', [block & mask for block in self.blocks]),
+                           array('Q', [block >> bits for block in self.blocks]))
+            else:
+                columns = (array('I', [block % sets for block in self.blocks]),
+                           array('Q', [block // sets for block in self.blocks]))
+            self._set_and_tag[sets] = columns
+        return columns
+
+    def release(self, sets=None):
+        # Drops the cached columns for one set count (or all of them) to free memory
+        if sets is None:
+            self._set_and_tag.clear()
+        else:
+            self._set_and_tag.pop(sets, None)
+
+
+def decode_trace(trace_lines, block_size_bytes):
+    """
+    DecodedTrace(trace_lines, block_size_bytes), reusing the previous one if it was for the same trace
+    (by its source_sha256, so only BinaryTraces and other traces that carry one) and block size.
+    """
+    digest = getattr(trace_lines, 'source_sha256', None)
+    if digest is None:
+        return DecodedTrace(trace_lines, block_size_bytes)
+    key = (digest, block_size_bytes)
+    decoded = _decoded_traces.get(key)
+    if decoded is None:
+        _decoded_traces.clear()  # Only keep one, a decoded trace is 9 bytes per reference plus its columns
+        decoded = _decoded_traces[key] = DecodedTrace(trace_lines, block_size_bytes)
+    return decoded
+
+
+def simulate_decoded(decoded, total_size_bytes, assoc, cache_class):
+    """
+    Replays a DecodedTrace through a fresh L1I/L1D pair of cache_class, calling
+    its read_set_tag/write_set_tag directly instead of decoding each address.
+
+    Returns:
+    - i_hits, i_misses, d_hits, d_misses, counted like WriteBack.simulate_assoc
+      (WriteThrough caches always miss on write, so this matches simulate_trace too)
+    """
+    block_size_bytes = decoded.block_size_bytes
+    sets = total_size_bytes // (block_size_bytes * assoc)
+    set_indices, tags = decoded.set_and_tag(sets)
+    i_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    d_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    i_read, d_read, d_write = i_cache.read_set_tag, d_cache.read_set_tag, d_cache.write_set_tag
+
+    i_hits, i_misses, d_hits, d_misses = 0, 0, 0, 0
+    for reference_type, set_index, tag in zip(decoded.ops, set_indices, tags):
+        if reference_type == 2:  # Instruction read
+            if i_read(set_index, tag):
+                i_hits += 1
+            else:
+                i_misses += 1
+        else:  # Data read/write
+            if d_write(set_index, tag) if reference_type == 1 else d_read(set_index, tag):
+                d_hits += 1
+            else:
+                d_misses += 1
+
+    return i_hits, i_misses, d_hits, d_misses
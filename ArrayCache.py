@@ -0,0 +1,107 @@
+"""
+Compact, array-backed versions of the WriteBackCache and WriteThroughCache.
+
+Instead of one dict per line, the cache state lives in flat typed arrays indexed
+by set_index * blocks_per_set + way: 8-byte tags and LRU stamps plus one byte each
+for the valid and dirty bits (~18 bytes per line). They keep the same
+read/write/load_block API and give the same hits/misses as the dict caches.
+"""
+from array import array
+
+
+class ArrayWriteBackCache:
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        # Same parameters as WriteBackCache; the cache state is allocated as zeroed flat arrays
+        self.total_size_bytes = total_size_bytes
+        self.block_size_bytes = block_size_bytes
+        self.blocks_per_set = blocks_per_set
+        self.sets = total_size_bytes // (block_size_bytes * blocks_per_set)
+        self.lines = self.sets * blocks_per_set
+        self.tags, self.valid, self.dirty, self.lru_counters = self._create_cache()
+        self.access_sequence = 0  # To manage LRU policy, stamped exactly like the dict caches
+        self.write_backs = 0  # Dirty lines evicted back to main memory
+
+    def _create_cache(self):
+        # Tags and LRU stamps as unsigned 64-bit arrays, valid and dirty bits as bytearrays
+        return array('Q', bytes(8 * self.lines)), bytearray(self.lines), bytearray(self.lines), array('Q', bytes(8 * self.lines))
+
+    def _get_set_and_tag(self, address):
+        # Computes set index and tag based on the given memory address
+        set_index = (address // self.block_size_bytes) % self.sets
+        tag = address // (self.block_size_bytes * self.sets)
+        return set_index, tag
+
+    def _find(self, set_index, tag):
+        # Returns the line index holding tag in the set, or -1 if it isn't there
+        base = set_index * self.blocks_per_set
+        tags, valid = self.tags, self.valid
+        for line in range(base, base + self.blocks_per_set):
+            if valid[line] and tags[line] == tag:
+                return line
+        return -1
+
+    def read(self, address):
+        # Updates LRU stamp on hit, calls load_block to fetch and load block if miss
+        return self.read_set_tag(*self._get_set_and_tag(address))
+
+    def read_set_tag(self, set_index, tag):
+        # read() for an address already decoded into set index and tag
+        line = self._find(set_index, tag)
+        if line >= 0:
+            self.lru_counters[line] = self.access_sequence
+            self.access_sequence += 1
+            return True  # Read hit
+        self.load_block(set_index, tag)
+        return False
+
+    def write(self, address):
+        # Marks the block dirty on hit, else loads it dirty
+        return self.write_set_tag(*self._get_set_and_tag(address))
+
+    def write_set_tag(self, set_index, tag):
+        # write() for an address already decoded into set index and tag
+        line = self._find(set_index, tag)
+        if line >= 0:
+            self.dirty[line] = 1
+            self.lru_counters[line] = self.access_sequence
+            self.access_sequence += 1
+            return True  # Write hit
+        self.load_block(set_index, tag, dirty=True)
+        return False
+
+    def load_block(self, set_index, tag, dirty=False):
+        # Replaces the first way with the smallest LRU stamp, the same one min() picks in the dict caches
+        # (invalid ways are 0, and like there the load doesn't advance access_sequence)
+        base = set_index * self.blocks_per_set
+        stamps = self.lru_counters[base:base + self.blocks_per_set]
+        line = base + stamps.index(min(stamps))
+        if self.valid[line] and self.dirty[line]:
+            self.write_back(line)
+        self.valid[line] = 1
+        self.dirty[line] = dirty
+        self.tags[line] = tag
+        self.lru_counters[line] = self.access_sequence
+
+    def write_back(self, line):
+        # Simulate writing the line back to main memory
+        self.dirty[line] = 0
+        self.write_backs += 1
+
+
+class ArrayWriteThroughCache(ArrayWriteBackCache):
+    # Same storage, but writes go through to memory so nothing is ever dirty
+
+    def write_set_tag(self, set_index, tag):
+        # Updates LRU if block is in cache, else loads it. Always counted as a miss for write.
+        line = self._find(set_index, tag)
+        if line >= 0:
+            self.lru_counters[line] = self.access_sequence
+        else:
+            self.load_block(set_index, tag)
+        # Write-through cache: Assume write to main memory here
+        self.access_sequence += 1
+        return False
+
+    def load_block(self, set_index, tag, dirty=False):
+        # Write-through blocks are never dirty, so there is nothing to write back
+        super().load_block(set_index, tag)
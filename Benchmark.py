@@ -0,0 +1,252 @@
+"""
+Throughput benchmark for the cache engines on reproducible synthetic traces.
+
+The course traces aren't in the repo, so the generators below make seeded
+traces with known shapes: sequential, strided, uniform random, a Zipfian hot set
+and a cc/spice/tex-like instruction/data mix. run_benchmarks times each engine
+on each trace across ways and cache sizes, one case per fresh worker process so
+its peak RSS is its own, and saves accesses/sec and peak RSS as JSON under
+BenchResults/. The peak is reset once the trace is built (where Linux allows),
+so 'engine rss kb' is what the engine itself added on top of the trace. compare_results lines two saved runs up and flags slowdowns.
+"""
+import bisect
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+
+import Step3Proper
+import WriteBack
+import WriteThrough
+from ArrayCache import ArrayWriteBackCache
+from LRUCache import LRUWriteBackCache
+
+RESULTS_DIR = 'BenchResults'
+
+
+# ---------------------------------------------------------- synthetic traces
+
+def sequential_trace(n, seed=0, start=0x10000, step=4):
+    # Data reads walking straight through memory
+    return [(0, start + i * step) for i in range(n)]
+
+
+def strided_trace(n, seed=0, start=0x10000, stride=256, footprint=1 << 20):
+    # Data reads with a fixed large stride, wrapping inside the footprint (conflict heavy)
+    return [(0, start + (i * stride) % footprint) for i in range(n)]
+
+
+def random_trace(n, seed=0, footprint=1 << 24, write_fraction=0.3):
+    # Uniformly random data reads/writes over the footprint
+    rng = random.Random(seed)
+    return [(1 if rng.random() < write_fraction else 0, rng.randrange(footprint) & ~3) for _ in range(n)]
+
+
+def zipf_trace(n, seed=0, blocks=4096, exponent=1.1, block_size=32, write_fraction=0.3):
+    # Data reads/writes to a hot set of blocks whose popularity follows a Zipf law
+    rng = random.Random(seed)
+    cumulative = list(accumulate(1 / (rank ** exponent) for rank in range(1, blocks + 1)))
+    base = [rng.randrange(1 << 20) * block_size for _ in range(blocks)]  # Scatter the hot blocks
+    trace = []
+    for _ in range(n):
+        block = bisect.bisect(cumulative, rng.random() * cumulative[-1])
+        trace.append((1 if rng.random() < write_fraction else 0, base[min(block, blocks - 1)] + rng.randrange(block_size)))
+    return trace
+
+
+def mixed_trace(n, seed=0, instruction_fraction=0.75, write_fraction=0.35):
+    # cc/spice/tex-like mix: mostly sequential instruction fetch with branches,
+    # data split between a hot stack and a larger heap
+    rng = random.Random(seed)
+    pc, stack = 0x400000, 0x7fff0000
+    trace = []
+    for _ in range(n):
+        if rng.random() < instruction_fraction:
+            pc = pc + 4 if rng.random() < 0.9 else 0x400000 + rng.randrange(1 << 16) * 4
+            trace.append((2, pc))
+        else:
+            op = 1 if rng.random() < write_fraction else 0
+            if rng.random() < 0.6:
+                address = stack - rng.randrange(256) * 4
+            else:
+                address = 0x10000000 + rng.randrange(1 << 18) * 4
+            trace.append((op, address))
+    return trace
+
+
+GENERATORS = {
+    'sequential': sequential_trace,
+    'strided': strided_trace,
+    'random': random_trace,
+    'zipf': zipf_trace,
+    'mixed': mixed_trace,
+}
+
+
+def write_trace(file_path, trace_lines):
+    # Saves a trace in the same text format as traces/*.trace
+    with open(file_path, 'w') as file:
+        for reference_type, address in trace_lines:
+            file.write(f"{reference_type} {address:x}\n")
+    return file_path
+
+
+# ---------------------------------------------------------- engines
+
+def _run_step3(trace_lines, total_size_bytes, block_size_bytes, assoc):
+    # Step3Proper only handles data references, instruction fetches fall through access_cache
+    cache = Step3Proper.WriteBackCache(total_size_bytes, block_size_bytes, assoc)
+    start = time.perf_counter()
+    for reference_type, address in trace_lines:
+        cache.access_cache(reference_type, address)
+    return time.perf_counter() - start
+
+
+def _run_writeback(cache_class):
+    def run(trace_lines, total_size_bytes, block_size_bytes, assoc):
+        start = time.perf_counter()
+        WriteBack.simulate_assoc(trace_lines, total_size_bytes, block_size_bytes, assoc, cache_class)
+        return time.perf_counter() - start
+    return run
+
+
+def _run_writethrough(trace_lines, total_size_bytes, block_size_bytes, assoc):
+    simulation = WriteThrough.CacheSimulation(total_size_bytes, block_size_bytes)
+    start = time.perf_counter()
+    simulation.simulate_trace(assoc, trace_lines)
+    return time.perf_counter() - start
+
+
+ENGINES = {
+    'WriteBackCache': _run_writeback(WriteBack.WriteBackCache),
+    'WriteThroughCache': _run_writethrough,
+    'Step3Proper.WriteBackCache': _run_step3,
+    'ArrayWriteBackCache': _run_writeback(ArrayWriteBackCache),
+    'LRUWriteBackCache': _run_writeback(LRUWriteBackCache),
+}
+
+
+# ---------------------------------------------------------- runner
+
+def _reset_peak_rss():
+    # Starts a new high-water mark if the kernel allows it (Linux 4.0+), returns the current RSS in KiB or None
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return _status_kb('VmRSS')
+    except OSError:
+        return None
+
+
+def _status_kb(field):
+    # A KiB field of /proc/self/status, e.g. VmRSS or VmHWM
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise OSError(f"No {field} in /proc/self/status")
+
+
+def run_case(engine, trace_name, accesses, seed, total_size_bytes, block_size_bytes, assoc):
+    # Runs in a fresh worker: builds the trace, times one pass, reports throughput and peak RSS
+    trace_lines = GENERATORS[trace_name](accesses, seed)
+    # The generators' temporaries would set the peak, so the engine's share is measured from here
+    baseline_kb = _reset_peak_rss()
+    if baseline_kb is None:
+        baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Can't reset, only growth past it shows
+    seconds = ENGINES[engine](trace_lines, total_size_bytes, block_size_bytes, assoc)
+    try:
+        peak_kb = _status_kb('VmHWM')
+    except OSError:
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    return {
+        'engine': engine,
+        'trace': trace_name,
+        'accesses': accesses,
+        'size': total_size_bytes,
+        'block size': block_size_bytes,
+        'assoc': assoc,
+        'seconds': round(seconds, 6),
+        'accesses per sec': round(accesses / seconds) if seconds else None,
+        'peak rss kb': peak_kb,  # Whole worker, the built trace included
+        'engine rss kb': max(0, peak_kb - baseline_kb),  # Peak growth while the engine ran
+    }
+
+
+def run_benchmarks(engines=None, traces=None, associativities=(1, 4, 32), cache_sizes=(1024, 16384),
+                   block_sizes=(32,), accesses=200000, seed=429, output=None):
+    """
+    Times every engine x trace x config combination and saves the results as JSON.
+
+    Returns:
+    - The path of the JSON results file
+    """
+    engines = engines or list(ENGINES)
+    traces = traces or list(GENERATORS)
+    cases = []
+    for engine in engines:
+        for trace_name in traces:
+            for total_size_bytes in cache_sizes:
+                for block_size_bytes in block_sizes:
+                    for assoc in associativities:
+                        if total_size_bytes >= block_size_bytes * assoc:
+                            cases.append((engine, trace_name, accesses, seed, total_size_bytes, block_size_bytes, assoc))
+
+    results = []
+    for case in cases:
+        # One process per case, so ru_maxrss isn't left over from an earlier case
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(run_case, *case).result()
+        rate = result['accesses per sec']
+        rate = 'n/a' if rate is None else rate  # The case ran too fast for the timer
+        print(f"{result['engine']:>28} {result['trace']:>10} size={result['size']:<6} assoc={result['assoc']:<3} "
+              f"{rate:>10} acc/s {result['engine rss kb']:>8} KiB")
+        results.append(result)
+
+    output = output or os.path.join(RESULTS_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump({
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'results': results,
+        }, file, indent=2)
+    print(f"Results have been written to {output}")
+    return output
+
+
+def compare_results(baseline_path, current_path, threshold=0.10):
+    """
+    Compares two benchmark JSON files case by case.
+
+    Returns:
+    - A list of (case, baseline acc/s, current acc/s, change) for every case that got
+      more than threshold slower
+    """
+    def by_case(path):
+        with open(path) as file:
+            results = json.load(file)['results']
+        return {(r['engine'], r['trace'], r['accesses'], r['size'], r['block size'], r['assoc']): r for r in results}
+
+    baseline, current = by_case(baseline_path), by_case(current_path)
+    regressions = []
+    for case in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[case]['accesses per sec'], current[case]['accesses per sec']
+        if old and new:
+            change = new / old - 1
+            if change < -threshold:
+                regressions.append((case, old, new, change))
+                print(f"REGRESSION {case}: {old} -> {new} acc/s ({change:+.1%})")
+    return regressions
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        sys.exit(1 if compare_results(sys.argv[1], sys.argv[2]) else 0)
+    run_benchmarks()
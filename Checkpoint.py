@@ -0,0 +1,253 @@
+"""
+Checkpoint and resume for long trace replays.
+
+A checkpoint is the full state of a set of dict-based caches (WriteBackCache or
+WriteThroughCache) plus the trace offset reached and the running counters, in
+one compact binary file:
+
+    header | counters (uint64 each) | per cache: cache header | flags (uint8 per block)
+           | tags (uint64 per block) | lru counters (uint64 per block)
+
+simulate_checkpointed saves one every `interval` references (atomically, so a
+crash mid-save leaves the previous one intact) and picks up from it when run
+again, giving the same final counts as an uninterrupted run. A checkpoint
+records the trace's SHA-256 (hashed from the references when the trace doesn't
+carry one) and whether the run finished; resuming on another trace, on a trace
+whose digest can't be had without consuming it, or from a finished run raises
+instead of reusing the old state. simulate_warm loads a checkpoint's caches as
+they were and simulates just a region of interest with fresh counters, so
+warm-up doesn't have to be re-run for every experiment.
+"""
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from itertools import islice
+
+import WriteBack
+import WriteThrough
+
+MAGIC = b'CCKP'
+VERSION = 1
+HEADER = struct.Struct('<4sHBBHHQI32s')  # magic, version, big-endian flag, finished flag, caches, counters, trace offset, crc32, trace sha256
+CACHE_HEADER = struct.Struct('<32sQQQQQ')  # class name, total size, block size, blocks per set, access_sequence, write_backs
+VALID, DIRTY, HAS_TAG = 1, 2, 4  # Block flag bits; HAS_TAG keeps a None tag apart from tag 0
+CACHE_CLASSES = {cache_class.__name__: cache_class for cache_class in (WriteBack.WriteBackCache, WriteThrough.WriteThroughCache)}
+NO_DIGEST = bytes(32)  # Saved when the trace's digest is unknown, never matches on resume
+HASH_CHUNK = 1 << 16  # References packed per hash update for list traces
+
+
+def _cache_state(cache):
+    # Flattens one cache into its header and (flags, tags, lru counters) columns
+    flags, tags, lru_counters = bytearray(), array('Q'), array('Q')
+    for cache_set in cache.cache:
+        for block in cache_set:
+            flags.append((VALID if block['valid'] else 0) | (DIRTY if block.get('dirty') else 0) |
+                         (HAS_TAG if block['tag'] is not None else 0))
+            tags.append(block['tag'] or 0)
+            lru_counters.append(block['lru_counter'])
+    header = CACHE_HEADER.pack(type(cache).__name__.encode(), cache.total_size_bytes, cache.block_size_bytes,
+                               cache.blocks_per_set, cache.access_sequence, cache.write_backs)
+    return header, flags, tags, lru_counters
+
+
+def save_checkpoint(checkpoint_path, caches, offset, counters, trace_sha256=NO_DIGEST, finished=False):
+    """
+    Atomically writes a checkpoint.
+
+    Args:
+    - caches: The caches to save, e.g. [i_cache, d_cache]
+    - offset: How many trace references have been simulated
+    - counters: The running counters, e.g. [i_hits, i_misses, d_hits, d_misses]
+    - trace_sha256: Digest of the trace, checked again on resume
+    - finished: The whole trace has been simulated, so there is nothing to resume
+    """
+    body = [array('Q', counters).tobytes()]
+    for cache in caches:
+        header, flags, tags, lru_counters = _cache_state(cache)
+        body += [header, bytes(flags), tags.tobytes(), lru_counters.tobytes()]
+    crc = 0
+    for chunk in body:
+        crc = zlib.crc32(chunk, crc)
+
+    directory = os.path.dirname(os.path.abspath(checkpoint_path))
+    out_fd, out_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(out_fd, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, VERSION, sys.byteorder == 'big', finished, len(caches), len(counters), offset, crc, trace_sha256))
+            for chunk in body:
+                out.write(chunk)
+        os.chmod(out_path, 0o644)  # mkstemp files are owner-only
+        os.replace(out_path, checkpoint_path)
+    except BaseException:
+        os.unlink(out_path)
+        raise
+    return checkpoint_path
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Reads a checkpoint back into live caches.
+
+    Returns:
+    - (caches, offset, counters, trace_sha256, finished)
+    """
+    with open(checkpoint_path, 'rb') as file:
+        data = memoryview(file.read())
+    magic, version, big_endian, finished, cache_count, counter_count, offset, crc, trace_sha256 = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{checkpoint_path} is not a cache checkpoint")
+    if zlib.crc32(data[HEADER.size:]) != crc:
+        raise ValueError(f"{checkpoint_path} failed its checksum")
+    swap = big_endian != (sys.byteorder == 'big')
+
+    def read_column(position, count):
+        column = array('Q')
+        column.frombytes(data[position:position + 8 * count])
+        if swap:
+            column.byteswap()
+        return column, position + 8 * count
+
+    counters, position = read_column(HEADER.size, counter_count)
+    caches = []
+    for _ in range(cache_count):
+        name, total_size_bytes, block_size_bytes, blocks_per_set, access_sequence, write_backs = CACHE_HEADER.unpack_from(data, position)
+        position += CACHE_HEADER.size
+        cache_class = CACHE_CLASSES[name.rstrip(b'\0').decode()]
+        cache = cache_class(total_size_bytes, block_size_bytes, blocks_per_set)
+        blocks = cache.sets * blocks_per_set
+        flags = data[position:position + blocks]
+        tags, position = read_column(position + blocks, blocks)
+        lru_counters, position = read_column(position, blocks)
+        index = 0
+        for cache_set in cache.cache:
+            for block in cache_set:
+                block['valid'] = bool(flags[index] & VALID)
+                if 'dirty' in block:  # WriteThroughCache blocks have no dirty bit
+                    block['dirty'] = bool(flags[index] & DIRTY)
+                block['tag'] = tags[index] if flags[index] & HAS_TAG else None
+                block['lru_counter'] = lru_counters[index]
+                index += 1
+        cache.access_sequence = access_sequence
+        cache.write_backs = write_backs
+        caches.append(cache)
+    return caches, offset, list(counters), bytes(trace_sha256), bool(finished)
+
+
+def trace_digest(trace_lines):
+    """
+    SHA-256 identifying a trace: the digest it carries (BinaryTrace.source_sha256), else one
+    hashed from its references for a BinaryTrace without one or a list/tuple of them.
+
+    Returns:
+    - The digest, or None for a trace that can only be iterated once (e.g. a TraceStream)
+    """
+    digest = getattr(trace_lines, 'source_sha256', None)
+    if digest and digest != NO_DIGEST:
+        return digest
+    ops_hash, addresses_hash = hashlib.sha256(), hashlib.sha256()
+    if hasattr(trace_lines, 'addresses'):
+        ops_hash.update(trace_lines.ops)
+        addresses_hash.update(trace_lines.addresses)
+    elif isinstance(trace_lines, (list, tuple)):
+        for start in range(0, len(trace_lines), HASH_CHUNK):
+            chunk = trace_lines[start:start + HASH_CHUNK]
+            ops_hash.update(bytes(reference_type for reference_type, _ in chunk))
+            addresses_hash.update(array('Q', [address for _, address in chunk]).tobytes())
+    else:
+        return None
+    return hashlib.sha256(ops_hash.digest() + addresses_hash.digest()).digest()
+
+
+def _trace_from(trace_lines, offset):
+    # The trace's references from offset on, without building tuples for the skipped part when it can
+    if offset and hasattr(trace_lines, 'addresses'):
+        return zip(trace_lines.ops[offset:], trace_lines.addresses[offset:])
+    return islice(iter(trace_lines), offset, None)
+
+
+def run_region(i_cache, d_cache, trace_lines, counters):
+    """
+    Feeds references to an L1I/L1D pair, counting like WriteBack.simulate_assoc.
+
+    Args:
+    - counters: [i_hits, i_misses, d_hits, d_misses], updated in place
+
+    Returns:
+    - The number of references simulated
+    """
+    accessors = (d_cache.read, d_cache.write, i_cache.read)  # Indexed by reference type
+    offsets = (2, 2, 0)  # Where the hit counter for each reference type is; the miss counter is next to it
+    processed = 0
+    for reference_type, address in trace_lines:
+        if accessors[reference_type](address):
+            counters[offsets[reference_type]] += 1
+        else:
+            counters[offsets[reference_type] + 1] += 1
+        processed += 1
+    return processed
+
+
+def simulate_checkpointed(trace_lines, total_size_bytes, block_size_bytes, assoc, checkpoint_path,
+                          interval=1000000, cache_class=WriteBack.WriteBackCache):
+    """
+    WriteBack.simulate_assoc that saves a checkpoint every interval references and,
+    if checkpoint_path already exists, resumes from it instead of starting over.
+
+    Returns:
+    - i_hits, i_misses, d_hits, d_misses
+
+    Raises ValueError if the checkpoint is from another trace or cache config, from a run
+    that finished, or the trace has no digest to check it against (see trace_digest).
+    """
+    trace_sha256 = trace_digest(trace_lines)
+    if os.path.exists(checkpoint_path):
+        if trace_sha256 is None:
+            raise ValueError(f"Can't tell whether {checkpoint_path} was taken on this trace, it has no digest; "
+                             f"pass a list or BinaryTrace, or delete the checkpoint to start over")
+        (i_cache, d_cache), offset, counters, saved_sha256, finished = load_checkpoint(checkpoint_path)
+        if saved_sha256 != trace_sha256:
+            raise ValueError(f"{checkpoint_path} was taken on a different trace")
+        config = (type(i_cache), i_cache.total_size_bytes, i_cache.block_size_bytes, i_cache.blocks_per_set)
+        if config != (cache_class, total_size_bytes, block_size_bytes, assoc):
+            raise ValueError(f"{checkpoint_path} was taken with a different cache config {config}")
+        if finished:
+            raise ValueError(f"{checkpoint_path} is from a run that already finished ({offset} references); "
+                             f"delete it to simulate again, or use simulate_warm on it")
+    else:
+        i_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+        d_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+        offset, counters = 0, [0, 0, 0, 0]
+    trace_sha256 = trace_sha256 or NO_DIGEST
+
+    remaining = _trace_from(trace_lines, offset)
+    while True:
+        processed = run_region(i_cache, d_cache, islice(remaining, interval), counters)
+        if not processed:
+            break
+        offset += processed
+        save_checkpoint(checkpoint_path, (i_cache, d_cache), offset, counters, trace_sha256)
+    save_checkpoint(checkpoint_path, (i_cache, d_cache), offset, counters, trace_sha256, finished=True)
+
+    return tuple(counters)
+
+
+def simulate_warm(checkpoint_path, trace_lines, start=None, stop=None):
+    """
+    Loads the caches from a checkpoint and simulates only trace references [start, stop),
+    start defaulting to where the checkpoint left off. Counters start from zero.
+
+    Returns:
+    - i_hits, i_misses, d_hits, d_misses for the region
+    """
+    (i_cache, d_cache), offset, _, _, _ = load_checkpoint(checkpoint_path)
+    start = offset if start is None else start
+    region = _trace_from(trace_lines, start)
+    if stop is not None:
+        region = islice(region, stop - start)
+    counters = [0, 0, 0, 0]
+    run_region(i_cache, d_cache, region, counters)
+    return tuple(counters)
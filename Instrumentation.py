@@ -0,0 +1,187 @@
+"""
+Opt-in per-set instrumentation for the WriteBackCache.
+
+InstrumentedWriteBackCache is a drop-in subclass that records, in preallocated
+arrays, per-set accesses, misses, evictions and dirty write-backs, a histogram
+of the LRU stack position of every hit (0 = most recently used way) and a log2
+histogram of eviction ages (cache accesses since the victim was last touched).
+Simulations only pay for this when they build this class; the plain
+WriteBackCache is untouched. The counters come out of the same scan of the set
+that makes the hit/miss decision, and the same min() that picks the victim.
+
+SetStats exports the counters as a per-set CSV, an NPZ (if NumPy is
+installed) or a sets-folded-into-rows heatmap CSV for spotting hot sets.
+"""
+import csv
+import os
+from array import array
+
+from WriteBack import WriteBackCache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+AGE_BUCKETS = 64  # Bucket b holds ages in [2**(b-1), 2**b), bucket 0 holds age 0
+SET_FIELDNAMES = ['Set', 'Accesses', 'Misses', 'Miss rate', 'Evictions', 'Write backs']
+
+
+class SetStats:
+    def __init__(self, sets, ways):
+        # All counters are allocated up front so recording never grows anything
+        self.sets = sets
+        self.ways = ways
+        self.accesses = array('Q', bytes(8 * sets))
+        self.misses = array('Q', bytes(8 * sets))
+        self.evictions = array('Q', bytes(8 * sets))
+        self.write_backs = array('Q', bytes(8 * sets))
+        self.hit_positions = array('Q', bytes(8 * ways))
+        self.eviction_ages = array('Q', bytes(8 * AGE_BUCKETS))
+
+    def miss_rates(self):
+        return [misses / accesses if accesses else 0 for accesses, misses in zip(self.accesses, self.misses)]
+
+    def write_csv(self, csv_filename):
+        # One row per set
+        with open(csv_filename, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=SET_FIELDNAMES)
+            writer.writeheader()
+            for set_index, miss_rate in enumerate(self.miss_rates()):
+                writer.writerow({
+                    'Set': set_index,
+                    'Accesses': self.accesses[set_index],
+                    'Misses': self.misses[set_index],
+                    'Miss rate': f"{miss_rate:.4f}",
+                    'Evictions': self.evictions[set_index],
+                    'Write backs': self.write_backs[set_index]
+                })
+        return csv_filename
+
+    def write_heatmap_csv(self, csv_filename, metric='misses', width=32):
+        # Lays the sets out row-major, width sets per row, so hot regions of the index space stand out
+        values = self.miss_rates() if metric == 'miss rate' else list(getattr(self, metric))
+        with open(csv_filename, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            for start in range(0, self.sets, width):
+                writer.writerow(values[start:start + width])
+        return csv_filename
+
+    def write_npz(self, npz_filename):
+        # Every counter array under its own name
+        if numpy is None:
+            raise RuntimeError("Writing NPZ files needs NumPy; use write_csv instead")
+        numpy.savez(npz_filename, **{name: numpy.frombuffer(getattr(self, name), dtype=numpy.uint64)
+                                     for name in ('accesses', 'misses', 'evictions', 'write_backs', 'hit_positions', 'eviction_ages')})
+        return npz_filename
+
+
+class InstrumentedWriteBackCache(WriteBackCache):
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        super().__init__(total_size_bytes, block_size_bytes, blocks_per_set)
+        self.stats = SetStats(self.sets, blocks_per_set)
+
+    def _access(self, set_index, tag, write):
+        # WriteBackCache's read/write with the stats taken in the same scan of the set that finds the block
+        stats = self.stats
+        stats.accesses[set_index] += 1
+        found = None
+        newer = 0  # Ways with a later stamp than the hit block, i.e. its LRU stack position
+        earlier_stamps = []
+        for block in self.cache[set_index]:
+            if found is None:
+                if block['valid'] and block['tag'] == tag:
+                    found = block
+                    stamp = block['lru_counter']
+                    newer = sum(1 for other in earlier_stamps if other > stamp)
+                else:
+                    earlier_stamps.append(block['lru_counter'])
+            elif block['lru_counter'] > stamp:
+                newer += 1
+        if found is None:
+            stats.misses[set_index] += 1
+            self.load_block(set_index, tag, dirty=write)
+            return False
+        stats.hit_positions[newer] += 1
+        if write:
+            found['dirty'] = True
+        found['lru_counter'] = self.access_sequence
+        self.access_sequence += 1
+        return True
+
+    def read_set_tag(self, set_index, tag):
+        return self._access(set_index, tag, False)
+
+    def write_set_tag(self, set_index, tag):
+        return self._access(set_index, tag, True)
+
+    def load_block(self, set_index, tag, dirty=False):
+        # WriteBackCache.load_block, counting the victim from the same min() that picks it
+        victim = min(self.cache[set_index], key=lambda x: x['lru_counter'])
+        if victim['valid']:
+            stats = self.stats
+            stats.evictions[set_index] += 1
+            stats.eviction_ages[min((self.access_sequence - victim['lru_counter']).bit_length(), AGE_BUCKETS - 1)] += 1
+            if victim['dirty']:
+                stats.write_backs[set_index] += 1
+                self.write_back(victim)
+        victim['valid'] = True
+        victim['dirty'] = dirty
+        victim['tag'] = tag
+        victim['lru_counter'] = self.access_sequence
+
+
+def simulate_instrumented(trace_lines, total_size_bytes, block_size_bytes, assoc):
+    """
+    WriteBack.simulate_assoc with instrumented caches.
+
+    Returns:
+    - (i_hits, i_misses, d_hits, d_misses), and the SetStats of the I and D caches
+    """
+    i_cache = InstrumentedWriteBackCache(total_size_bytes, block_size_bytes, assoc)
+    d_cache = InstrumentedWriteBackCache(total_size_bytes, block_size_bytes, assoc)
+
+    i_hits, i_misses, d_hits, d_misses = 0, 0, 0, 0
+
+    for reference_type, address in trace_lines:
+        if reference_type == 2:  # Instruction read
+            if i_cache.read(address):
+                i_hits += 1
+            else:
+                i_misses += 1
+        else:  # Data read/write
+            if d_cache.write(address) if reference_type == 1 else d_cache.read(address):
+                d_hits += 1
+            else:
+                d_misses += 1
+
+    return (i_hits, i_misses, d_hits, d_misses), i_cache.stats, d_cache.stats
+
+
+def instrument_trace(trace_name, associativities=(1, 2, 4, 8, 16, 32), total_size_bytes=1024, block_size_bytes=32,
+                     output_dir='SetResults', trace_lines=None):
+    """
+    Writes the per-set CSV and a miss heatmap for the L1I and L1D at each associativity.
+
+    Returns:
+    - {assoc: (counts, i_stats, d_stats)}
+    """
+    if trace_lines is None:
+        from TraceFormat import load_trace
+        trace_lines = load_trace(f"traces/{trace_name}.trace")
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = {}
+    for assoc in associativities:
+        counts, i_stats, d_stats = simulate_instrumented(trace_lines, total_size_bytes, block_size_bytes, assoc)
+        for cache_name, stats in (('l1i', i_stats), ('l1d', d_stats)):
+            stats.write_csv(os.path.join(output_dir, f"{trace_name}_{cache_name}_sets_{assoc}.csv"))
+            stats.write_heatmap_csv(os.path.join(output_dir, f"{trace_name}_{cache_name}_heatmap_{assoc}.csv"))
+        results[assoc] = (counts, i_stats, d_stats)
+    print(f"Per-set results have been written to {output_dir}/")
+    return results
+
+
+if __name__ == '__main__':
+    filename = 'tex'  # Write 'cc', 'spice', or 'tex' here to change trace
+    instrument_trace(filename)
@@ -0,0 +1,281 @@
+"""
+Interval statistics streamed out while a simulation runs, and a live progress line.
+
+The scripts only report totals at the end, which averages phase behaviour away
+and says nothing about how far through a long run we are. Here:
+- IntervalWriter appends one row per interval to a CSV or NDJSON file (by
+  extension) and flushes it, so the file can be tailed or plotted mid-run. An
+  existing CSV is appended to without repeating its header.
+- simulate_intervals replays a trace through an L1I/L1D pair like
+  WriteBack.simulate_assoc and writes the hits, misses, write-backs, hit rates
+  and AMATs of every `every` references. It works in chunks, so there is no
+  per-reference bookkeeping.
+- timing_intervals drives a Timing.TimingModel and writes the counters of every
+  `every_cycles` simulated cycles.
+- ProgressTrace wraps any trace and prints a progress line with references/sec
+  (and % done and ETA when the length is known) to stderr as it's iterated, so
+  it works with any engine that reads the trace, e.g.
+  WBCacheSimulation('tex', trace_lines=ProgressTrace(load_trace('traces/tex.trace'))).
+"""
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from WriteBack import WriteBackCache
+
+FIELDNAMES = ['Assoc.', 'References', 'L1I hits', 'L1I misses', 'L1D hits', 'L1D misses', 'Write-backs', 'L1I hit rate',
+              'L1D hit rate', 'L1I AMAT', 'L1D AMAT', 'Elapsed seconds']
+TIMING_COUNTERS = ['References', 'Fetch stall', 'Load stall', 'MSHR full stall', 'Writeback full stall', 'MSHR merges',
+                   'L1I misses', 'L1D misses', 'L2 misses', 'DRAM bytes read', 'DRAM bytes written']
+TIMING_FIELDNAMES = ['Cycle'] + TIMING_COUNTERS + ['Cycles per reference', 'Elapsed seconds']
+
+
+class ProgressLine:
+    # A \r-rewritten status line on stderr, redrawn at most every min_interval seconds
+
+    def __init__(self, total=None, label='', min_interval=0.5, stream=sys.stderr):
+        self.total = total
+        self.label = label
+        self.min_interval = min_interval
+        self.stream = stream
+        self.start = time.perf_counter()
+        self._last_draw = 0.0
+
+    def update(self, done, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last_draw < self.min_interval:
+            return
+        self._last_draw = now
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed else 0
+        line = f"{self.label}{done:,} references, {rate:,.0f}/s"
+        if self.total:
+            remaining = (self.total - done) / rate if rate else 0
+            line += f", {100 * done / self.total:.1f}% done, ETA {remaining:.0f}s"
+        self.stream.write('\r' + line.ljust(78))
+        self.stream.flush()
+
+    def finish(self, done):
+        self.update(done, force=True)
+        self.stream.write('\n')
+        self.stream.flush()
+
+
+class ProgressTrace:
+    """
+    Re-iterable wrapper that reports progress every `every` references while it's iterated.
+    Keeps the trace's len() and source_sha256, so ResultStore and Step5WB's L1 cache still work.
+    """
+
+    def __init__(self, trace_lines, every=1 << 16, label=''):
+        self.trace_lines = trace_lines
+        self.every = every
+        self.label = label
+        self.source_sha256 = getattr(trace_lines, 'source_sha256', None)
+        self.passes = 0
+
+    def __len__(self):
+        return len(self.trace_lines)
+
+    def __iter__(self):
+        self.passes += 1
+        try:
+            total = len(self.trace_lines)
+        except TypeError:
+            total = None
+        progress = ProgressLine(total, f"{self.label}pass {self.passes}: ")
+        references = iter(self.trace_lines)
+        done = 0
+        while True:
+            chunk = list(islice(references, self.every))
+            if not chunk:
+                break
+            yield from chunk
+            done += len(chunk)
+            progress.update(done)
+        progress.finish(done)
+
+
+class IntervalWriter:
+    """
+    Append-only interval output: NDJSON for .ndjson/.jsonl paths, CSV otherwise.
+    path=None writes nothing (for a progress line on its own).
+    """
+
+    def __init__(self, path, fieldnames, progress=False, total_references=None):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.progress = ProgressLine(total_references) if progress else None
+        self.start = time.perf_counter()
+        self.rows = 0
+        self._file = None
+        if path is not None:
+            self.ndjson = path.endswith(('.ndjson', '.jsonl'))
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+            self._file = open(path, 'a', newline='')
+            if not self.ndjson:
+                self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+                if new_file:
+                    self._writer.writeheader()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def write(self, row, references=None):
+        # Appends one interval row and flushes it; references moves the progress line on
+        self.rows += 1
+        if self._file is not None:
+            if self.ndjson:
+                self._file.write(json.dumps(row) + '\n')
+            else:
+                self._writer.writerow(row)
+            self._file.flush()
+        if self.progress is not None and references is not None:
+            self.progress.update(references)
+
+    def close(self, references=None):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.progress is not None and references is not None:
+            self.progress.finish(references)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def simulate_intervals(trace_lines, total_size_bytes, block_size_bytes, assoc, writer, every=100000, hit_time=1,
+                       miss_penalty=100, cache_class=WriteBackCache, progress_offset=0):
+    """
+    simulate_assoc that writes a row of FIELDNAMES to writer (an IntervalWriter) every `every` references.
+    The counts in a row are for that interval only; References is where the interval ends.
+    progress_offset is added to the position the progress line shows, for several runs sharing one writer.
+
+    Returns:
+    - i_hits, i_misses, d_hits, d_misses over the whole trace
+    """
+    i_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    d_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    totals = [0, 0, 0, 0]
+    references = 0
+    last_write_backs = 0
+    trace = iter(trace_lines)
+
+    while True:
+        chunk = list(islice(trace, every))
+        if not chunk:
+            break
+        i_hits, i_misses, d_hits, d_misses = 0, 0, 0, 0
+        for reference_type, address in chunk:
+            if reference_type == 2:  # Instruction read
+                if i_cache.read(address):
+                    i_hits += 1
+                else:
+                    i_misses += 1
+            else:  # Data read/write
+                if d_cache.write(address) if reference_type == 1 else d_cache.read(address):
+                    d_hits += 1
+                else:
+                    d_misses += 1
+        references += len(chunk)
+        for index, count in enumerate((i_hits, i_misses, d_hits, d_misses)):
+            totals[index] += count
+
+        write_backs = getattr(i_cache, 'write_backs', 0) + getattr(d_cache, 'write_backs', 0)
+        i_miss_rate = i_misses / (i_hits + i_misses) if (i_hits + i_misses) else 0
+        d_miss_rate = d_misses / (d_hits + d_misses) if (d_hits + d_misses) else 0
+        writer.write({
+            'Assoc.': assoc,
+            'References': references,
+            'L1I hits': i_hits,
+            'L1I misses': i_misses,
+            'L1D hits': d_hits,
+            'L1D misses': d_misses,
+            'Write-backs': write_backs - last_write_backs if hasattr(d_cache, 'write_backs') else '',
+            'L1I hit rate': f"{1 - i_miss_rate if (i_hits + i_misses) else 0:.4f}",
+            'L1D hit rate': f"{1 - d_miss_rate if (d_hits + d_misses) else 0:.4f}",
+            'L1I AMAT': f"{hit_time + i_miss_rate * miss_penalty:.2f}",
+            'L1D AMAT': f"{hit_time + d_miss_rate * miss_penalty:.2f}",
+            'Elapsed seconds': f"{writer.elapsed():.2f}"
+        }, progress_offset + references)
+        last_write_backs = write_backs
+
+    return tuple(totals)
+
+
+def timing_intervals(model, trace_lines, writer, every_cycles=1000000):
+    """
+    Runs a Timing.TimingModel over the trace, writing a row of TIMING_FIELDNAMES to writer every
+    `every_cycles` simulated cycles (checked after each reference, so a row can end a little past the mark),
+    and one for whatever is left at the end.
+
+    Returns:
+    - model.results() for the whole trace
+    """
+    def write_row(last_cycle, last):
+        current = model.results()
+        row = {field: current[field] - last[field] for field in TIMING_COUNTERS}
+        row['Cycle'] = model.now
+        row['Cycles per reference'] = f"{(model.now - last_cycle) / row['References'] if row['References'] else 0:.3f}"
+        row['Elapsed seconds'] = f"{writer.elapsed():.2f}"
+        writer.write(row, current['References'])
+        return model.now, current
+
+    access = model.access
+    next_sample = every_cycles
+    last_cycle, last = 0, model.results()
+    for reference_type, address in trace_lines:
+        access(reference_type, address)
+        if model.now >= next_sample:
+            last_cycle, last = write_row(last_cycle, last)
+            next_sample = (model.now // every_cycles + 1) * every_cycles
+    if model.references > last['References']:
+        write_row(last_cycle, last)  # The partial interval at the end
+    return model.results()
+
+
+def interval_sweep(trace_name, associativities=(1, 2, 4, 8, 16, 32), every=100000, write_through=False,
+                   output=None, progress=True, total_size_bytes=1024, block_size_bytes=32, trace_lines=None):
+    """
+    Streams interval rows for each associativity into one file, by default
+    WBResults/<trace>_wb_intervals.csv (WTResults/..._wt_... for write-through); pass a .ndjson path for NDJSON.
+    The file is appended to, so delete it first for a fresh run.
+    """
+    if trace_lines is None:
+        from TraceFormat import load_trace
+        trace_lines = load_trace(f"traces/{trace_name}.trace")
+    if write_through:
+        from WriteThrough import WriteThroughCache as cache_class
+        output = output or f"WTResults/{trace_name}_wt_intervals.csv"
+    else:
+        cache_class = WriteBackCache
+        output = output or f"WBResults/{trace_name}_wb_intervals.csv"
+    try:
+        total = len(trace_lines) * len(associativities)
+    except TypeError:
+        total = None
+
+    done = 0
+    with IntervalWriter(output, FIELDNAMES, progress, total) as writer:
+        for assoc in associativities:
+            counts = simulate_intervals(trace_lines, total_size_bytes, block_size_bytes, assoc, writer, every,
+                                        cache_class=cache_class, progress_offset=done)
+            done += sum(counts)
+        writer.close(done)
+
+    print(f"Results have been written to {output}")
+    return output
+
+
+if __name__ == '__main__':
+    filename = 'tex'  # Write 'cc', 'spice', or 'tex' here to change trace
+    interval_sweep(filename)
@@ -0,0 +1,150 @@
+"""
+O(1) LRU versions of the WriteBackCache and WriteThroughCache for high associativity.
+
+The dict caches scan every way to find a tag and again (min over lru_counter) to
+pick a victim, so each access costs O(ways). Here each set is an LRUSet: a dict
+of tag -> way for the lookup, and its ways kept in the order min() would evict
+them, so the victim is always the first one.
+
+That order isn't plain recency. The dict caches stamp a touched block with the
+cache's access_sequence, which only advances on hits (and, write-through, on
+writes), so blocks loaded by back-to-back misses share a stamp and min() breaks
+the tie by way. Invalid ways have stamp 0 as well, which is why nothing but way
+0 of a set gets used until the cache's first hit. StampOrder keeps the ways
+sorted by (stamp, way): a touch moves the way behind everything with an older
+stamp, but still ahead of the ways already touched at the same stamp with a
+higher index, and that group is only as long as the current run of misses.
+Hits, misses and write-backs are the same as the dict caches.
+"""
+from collections import OrderedDict
+
+
+class StampOrder(OrderedDict):
+    # Ways of one set in eviction order, (stamp, way) ascending like min() over lru_counter
+
+    def __init__(self, ways):
+        super().__init__((way, None) for way in range(ways))
+        self.stamps = [0] * ways
+
+    def stamp(self, way, stamp):
+        # Gives the way a stamp no older than any in the set and moves it to its place
+        stamps = self.stamps
+        if stamps[way] == stamp:
+            return  # Already among the newest, in way order
+        stamps[way] = stamp
+        self.move_to_end(way)
+        later = []  # Ways touched at the same stamp with a higher index, they stay behind this one
+        newest_first = reversed(self)
+        next(newest_first)  # The way itself
+        for other in newest_first:
+            if stamps[other] != stamp or other < way:
+                break
+            later.append(other)
+        for other in reversed(later):
+            self.move_to_end(other)
+
+    def victim(self):
+        return next(iter(self))
+
+
+class LRUSet(StampOrder):
+    # One cache set: tag -> way lookup on top of the ways' eviction order
+
+    def __init__(self, ways):
+        super().__init__(ways)
+        self.ways = {}  # Tag -> way, only while the block is valid
+        self.tags = [None] * len(self.stamps)
+        self.dirty = [False] * len(self.stamps)
+
+    def replace(self, tag, dirty, stamp):
+        # Loads tag into the victim way, returns the evicted (tag, dirty) pair or None if the way was invalid
+        way = self.victim()
+        old_tag = self.tags[way]
+        evicted = None
+        if old_tag is not None:
+            del self.ways[old_tag]
+            evicted = (old_tag, self.dirty[way])
+        self.ways[tag] = way
+        self.tags[way] = tag
+        self.dirty[way] = dirty
+        self.stamp(way, stamp)
+        return evicted
+
+
+class LRUWriteBackCache:
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        # Same parameters as WriteBackCache, with one LRUSet per set
+        self.total_size_bytes = total_size_bytes
+        self.block_size_bytes = block_size_bytes
+        self.blocks_per_set = blocks_per_set
+        self.sets = total_size_bytes // (block_size_bytes * blocks_per_set)
+        self.cache = self._create_cache()
+        self.access_sequence = 0  # To manage LRU policy, advanced like the dict caches'
+        self.write_backs = 0  # Dirty blocks evicted back to main memory
+
+    def _create_cache(self):
+        # Sets start with every way invalid
+        return [LRUSet(self.blocks_per_set) for _ in range(self.sets)]
+
+    def _get_set_and_tag(self, address):
+        # Computes set index and tag based on the given memory address
+        set_index = (address // self.block_size_bytes) % self.sets
+        tag = address // (self.block_size_bytes * self.sets)
+        return set_index, tag
+
+    def read(self, address):
+        # Promotes the block on hit, calls load_block to fetch and load block if miss
+        return self.read_set_tag(*self._get_set_and_tag(address))
+
+    def read_set_tag(self, set_index, tag):
+        # read() for an address already decoded into set index and tag
+        cache_set = self.cache[set_index]
+        way = cache_set.ways.get(tag)
+        if way is not None:
+            cache_set.stamp(way, self.access_sequence)
+            self.access_sequence += 1
+            return True  # Read hit
+        self.load_block(set_index, tag)
+        return False
+
+    def write(self, address):
+        # Promotes and dirties the block on hit, else loads it dirty
+        return self.write_set_tag(*self._get_set_and_tag(address))
+
+    def write_set_tag(self, set_index, tag):
+        # write() for an address already decoded into set index and tag
+        cache_set = self.cache[set_index]
+        way = cache_set.ways.get(tag)
+        if way is not None:
+            cache_set.dirty[way] = True
+            cache_set.stamp(way, self.access_sequence)
+            self.access_sequence += 1
+            return True  # Write hit
+        self.load_block(set_index, tag, dirty=True)
+        return False
+
+    def load_block(self, set_index, tag, dirty=False):
+        # Replaces the victim, writing it back if it was dirty; like the dict caches the load doesn't advance access_sequence
+        evicted = self.cache[set_index].replace(tag, dirty, self.access_sequence)
+        if evicted is not None and evicted[1]:
+            self.write_back(set_index, evicted[0])
+
+    def write_back(self, set_index, tag):
+        # Simulate writing the block back to main memory
+        self.write_backs += 1
+
+
+class LRUWriteThroughCache(LRUWriteBackCache):
+    # Same sets, but writes go through to memory so nothing is ever dirty
+
+    def write_set_tag(self, set_index, tag):
+        # Updates LRU if block is in cache, else loads it. Always counted as a miss for write.
+        cache_set = self.cache[set_index]
+        way = cache_set.ways.get(tag)
+        if way is not None:
+            cache_set.stamp(way, self.access_sequence)
+        else:
+            self.load_block(set_index, tag)
+        # Write-through cache: Assume write to main memory here
+        self.access_sequence += 1
+        return False
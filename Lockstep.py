@@ -0,0 +1,107 @@
+"""
+Lockstep simulation of many cache configurations over a single pass of the trace.
+
+Each config is an L1I/L1D pair of any cache class (WriteBackCache,
+WriteThroughCache or their array/LRU variants), with its own size, block size and
+ways. LockstepSimulation reads the trace once and feeds every reference to all
+of them; the set index and tag are worked out once per distinct (block size,
+sets) geometry and handed to each cache's read_set_tag/write_set_tag. Nothing
+here depends on LRU, so write-through and other policies work too.
+"""
+import csv
+
+FIELDNAMES = ['Cache', 'Size', 'Block size', 'Assoc.', 'L1I accesses', 'L1I misses', 'L1D accesses', 'L1D misses', 'Write backs']
+
+
+class LockstepSimulation:
+    def __init__(self, configs):
+        """
+        Args:
+        - configs: List of (cache_class, total_size_bytes, block_size_bytes, blocks_per_set)
+        """
+        self.configs = list(configs)
+        self.caches = []  # (i_cache, d_cache) per config
+        self.counts = []  # [i_hits, i_misses, d_hits, d_misses] per config
+        geometries = {}  # block size -> sets -> accessors per reference type
+
+        for cache_class, total_size_bytes, block_size_bytes, blocks_per_set in self.configs:
+            i_cache = cache_class(total_size_bytes, block_size_bytes, blocks_per_set)
+            d_cache = cache_class(total_size_bytes, block_size_bytes, blocks_per_set)
+            counts = [0, 0, 0, 0]
+            self.caches.append((i_cache, d_cache))
+            self.counts.append(counts)
+
+            accessors = geometries.setdefault(block_size_bytes, {}).setdefault(i_cache.sets, {0: [], 1: [], 2: []})
+            # Keyed by reference type: data read, data write, instruction read; hits go to counts[offset]
+            accessors[0].append((d_cache.read_set_tag, counts, 2))
+            accessors[1].append((d_cache.write_set_tag, counts, 2))
+            accessors[2].append((i_cache.read_set_tag, counts, 0))
+
+        self._plan = [(block_size, list(by_sets.items())) for block_size, by_sets in geometries.items()]
+
+    def run(self, trace_lines):
+        # Feeds every reference to every config, decoding once per geometry
+        plan = self._plan
+        try:
+            for reference_type, address in trace_lines:
+                for block_size_bytes, by_sets in plan:
+                    block = address // block_size_bytes
+                    for sets, accessors in by_sets:
+                        set_index, tag = block % sets, block // sets
+                        for access, counts, offset in accessors[reference_type]:
+                            if access(set_index, tag):
+                                counts[offset] += 1
+                            else:
+                                counts[offset + 1] += 1
+        except KeyError:
+            # The try sits outside the loop, so checking op codes costs nothing per reference
+            if reference_type in (0, 1, 2):
+                raise
+            raise ValueError(f"Unknown reference type {reference_type!r} (at address {address:#x}), "
+                             f"expected 0 (data read), 1 (data write) or 2 (instruction read)") from None
+        return self.results()
+
+    def results(self):
+        """
+        Returns one dict per config (in the order given) with its hit/miss counters
+        and the D cache's write-backs, keyed like FIELDNAMES.
+        """
+        results = []
+        for (cache_class, total_size_bytes, block_size_bytes, blocks_per_set), (i_cache, d_cache), counts in zip(self.configs, self.caches, self.counts):
+            i_hits, i_misses, d_hits, d_misses = counts
+            results.append({
+                'Cache': cache_class.__name__,
+                'Size': total_size_bytes,
+                'Block size': block_size_bytes,
+                'Assoc.': blocks_per_set,
+                'L1I accesses': i_hits,
+                'L1I misses': i_misses,
+                'L1D accesses': d_hits,
+                'L1D misses': d_misses,
+                'Write backs': d_cache.write_backs
+            })
+        return results
+
+    def write_csv(self, csv_filename):
+        with open(csv_filename, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(self.results())
+        print(f"Results have been written to {csv_filename}")
+        return csv_filename
+
+
+if __name__ == '__main__':
+    from TraceFormat import load_trace
+    from WriteBack import WriteBackCache
+    from WriteThrough import WriteThroughCache
+
+    filename = 'tex'  # Write 'cc', 'spice', or 'tex' here to change trace
+    grid = [(cache_class, size, block, assoc)
+            for cache_class in (WriteBackCache, WriteThroughCache)
+            for size in (1024, 4096, 16384)
+            for block in (32, 64)
+            for assoc in (1, 2, 4, 8)]
+    simulation = LockstepSimulation(grid)
+    simulation.run(load_trace(f"traces/{filename}.trace"))
+    simulation.write_csv(f"{filename}_lockstep.csv")
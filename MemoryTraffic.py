@@ -0,0 +1,271 @@
+"""
+Coalescing write buffer and memory-traffic accounting for the L1 caches.
+
+WriteThroughCache sends every write straight to memory and simulate_trace
+counts each one as a miss; WriteBackCache.write_back drops dirty blocks on the
+floor. Here:
+- WriteBuffer holds up to `entries` blocks on their way to memory. A write to a
+  block that's already waiting merges into its entry (write combining), and
+  entries drain oldest first at drain_rate entries per cache access. A write
+  that finds the buffer full is a buffer-full stall: it waits (in accesses) for
+  the next drain.
+- BufferedWriteThroughCache puts every write through the buffer, word by word,
+  counts a write that finds its block as a hit (the buffer hides the memory
+  write), and can run no-write-allocate (write misses don't load the block).
+- TrafficWriteBackCache puts its dirty evictions through a buffer as whole blocks,
+  and at the end of the trace the dirty lines still in the cache (flush_dirty).
+Both count the bytes read from memory (block fills) and written to it (what
+drains out of the buffer), and traffic_cache() builds a class with a given
+buffer setup for anywhere a cache_class is taken.
+"""
+import csv
+from collections import OrderedDict
+
+from WriteBack import WriteBackCache
+from WriteThrough import WriteThroughCache
+
+TRAFFIC_FIELDNAMES = ['Assoc.', 'L1D reads', 'L1D read misses', 'L1D writes', 'L1D write misses', 'Memory bytes read',
+                      'Memory bytes written', 'Buffer full stalls', 'Stalled accesses', 'Coalescing ratio', 'Dirty lines flushed']
+
+
+class WriteBuffer:
+    def __init__(self, entries=8, drain_rate=0.5, block_size_bytes=32, word_bytes=4):
+        self.entries = entries
+        self.drain_rate = drain_rate  # Entries drained per cache access
+        self.block_size_bytes = block_size_bytes
+        self.word_bytes = word_bytes
+        self.full_mask = (1 << (block_size_bytes // word_bytes)) - 1
+        self.pending = OrderedDict()  # Block address -> mask of the words written, oldest first
+        self.now = 0  # Cache accesses so far
+        self._credit = 0.0  # Drains earned but not used yet (nothing was waiting)
+        self._last = 0
+
+        self.writes = 0  # Writes put in
+        self.merged = 0  # Writes that joined an entry already waiting
+        self.drained = 0  # Entries sent to memory
+        self.bytes_written = 0
+        self.full_stalls = 0
+        self.stalled_accesses = 0.0
+
+    def advance(self, now):
+        # Moves the clock to now and drains whatever the drain rate allows by then
+        self._credit += (now - self._last) * self.drain_rate
+        self._last = self.now = now
+        pending = self.pending
+        while self._credit >= 1 and pending:
+            self._drain_one()
+            self._credit -= 1
+        if not pending:
+            self._credit = min(self._credit, 1.0)  # An idle buffer can't bank drains for later
+
+    def _drain_one(self):
+        _, mask = self.pending.popitem(last=False)
+        self.drained += 1
+        self.bytes_written += bin(mask).count('1') * self.word_bytes
+
+    def write(self, address, whole_block=False):
+        # Puts one write (or a whole dirty block) in the buffer, stalling for a drain if it's full
+        self.writes += 1
+        block_address = address - address % self.block_size_bytes
+        mask = self.full_mask if whole_block else 1 << ((address % self.block_size_bytes) // self.word_bytes)
+        pending = self.pending
+        if block_address in pending:
+            pending[block_address] |= mask
+            self.merged += 1
+            return
+        if len(pending) >= self.entries:
+            self.full_stalls += 1
+            self.stalled_accesses += (1 - self._credit) / self.drain_rate if self.drain_rate else 0
+            self._drain_one()
+            self._credit = 0.0
+        pending[block_address] = mask
+
+    def flush(self):
+        # Drains everything still waiting, e.g. at the end of the trace
+        while self.pending:
+            self._drain_one()
+
+    def coalescing_ratio(self):
+        # Writes put in per entry sent to memory
+        entries = self.drained + len(self.pending)
+        return self.writes / entries if entries else 0
+
+
+class BufferedWriteThroughCache(WriteThroughCache):
+    buffer_entries = 8
+    drain_rate = 0.5
+    write_allocate = True
+
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        super().__init__(total_size_bytes, block_size_bytes, blocks_per_set)
+        self.write_buffer = WriteBuffer(self.buffer_entries, self.drain_rate, block_size_bytes)
+        self.accesses = 0
+        self.fills = 0
+
+    @property
+    def bytes_read(self):
+        return self.fills * self.block_size_bytes
+
+    def read(self, address):
+        self.accesses += 1
+        self.write_buffer.advance(self.accesses)
+        return super().read(address)
+
+    def write(self, address):
+        self.accesses += 1
+        self.write_buffer.advance(self.accesses)
+        self.write_buffer.write(address)
+        return super().write(address)
+
+    def write_set_tag(self, set_index, tag):
+        # The buffer takes the memory write, so unlike WriteThroughCache a write that finds its block is a hit.
+        # No-write-allocate leaves the cache alone on a miss.
+        for block in self.cache[set_index]:
+            if block['valid'] and block['tag'] == tag:
+                block['lru_counter'] = self.access_sequence
+                self.access_sequence += 1
+                return True
+        if self.write_allocate:
+            self.load_block(set_index, tag)
+        self.access_sequence += 1  # Every write advances it, like WriteThroughCache.write
+        return False
+
+    def load_block(self, set_index, tag):
+        self.fills += 1
+        super().load_block(set_index, tag)
+
+
+class TrafficWriteBackCache(WriteBackCache):
+    buffer_entries = 8
+    drain_rate = 0.5
+
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        super().__init__(total_size_bytes, block_size_bytes, blocks_per_set)
+        self.write_buffer = WriteBuffer(self.buffer_entries, self.drain_rate, block_size_bytes)
+        self.accesses = 0
+        self.fills = 0
+        self._loading_set = 0
+
+    @property
+    def bytes_read(self):
+        return self.fills * self.block_size_bytes
+
+    def read(self, address):
+        self.accesses += 1
+        self.write_buffer.advance(self.accesses)
+        return super().read(address)
+
+    def write(self, address):
+        self.accesses += 1
+        self.write_buffer.advance(self.accesses)
+        return super().write(address)
+
+    def load_block(self, set_index, tag, dirty=False):
+        # Write-allocate fetches the block for writes too
+        self.fills += 1
+        self._loading_set = set_index
+        super().load_block(set_index, tag, dirty)
+
+    def write_back(self, block):
+        self.write_buffer.write((block['tag'] * self.sets + self._loading_set) * self.block_size_bytes, whole_block=True)
+        super().write_back(block)
+
+    def flush_dirty(self):
+        # Writes back every dirty line still in the cache, as at the end of the program; returns how many there were
+        # The trace is over, so the buffer just drains each one instead of stalling anything
+        flushed = 0
+        for set_index, cache_set in enumerate(self.cache):
+            self._loading_set = set_index
+            for block in cache_set:
+                if block['valid'] and block['dirty']:
+                    self.write_buffer.flush()
+                    self.write_back(block)
+                    flushed += 1
+        return flushed
+
+
+_traffic_classes = {}
+
+
+def traffic_cache(write_through=True, buffer_entries=8, drain_rate=0.5, write_allocate=True):
+    """
+    The BufferedWriteThroughCache/TrafficWriteBackCache class for a buffer setup; it takes the usual
+    (total_size_bytes, block_size_bytes, blocks_per_set). write_allocate only applies to write-through.
+    """
+    key = (write_through, buffer_entries, drain_rate, write_allocate)
+    cache_class = _traffic_classes.get(key)
+    if cache_class is None:
+        base = BufferedWriteThroughCache if write_through else TrafficWriteBackCache
+        attributes = {'buffer_entries': buffer_entries, 'drain_rate': drain_rate}
+        if write_through:
+            attributes['write_allocate'] = write_allocate
+        cache_class = _traffic_classes[key] = type(base.__name__, (base,), attributes)
+    return cache_class
+
+
+def simulate_traffic(trace_lines, total_size_bytes, block_size_bytes, assoc, cache_class):
+    """
+    Replays the data references through one traffic_cache() L1D and reports its memory traffic.
+
+    Dirty lines left in a write-back cache at the end are written back too, so the bytes written
+    cover everything the trace dirtied, and their count goes in 'Dirty lines flushed'.
+
+    Returns:
+    - A row keyed like TRAFFIC_FIELDNAMES
+    """
+    d_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    reads = read_misses = writes = write_misses = 0
+    for reference_type, address in trace_lines:
+        if reference_type == 0:
+            reads += 1
+            if not d_cache.read(address):
+                read_misses += 1
+        elif reference_type == 1:
+            writes += 1
+            if not d_cache.write(address):
+                write_misses += 1
+    flushed = d_cache.flush_dirty() if hasattr(d_cache, 'flush_dirty') else 0  # Write-through has nothing dirty
+    d_cache.write_buffer.flush()
+
+    write_buffer = d_cache.write_buffer
+    return {
+        'Assoc.': assoc,
+        'L1D reads': reads,
+        'L1D read misses': read_misses,
+        'L1D writes': writes,
+        'L1D write misses': write_misses,
+        'Memory bytes read': d_cache.bytes_read,
+        'Memory bytes written': write_buffer.bytes_written,
+        'Buffer full stalls': write_buffer.full_stalls,
+        'Stalled accesses': f"{write_buffer.stalled_accesses:.1f}",
+        'Coalescing ratio': f"{write_buffer.coalescing_ratio():.3f}",
+        'Dirty lines flushed': flushed
+    }
+
+
+def traffic_sweep(trace_name, write_through=True, associativities=(1, 2, 4, 8, 16, 32), total_size_bytes=1024,
+                  block_size_bytes=32, trace_lines=None, **buffer_args):
+    """
+    Writes WTResults/<trace>_wt_traffic.csv (or WBResults/<trace>_wb_traffic.csv), one row per associativity.
+    buffer_args go to traffic_cache (buffer_entries, drain_rate, write_allocate).
+    """
+    if trace_lines is None:
+        from TraceFormat import load_trace
+        trace_lines = load_trace(f"traces/{trace_name}.trace")
+    cache_class = traffic_cache(write_through, **buffer_args)
+    csv_filename = f"WTResults/{trace_name}_wt_traffic.csv" if write_through else f"WBResults/{trace_name}_wb_traffic.csv"
+
+    with open(csv_filename, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=TRAFFIC_FIELDNAMES)
+        writer.writeheader()
+        for assoc in associativities:
+            writer.writerow(simulate_traffic(trace_lines, total_size_bytes, block_size_bytes, assoc, cache_class))
+
+    print(f"Results have been written to {csv_filename}")
+    return csv_filename
+
+
+if __name__ == '__main__':
+    filename = 'tex'  # Write 'cc', 'spice', or 'tex' here to change trace
+    traffic_sweep(filename, write_through=True)
+    traffic_sweep(filename, write_through=False)
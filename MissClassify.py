@@ -0,0 +1,62 @@
+"""
+3C miss classification: compulsory, capacity and conflict.
+
+A ShadowCache is a fully-associative LRU cache of the same size as the real one
+(an OrderedDict of block numbers, O(1) per access) plus the set of every block
+ever touched. Fed the same accesses as the real cache, it decides what each
+miss was:
+- compulsory: first touch of the block
+- conflict: the fully-associative shadow would have hit
+- capacity: the shadow misses too
+The shadow doesn't depend on associativity, so a sweep can classify a trace
+once (shadow_classes) and reuse it for every associativity.
+
+The shadow is LRU, so the split is relative to LRU. Under another replacement
+policy (Replacement.policy_cache) 'conflict' also takes the misses the policy
+makes where LRU would have hit, replacement misses rather than mapping
+conflicts; that's why a fully-associative PLRU cache still shows some.
+"""
+from collections import OrderedDict
+
+COMPULSORY, CONFLICT, CAPACITY = 0, 1, 2  # Class of a miss; index into a [compulsory, conflict, capacity] breakdown
+BREAKDOWN_NAMES = ('compulsory', 'conflict', 'capacity')
+
+
+class ShadowCache:
+    def __init__(self, total_size_bytes, block_size_bytes):
+        self.block_size_bytes = block_size_bytes
+        self.capacity = total_size_bytes // block_size_bytes  # Blocks held by the fully-associative shadow
+        self.lru = OrderedDict()  # Block number -> None, least recently used first
+        self.seen = set()  # Every block number ever touched
+
+    def access(self, block):
+        # Touches a block number and returns what a miss on this access would be
+        lru = self.lru
+        if block in lru:
+            lru.move_to_end(block)
+            return CONFLICT
+        lru[block] = None
+        if len(lru) > self.capacity:
+            lru.popitem(last=False)
+        if block in self.seen:
+            return CAPACITY
+        self.seen.add(block)
+        return COMPULSORY
+
+    def access_address(self, address):
+        return self.access(address // self.block_size_bytes)
+
+
+def shadow_classes(trace_lines, total_size_bytes, block_size_bytes):
+    """
+    Runs separate shadows for the instruction stream and the data stream, like the
+    L1I/L1D pair in WriteBack.simulate_assoc.
+
+    Returns:
+    - bytearray with the class (COMPULSORY, CONFLICT or CAPACITY) a miss on each access would get
+    """
+    i_shadow = ShadowCache(total_size_bytes, block_size_bytes)
+    d_shadow = ShadowCache(total_size_bytes, block_size_bytes)
+    accessors = (d_shadow.access, d_shadow.access, i_shadow.access)  # Indexed by reference type
+    return bytearray(accessors[reference_type](address // block_size_bytes) for reference_type, address in trace_lines)
+
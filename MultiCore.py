@@ -0,0 +1,330 @@
+"""
+Multi-core simulation: private L1I/L1D pairs behind a shared, inclusive L2, kept coherent with MESI.
+
+Each core runs its own trace. The L1s hold a MESI state per block (Modified,
+Exclusive, Shared; Invalid is simply not being cached) and a directory maps
+each L1 block to a bitmask of the L1s holding it, so a miss or an upgrade
+only visits the caches that actually share the block; nothing per access
+loops over the cores. The L1I of core c is L1 number cores + c and only ever
+holds blocks Shared or Exclusive; a store to a block in an L1I invalidates it
+like any other copy.
+
+Bus transactions, counted against the core that causes them:
+- BusRd: read miss. A Modified/Exclusive copy elsewhere drops to Shared and
+  supplies the data (cache-to-cache), a Modified one also flushes to the L2
+- BusRdX: write miss, invalidates every other copy
+- BusUpgr: write hit on a Shared copy, invalidates every other copy
+- Flush: a Modified block written back to the L2 (invalidated, downgraded or evicted)
+A coherence miss is a miss on a block this L1 lost to another core's
+invalidation. The L2 is inclusive: when it evicts a line, every L1 copy of the
+blocks in it is back-invalidated.
+
+Interleaving:
+- 'round-robin': cores take turns issuing `quantum` references each
+- 'timestamp': the traces carry no timestamps, so each core keeps its own
+  cycle count (l1_hit per access plus l2_hit/memory on misses) and the core
+  furthest behind goes next; a heap keeps that O(log cores) per reference
+"""
+import csv
+import heapq
+import os
+from array import array
+from collections import OrderedDict
+from itertools import islice
+
+from Step5WB import L1_CONFIG, L2_SIZE
+from TraceFormat import load_trace
+from WriteBack import WriteBackCache
+
+SHARED, EXCLUSIVE, MODIFIED = 1, 2, 3  # MESI states; Invalid is 0, i.e. not cached
+CORE_FIELDS = ['L1I hits', 'L1I misses', 'L1D hits', 'L1D misses', 'Coherence misses', 'Invalidations received', 'Upgrades',
+               'L2 hits', 'L2 misses', 'Back invalidations', 'Cache-to-cache', 'BusRd', 'BusRdX', 'BusUpgr', 'Flush', 'Cycles']
+FIELDNAMES = ['Core', 'Trace'] + CORE_FIELDS
+
+
+class CoherentL1:
+    # Private LRU L1: per set an OrderedDict of block number -> MESI state, least recently used first
+
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        self.blocks_per_set = blocks_per_set
+        self.sets = total_size_bytes // (block_size_bytes * blocks_per_set)
+        self.lines = [OrderedDict() for _ in range(self.sets)]
+
+    def lookup(self, block):
+        # The block's state, touching it on a hit
+        lines = self.lines[block % self.sets]
+        state = lines.get(block, 0)
+        if state:
+            lines.move_to_end(block)
+        return state
+
+    def peek(self, block):
+        # The block's state without touching LRU
+        return self.lines[block % self.sets].get(block, 0)
+
+    def set_state(self, block, state):
+        self.lines[block % self.sets][block] = state
+
+    def invalidate(self, block):
+        # Drops the block, returns the state it was in
+        return self.lines[block % self.sets].pop(block, 0)
+
+    def insert(self, block, state):
+        # Loads a block, returns the (block, state) it evicted or None
+        lines = self.lines[block % self.sets]
+        victim = lines.popitem(last=False) if len(lines) >= self.blocks_per_set else None
+        lines[block] = state
+        return victim
+
+
+class InclusiveL2(WriteBackCache):
+    # WriteBackCache that remembers which line its last fill evicted
+
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        super().__init__(total_size_bytes, block_size_bytes, blocks_per_set)
+        self.victim = None  # L2 line number, None if the fill went into an invalid way
+
+    def load_block(self, set_index, tag, dirty=False):
+        lru_block = min(self.cache[set_index], key=lambda x: x['lru_counter'])
+        self.victim = lru_block['tag'] * self.sets + set_index if lru_block['valid'] else None
+        super().load_block(set_index, tag, dirty)
+
+
+class MultiCore:
+    def __init__(self, cores, l1_config=L1_CONFIG, l2_config=L2_SIZE + (8,), l1_hit=1, l2_hit=10, memory=100):
+        """
+        Args:
+        - cores: Number of cores, each with its own L1I and L1D of l1_config (total size, block size, ways)
+        - l2_config: (total size, block size, ways) of the shared L2, its block a multiple of the L1's
+        - l1_hit, l2_hit, memory: Latencies in cycles, for the per-core clocks
+        """
+        self.cores = cores
+        self.caches = [CoherentL1(*l1_config) for _ in range(2 * cores)]  # L1D of core c is c, its L1I is cores + c
+        self.l1_block = l1_config[1]
+        self.l2 = InclusiveL2(*l2_config)
+        self.blocks_per_line = l2_config[1] // self.l1_block
+        self.l1_hit, self.l2_hit, self.memory = l1_hit, l2_hit, memory
+        self.directory = {}  # L1 block number -> bitmask of the L1s holding it
+        self.invalidated = [set() for _ in range(2 * cores)]  # Blocks each L1 lost to another core, until it misses on them
+        self.stats = {name: array('Q', bytes(8 * cores)) for name in CORE_FIELDS}
+        self.memory_write_backs = 0
+
+    # ------------------------------------------------------------ L2 side
+
+    def _l2_read(self, core, block):
+        # Fetches an L1 block through the L2, returns the cycles it took
+        l2 = self.l2
+        if l2.read(block * self.l1_block):
+            self.stats['L2 hits'][core] += 1
+            return self.l2_hit
+        self.stats['L2 misses'][core] += 1
+        if l2.victim is not None:
+            self._back_invalidate(core, l2.victim)
+        return self.l2_hit + self.memory
+
+    def _l2_write(self, block):
+        # A Modified L1 block flushed into the L2, which holds it already (inclusion)
+        self.l2.write(block * self.l1_block)
+
+    def _back_invalidate(self, core, line):
+        # The L2 evicted a line: every L1 copy of the blocks in it goes too
+        directory, caches, stats = self.directory, self.caches, self.stats
+        first = line * self.blocks_per_line
+        for block in range(first, first + self.blocks_per_line):
+            holders = directory.pop(block, 0)
+            while holders:
+                low = holders & -holders
+                holders ^= low
+                if caches[low.bit_length() - 1].invalidate(block) == MODIFIED:
+                    self.memory_write_backs += 1  # Its L2 line is already gone
+                stats['Back invalidations'][core] += 1
+
+    # ------------------------------------------------------------ coherence
+
+    def _invalidate_others(self, core, agent, block):
+        # Invalidates every other copy of the block, returns whether one of them was Modified/Exclusive
+        directory, caches, stats = self.directory, self.caches, self.stats
+        me = 1 << agent
+        holders = directory.get(block, 0)
+        others = holders & ~me
+        owned = False
+        while others:
+            low = others & -others
+            others ^= low
+            other = low.bit_length() - 1
+            state = caches[other].invalidate(block)
+            if state == MODIFIED:
+                stats['Flush'][core] += 1
+                self._l2_write(block)
+            owned = owned or state >= EXCLUSIVE
+            self.invalidated[other].add(block)
+            stats['Invalidations received'][other % self.cores] += 1
+        if holders & me:
+            directory[block] = me
+        else:
+            directory.pop(block, None)
+        return owned
+
+    def _fill(self, core, agent, block, state):
+        # Loads the block into an L1 and registers it; a Modified victim is flushed to the L2
+        victim = self.caches[agent].insert(block, state)
+        directory = self.directory
+        if victim is not None:
+            victim_block, victim_state = victim
+            if victim_state == MODIFIED:
+                self.stats['Flush'][core] += 1
+                self._l2_write(victim_block)
+            holders = directory[victim_block] & ~(1 << agent)
+            if holders:
+                directory[victim_block] = holders
+            else:
+                del directory[victim_block]
+        directory[block] = directory.get(block, 0) | (1 << agent)
+
+    def _miss(self, core, agent, block, write):
+        # BusRd or BusRdX for an L1 miss, returns the cycles it took
+        stats = self.stats
+        invalidated = self.invalidated[agent]
+        if block in invalidated:
+            invalidated.discard(block)
+            stats['Coherence misses'][core] += 1
+
+        if write:
+            stats['BusRdX'][core] += 1
+            supplied = self._invalidate_others(core, agent, block)
+            state = MODIFIED
+        else:
+            stats['BusRd'][core] += 1
+            holders = self.directory.get(block, 0)
+            supplied = False
+            if holders:
+                if not holders & (holders - 1):  # A single holder may own the block
+                    owner = self.caches[holders.bit_length() - 1]
+                    owner_state = owner.peek(block)
+                    if owner_state == MODIFIED:
+                        stats['Flush'][core] += 1
+                        self._l2_write(block)
+                    if owner_state >= EXCLUSIVE:
+                        owner.set_state(block, SHARED)
+                        supplied = True
+                state = SHARED
+            else:
+                state = EXCLUSIVE
+
+        if supplied:
+            stats['Cache-to-cache'][core] += 1
+            latency = self.l2_hit
+        else:
+            latency = self._l2_read(core, block)
+        self._fill(core, agent, block, state)
+        return latency
+
+    # ------------------------------------------------------------ core side
+
+    def access(self, core, reference_type, address):
+        # One reference from one core, returns the cycles it took
+        block = address // self.l1_block
+        stats = self.stats
+        if reference_type == 2:  # Instruction fetch
+            agent = self.cores + core
+            if self.caches[agent].lookup(block):
+                stats['L1I hits'][core] += 1
+                return self.l1_hit
+            stats['L1I misses'][core] += 1
+            return self.l1_hit + self._miss(core, agent, block, False)
+
+        cache = self.caches[core]
+        state = cache.lookup(block)
+        if reference_type == 0:  # Data read
+            if state:
+                stats['L1D hits'][core] += 1
+                return self.l1_hit
+            stats['L1D misses'][core] += 1
+            return self.l1_hit + self._miss(core, core, block, False)
+
+        # Data write
+        if state == MODIFIED:
+            stats['L1D hits'][core] += 1
+            return self.l1_hit
+        if state == EXCLUSIVE:  # Silent upgrade
+            cache.set_state(block, MODIFIED)
+            stats['L1D hits'][core] += 1
+            return self.l1_hit
+        if state == SHARED:
+            stats['L1D hits'][core] += 1
+            stats['Upgrades'][core] += 1
+            stats['BusUpgr'][core] += 1
+            self._invalidate_others(core, core, block)
+            cache.set_state(block, MODIFIED)
+            return self.l1_hit + self.l2_hit  # Waits for the bus
+        stats['L1D misses'][core] += 1
+        return self.l1_hit + self._miss(core, core, block, True)
+
+    def run(self, traces, interleave='round-robin', quantum=1):
+        """
+        Runs one trace per core to the end.
+
+        Args:
+        - traces: One iterable of (reference_type, address) per core
+        - interleave: 'round-robin' (quantum references per turn) or 'timestamp' (lowest core clock first)
+        """
+        if len(traces) != self.cores:
+            raise ValueError(f"Need one trace per core: {self.cores} cores, {len(traces)} traces")
+        access, cycles = self.access, self.stats['Cycles']
+        streams = [iter(trace) for trace in traces]
+
+        if interleave == 'round-robin':
+            active = list(range(self.cores))
+            while active:
+                still_active = []
+                for core in active:
+                    issued = 0
+                    for reference_type, address in islice(streams[core], quantum):
+                        cycles[core] += access(core, reference_type, address)
+                        issued += 1
+                    if issued == quantum:
+                        still_active.append(core)
+                active = still_active
+        elif interleave == 'timestamp':
+            heap = [(0, core) for core in range(self.cores)]
+            while heap:
+                clock, core = heap[0]
+                reference = next(streams[core], None)
+                if reference is None:
+                    heapq.heappop(heap)
+                    continue
+                clock += access(core, *reference)
+                cycles[core] = clock
+                heapq.heapreplace(heap, (clock, core))
+        else:
+            raise ValueError(f"Unknown interleave {interleave!r}, expected 'round-robin' or 'timestamp'")
+        return self.stats
+
+
+def run_multicore(trace_names, interleave='round-robin', quantum=1, output_dir='MultiResults', **model_args):
+    """
+    Runs one core per trace name (repeat a name for several cores running the same program) and writes
+    one CSV row per core plus an 'all' row. model_args go to MultiCore (l1_config, l2_config, latencies).
+    """
+    model = MultiCore(len(trace_names), **model_args)
+    stats = model.run([load_trace(f"traces/{name}.trace") for name in trace_names], interleave, quantum)
+
+    os.makedirs(output_dir, exist_ok=True)
+    csv_filename = os.path.join(output_dir, f"{'-'.join(sorted(set(trace_names)))}_{len(trace_names)}core_{interleave}.csv")
+    with open(csv_filename, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for core, name in enumerate(trace_names):
+            row = {field: stats[field][core] for field in CORE_FIELDS}
+            row.update({'Core': core, 'Trace': name})
+            writer.writerow(row)
+        totals = {field: sum(stats[field]) for field in CORE_FIELDS}
+        totals.update({'Core': 'all', 'Trace': '', 'Cycles': max(stats['Cycles'])})  # The slowest core finishes last
+        writer.writerow(totals)
+
+    print(f"Results have been written to {csv_filename}")
+    return csv_filename
+
+
+if __name__ == '__main__':
+    run_multicore(['cc', 'spice', 'tex', 'tex'])  # One trace per core
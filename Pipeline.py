@@ -0,0 +1,122 @@
+"""
+Pipelined trace ingestion: a reader thread parses batches while the simulation runs.
+
+PipelinedTrace wraps a trace source (a TraceStream over a text or compressed
+trace, a BinaryTrace, or any iterable of (reference_type, address)). Each pass
+starts a reader thread that fills a fixed pool of preallocated (ops, addresses)
+buffers and hands them over through a queue, so at most `depth` batches are in
+flight. File reads and decompression release the GIL, which is where the
+overlap comes from, e.g. on network-mounted trace storage.
+
+Both sides time how long they wait on the other: reader_stall is time the
+reader sat on a full pool (the simulation is the bottleneck), consumer_stall is
+time the simulation waited for a batch (reading is the bottleneck).
+"""
+import queue
+import threading
+import time
+from array import array
+from itertools import chain, islice
+
+BATCH_REFERENCES = 1 << 16  # Batch size for sources that don't come in batches already
+
+
+class _Buffer:
+    # One preallocated batch slot, grown only if a batch doesn't fit
+    def __init__(self, capacity):
+        self.ops = array('B', bytes(capacity))
+        self.addresses = array('Q', bytes(8 * capacity))
+        self.count = 0
+
+    def fill(self, ops, addresses):
+        count = len(ops)
+        if count > len(self.ops):
+            self.ops = array('B', bytes(count))
+            self.addresses = array('Q', bytes(8 * count))
+        memoryview(self.ops)[:count] = ops
+        memoryview(self.addresses)[:count] = addresses
+        self.count = count
+
+
+class PipelinedTrace:
+    """
+    Re-iterable trace whose batches are read ahead on a background thread.
+
+    - batches() yields (ops, addresses) memoryviews, valid until the next batch is asked for
+    - iterating yields (reference_type, address) tuples, like read_trace_file's list
+    """
+
+    def __init__(self, source, depth=4, batch_references=BATCH_REFERENCES):
+        self.source = source
+        self.depth = depth
+        self.batch_references = batch_references
+        self.source_sha256 = getattr(source, 'source_sha256', None)
+        self.reader_stall = 0.0
+        self.consumer_stall = 0.0
+        self.batch_count = 0
+        self.passes = 0
+
+    def _source_batches(self):
+        # The source as (ops, addresses) buffers
+        if hasattr(self.source, 'batches'):
+            return self.source.batches()
+        if hasattr(self.source, 'addresses'):
+            ops, addresses, step = self.source.ops, self.source.addresses, self.batch_references
+            return ((ops[start:start + step], addresses[start:start + step]) for start in range(0, len(ops), step))
+        return self._group(iter(self.source))
+
+    def _group(self, references):
+        while True:
+            batch = list(islice(references, self.batch_references))
+            if not batch:
+                return
+            yield array('B', [reference_type for reference_type, _ in batch]), array('Q', [address for _, address in batch])
+
+    def _read(self, free, full, stop):
+        # Reader thread: fills free buffers and passes them on, then a None to say it's done
+        try:
+            for ops, addresses in self._source_batches():
+                start = time.perf_counter()
+                buffer = free.get()
+                self.reader_stall += time.perf_counter() - start
+                if stop.is_set():
+                    return
+                buffer.fill(ops, addresses)
+                full.put(buffer)
+            full.put(None)
+        except BaseException as error:
+            full.put(error)  # Re-raised on the simulation side
+
+    def batches(self):
+        free, full, stop = queue.Queue(), queue.Queue(), threading.Event()
+        for _ in range(self.depth):
+            free.put(_Buffer(self.batch_references))
+        reader = threading.Thread(target=self._read, args=(free, full, stop), daemon=True)
+        reader.start()
+        self.passes += 1
+        try:
+            while True:
+                start = time.perf_counter()
+                buffer = full.get()
+                self.consumer_stall += time.perf_counter() - start
+                if buffer is None:
+                    return
+                if isinstance(buffer, BaseException):
+                    raise buffer
+                self.batch_count += 1
+                yield memoryview(buffer.ops)[:buffer.count], memoryview(buffer.addresses)[:buffer.count]
+                free.put(buffer)
+        finally:
+            # Also runs if the simulation stops early: wake the reader so it can exit
+            stop.set()
+            free.put(_Buffer(0))
+            reader.join()
+
+    def __iter__(self):
+        return chain.from_iterable(zip(ops, addresses) for ops, addresses in self.batches())
+
+    def stall_report(self):
+        # One line summary of where the pipeline waited
+        bottleneck = 'reading' if self.consumer_stall > self.reader_stall else 'simulation'
+        return (f"{self.passes} passes, {self.batch_count} batches: reader stalled {self.reader_stall:.3f}s, "
+                f"simulation stalled {self.consumer_stall:.3f}s ({bottleneck} is the bottleneck)")
@@ -0,0 +1,235 @@
+"""
+L2 prefetchers for Step5WB, trained on the L1 miss stream.
+
+Step5WB's L2 only sees the L1s' misses, which is exactly what an L2 prefetcher
+sees too, so a prefetcher is replayed over the recorded stream (Step5WB.simulate_l1)
+one associativity at a time. Prefetchers (make_prefetcher(name)):
+- 'next-line': on a miss, or the first hit to a prefetched line, fetch the next
+  `degree` blocks (tagged next-N-line)
+- 'stride': no PC in the trace, so one global detector on block deltas; after
+  `threshold` repeats of the same delta, fetch `degree` blocks ahead along it
+- 'stream': Jouppi stream buffers, `buffers` FIFOs of `depth` sequential blocks
+  held outside the L2; a miss that finds its block at a buffer head takes it
+  from there (an L2 hit once it has arrived), otherwise it starts a new stream
+  in the least recently used buffer
+
+Prefetched lines are tagged with the time they arrive, measured in L2 accesses
+(`latency` after the prefetch was issued). A demand access that gets to a
+prefetched line (in the L2 or a stream buffer) before it has arrived is a late
+prefetch: it still has to wait on memory, so it counts as an L2 miss. Per
+prefetcher that gives:
+- coverage: demand misses removed, timely / (timely + remaining misses)
+- accuracy: useful / issued, late ones included since they fetched the right block
+- timeliness: share of the useful prefetches that had arrived when demanded
+- pollution evictions: lines a prefetch fill evicted that were missed on again later
+The baseline Step5WB.simulate_l2 loop is untouched; this is a separate loop.
+"""
+from collections import deque
+
+from MissClassify import ShadowCache
+from Step5WB import L2_SIZE, WriteBackCache
+
+PREFETCH_LATENCY = 4  # L2 accesses between issuing a prefetch and its line arriving
+
+
+class Prefetcher:
+    name = 'none'
+
+    def __init__(self, degree=1, latency=PREFETCH_LATENCY):
+        self.degree = degree
+        self.latency = latency
+        self.issued = 0  # Prefetches sent to memory
+        self.useful = 0  # Prefetched lines demanded before being evicted
+        self.timely = 0  # ...that had already arrived by then, the rest were late and still missed
+        self.pollution = 0  # Demand misses to lines a prefetch fill evicted
+
+    def train(self, block, trigger):
+        # Sees every L2 demand access; trigger is a miss or the first hit to a prefetched line
+        # Returns the blocks to prefetch into the L2
+        return ()
+
+    def take(self, block, now):
+        # A demand miss asks the prefetcher's own buffers for the block; returns its arrival time or None
+        return None
+
+    def coverage(self, misses):
+        # Only timely prefetches removed a miss, late ones are among the misses already
+        return self.timely / (self.timely + misses) if (self.timely + misses) else 0
+
+    def accuracy(self):
+        return self.useful / self.issued if self.issued else 0
+
+    def timeliness(self):
+        return self.timely / self.useful if self.useful else 0
+
+
+class NextLinePrefetcher(Prefetcher):
+    name = 'next-line'
+
+    def train(self, block, trigger):
+        if not trigger:
+            return ()
+        return range(block + 1, block + 1 + self.degree)
+
+
+class StridePrefetcher(Prefetcher):
+    name = 'stride'
+
+    def __init__(self, degree=1, latency=PREFETCH_LATENCY, threshold=2):
+        super().__init__(degree, latency)
+        self.threshold = threshold
+        self.last_block = None
+        self.stride = 0
+        self.confidence = 0
+
+    def train(self, block, trigger):
+        if self.last_block is not None:
+            delta = block - self.last_block
+            if delta == self.stride and delta:
+                self.confidence += 1
+            else:
+                self.stride, self.confidence = delta, 0
+        self.last_block = block
+        if self.confidence < self.threshold:
+            return ()
+        return [block + self.stride * step for step in range(1, self.degree + 1)]
+
+
+class StreamBufferPrefetcher(Prefetcher):
+    name = 'stream'
+
+    def __init__(self, degree=1, latency=PREFETCH_LATENCY, buffers=4, depth=4):
+        super().__init__(degree, latency)
+        self.depth = depth
+        self.buffers = deque(deque() for _ in range(buffers))  # Each a FIFO of (block, arrival), most recently used last
+        self.now = 0
+
+    def take(self, block, now):
+        self.now = now
+        for stream in self.buffers:
+            if stream and stream[0][0] == block:
+                _, arrival = stream.popleft()
+                self._fill(stream, stream[-1][0] + 1 if stream else block + 1, 1)
+                self.buffers.remove(stream)
+                self.buffers.append(stream)
+                return arrival
+        return None
+
+    def train(self, block, trigger):
+        if trigger and not any(stream and stream[0][0] == block + 1 for stream in self.buffers):
+            # Demand miss no buffer had: restart the least recently used buffer at the next block
+            stream = self.buffers.popleft()
+            stream.clear()
+            self._fill(stream, block + 1, self.depth)
+            self.buffers.append(stream)
+        return ()
+
+    def _fill(self, stream, first, count):
+        for next_block in range(first, first + count):
+            stream.append((next_block, self.now + self.latency))
+        self.issued += count
+
+
+PREFETCHERS = {
+    'next-line': NextLinePrefetcher,
+    'stride': StridePrefetcher,
+    'stream': StreamBufferPrefetcher,
+}
+
+
+def make_prefetcher(name, **options):
+    """
+    A new prefetcher by name, e.g. make_prefetcher('next-line', degree=2) or make_prefetcher('stream', buffers=8).
+    All of them take degree and latency.
+    """
+    if name not in PREFETCHERS:
+        raise ValueError(f"Unknown prefetcher {name!r}, expected one of {sorted(PREFETCHERS)}")
+    return PREFETCHERS[name](**options)
+
+
+class TaggedL2Cache(WriteBackCache):
+    # Step5WB's L2 that remembers what each fill evicted and can be probed without touching LRU
+
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        super().__init__(total_size_bytes, block_size_bytes, blocks_per_set)
+        self.victim = None  # Block number the last fill evicted, None if it went into an invalid way
+
+    def contains(self, block):
+        set_index, tag = block % self.sets, block // self.sets
+        for line in self.cache[set_index]:
+            if line['valid'] and line['tag'] == tag:
+                return True
+        return False
+
+    def load_block(self, set_index, tag, dirty=False):
+        lru_block = min(self.cache[set_index], key=lambda x: x['lru_counter'])
+        self.victim = lru_block['tag'] * self.sets + set_index if lru_block['valid'] else None
+        super().load_block(set_index, tag, dirty)
+
+
+def simulate_l2_prefetch(l2_stream, assoc, prefetcher):
+    """
+    Step5WB.simulate_l2 with a prefetcher observing the stream.
+
+    Returns:
+    - thit, tmiss and the [compulsory, conflict, capacity] breakdown of the remaining misses, like simulate_l2
+    - The prefetcher's counters are filled in for Step5WB.make_row
+    """
+    l2_cache = TaggedL2Cache(*L2_SIZE, assoc)
+    block_size_bytes = L2_SIZE[1]
+    classify = ShadowCache(*L2_SIZE).access_address
+    latency = prefetcher.latency
+    prefetched = {}  # Prefetched block -> arrival, until it's demanded or evicted
+    polluted = set()  # Blocks evicted by a prefetch fill and not demanded since
+    l2_breakdown = [0, 0, 0]
+    thit, tmiss = 0, 0
+
+    for now, address in enumerate(l2_stream[1]):
+        block = address // block_size_bytes
+        miss_class = classify(address)
+        if l2_cache.read(address):
+            arrival = prefetched.pop(block, None)
+            trigger = arrival is not None
+            if trigger:
+                prefetcher.useful += 1
+                if arrival <= now:
+                    prefetcher.timely += 1
+            if trigger and arrival > now:
+                # Late prefetch: the line is still on its way, so the access waits on memory like a miss
+                tmiss += 1
+                l2_breakdown[miss_class] += 1
+            else:
+                thit += 1
+        else:
+            if l2_cache.victim in prefetched:
+                del prefetched[l2_cache.victim]  # Never used
+            arrival = prefetcher.take(block, now)
+            if arrival is not None:
+                prefetcher.useful += 1  # Came out of a stream buffer
+                if arrival <= now:
+                    prefetcher.timely += 1
+            if arrival is not None and arrival <= now:
+                thit += 1
+            else:
+                tmiss += 1  # Not prefetched, or the stream buffer's copy is late
+                l2_breakdown[miss_class] += 1
+                if arrival is None and block in polluted:
+                    prefetcher.pollution += 1
+                    polluted.discard(block)
+            trigger = True
+
+        for target in prefetcher.train(block, trigger):
+            if target < 0 or l2_cache.contains(target):
+                continue
+            prefetcher.issued += 1
+            l2_cache.load_block(target % l2_cache.sets, target // l2_cache.sets)
+            prefetched[target] = now + latency
+            polluted.discard(target)
+            victim = l2_cache.victim
+            if victim is not None:
+                if victim in prefetched:
+                    del prefetched[victim]
+                else:
+                    polluted.add(victim)
+
+    return thit, tmiss, l2_breakdown
@@ -0,0 +1,314 @@
+"""
+Pluggable replacement policies and the caches that use them.
+
+The dict/array caches hard-code LRU through lru_counter and pick a victim with
+a min() over the set. Here replacement is its own object, a ReplacementPolicy
+with these calls, each O(1) or O(log ways):
+- touch(set_index, way): the way was hit
+- insert(set_index, way): a block was just loaded into the way
+- victim(set_index): the way to evict
+- advance(): a write-through write miss is done (only LRU's sequence counts it)
+
+Policies:
+- 'lru': the dict caches' LRU exactly, stamps that only advance on hits (see
+  LRUCache), kept as a StampOrder of ways per set
+- 'plru': tree-PLRU, ways - 1 direction bits per set packed into one integer
+- 'srrip' / 'brrip': 2-bit re-reference prediction values, kept as four way
+  bitmasks per set (one per RRPV) so aging is a rotation of the masks
+- 'fifo': round-robin pointer per set
+- 'random': seeded random way
+The PLRU bits and RRIP masks are plain Python ints, so any number of ways fits.
+
+PolicyWriteBackCache/PolicyWriteThroughCache have the same API as the dict
+caches. Blocks are found through one dict keyed by block number. For every
+policy but 'lru' the invalid ways fill up in order before the policy is asked
+for a victim (nothing is ever invalidated); 'lru' picks among the invalid ways
+itself, the way min() over the stamps does, so it gives exactly the dict
+caches' results. independent_sets says whether the policy's state is purely per
+set (no cache-wide sequence or shared random stream), which SetPartition needs.
+policy_cache(name) makes a class for a policy that plugs in anywhere a
+cache_class is taken.
+"""
+import random
+from array import array
+from collections import OrderedDict
+
+from AddressDecode import log2_exact
+from LRUCache import StampOrder
+
+
+class ReplacementPolicy:
+    # Defaults for the calls a policy doesn't care about
+    fills_in_order = True  # The cache fills invalid ways lowest first and only asks victim() once the set is full
+    independent_sets = True  # No state shared between sets
+
+    def __init__(self, sets, ways, seed=0):
+        pass
+
+    def touch(self, set_index, way):
+        pass
+
+    def insert(self, set_index, way):
+        pass
+
+    def advance(self):
+        pass
+
+    def victim(self, set_index):
+        raise NotImplementedError
+
+
+class LRUPolicy(ReplacementPolicy):
+    # The dict caches' stamping: one access_sequence for the whole cache, advanced by hits but not by loads
+    fills_in_order = False  # Invalid ways are stamp 0 and compete with the loaded blocks, like in min()
+    independent_sets = False
+
+    def __init__(self, sets, ways, seed=0):
+        self.orders = [StampOrder(ways) for _ in range(sets)]
+        self.access_sequence = 0
+
+    def touch(self, set_index, way):
+        self.orders[set_index].stamp(way, self.access_sequence)
+        self.access_sequence += 1
+
+    def insert(self, set_index, way):
+        self.orders[set_index].stamp(way, self.access_sequence)
+
+    def advance(self):
+        self.access_sequence += 1
+
+    def victim(self, set_index):
+        return self.orders[set_index].victim()
+
+
+class TreePLRUPolicy(ReplacementPolicy):
+    # Heap-ordered tree: node n has children 2n and 2n+1, leaves ways..2*ways-1; a 0 bit means the victim is to the left
+    def __init__(self, sets, ways, seed=0):
+        self.levels = log2_exact(ways)
+        if self.levels is None:
+            raise ValueError(f"Tree-PLRU needs a power-of-two number of ways, not {ways}")
+        self.ways = ways
+        self.bits = [0] * sets  # Ints, array('Q') would overflow past 64 ways
+
+    def touch(self, set_index, way):
+        # Points every node on the way's path away from it
+        bits = self.bits[set_index]
+        node = 1
+        for level in range(self.levels - 1, -1, -1):
+            right = (way >> level) & 1
+            if right:
+                bits &= ~(1 << node)
+            else:
+                bits |= 1 << node
+            node = 2 * node + right
+        self.bits[set_index] = bits
+
+    insert = touch
+
+    def victim(self, set_index):
+        bits = self.bits[set_index]
+        node = 1
+        while node < self.ways:
+            node = 2 * node + ((bits >> node) & 1)
+        return node - self.ways
+
+
+class SRRIPPolicy(ReplacementPolicy):
+    MAX_RRPV = 3
+    INSERT_RRPV = 2  # Long re-reference interval
+
+    def __init__(self, sets, ways, seed=0):
+        self.masks = [0] * (4 * sets)  # Ways holding RRPV 0..3, four masks per set (ints, array('Q') stops at 64 ways)
+
+    def _set(self, set_index, way, rrpv):
+        base, bit = 4 * set_index, 1 << way
+        masks = self.masks
+        for value in range(4):
+            masks[base + value] &= ~bit
+        masks[base + rrpv] |= bit
+
+    def touch(self, set_index, way):
+        self._set(set_index, way, 0)  # Hit priority: predicted near re-reference
+
+    def insert(self, set_index, way):
+        self._set(set_index, way, self._insert_rrpv())
+
+    def _insert_rrpv(self):
+        return self.INSERT_RRPV
+
+    def victim(self, set_index):
+        # Ages the whole set until some way reaches MAX_RRPV, by rotating the masks, then takes the lowest such way
+        base = 4 * set_index
+        masks = self.masks
+        oldest = next(value for value in (3, 2, 1, 0) if masks[base + value])
+        shift = self.MAX_RRPV - oldest
+        if shift:
+            aged = [masks[base + value - shift] if value >= shift else 0 for value in range(4)]
+            masks[base:base + 4] = aged
+        candidates = masks[base + self.MAX_RRPV]
+        return (candidates & -candidates).bit_length() - 1
+
+
+class BRRIPPolicy(SRRIPPolicy):
+    LONG_INSERT_CHANCE = 1 / 32  # Bimodal: usually insert at distant, now and then at long
+    independent_sets = False  # One random stream for the whole cache
+
+    def __init__(self, sets, ways, seed=0):
+        super().__init__(sets, ways, seed)
+        self.rng = random.Random(seed)
+
+    def _insert_rrpv(self):
+        return self.INSERT_RRPV if self.rng.random() < self.LONG_INSERT_CHANCE else self.MAX_RRPV
+
+
+class FIFOPolicy(ReplacementPolicy):
+    def __init__(self, sets, ways, seed=0):
+        self.ways = ways
+        self.next_out = array('I', bytes(4 * sets))  # Oldest way per set
+
+    def insert(self, set_index, way):
+        if way == self.next_out[set_index]:
+            self.next_out[set_index] = (way + 1) % self.ways
+
+    def victim(self, set_index):
+        return self.next_out[set_index]
+
+
+class RandomPolicy(ReplacementPolicy):
+    independent_sets = False  # One random stream for the whole cache
+
+    def __init__(self, sets, ways, seed=0):
+        self.ways = ways
+        self.rng = random.Random(seed)
+
+    def victim(self, set_index):
+        return self.rng.randrange(self.ways)
+
+
+POLICIES = {
+    'lru': LRUPolicy,
+    'plru': TreePLRUPolicy,
+    'srrip': SRRIPPolicy,
+    'brrip': BRRIPPolicy,
+    'fifo': FIFOPolicy,
+    'random': RandomPolicy,
+}
+
+
+class PolicyWriteBackCache:
+    policy_name = 'lru'
+    seed = 0
+    independent_sets = False  # The policy's independent_sets, set by policy_cache
+
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        # Same parameters as WriteBackCache, replacement comes from the class's policy_name
+        self.total_size_bytes = total_size_bytes
+        self.block_size_bytes = block_size_bytes
+        self.blocks_per_set = blocks_per_set
+        self.sets = total_size_bytes // (block_size_bytes * blocks_per_set)
+        lines = self.sets * blocks_per_set
+        self.tags = array('Q', bytes(8 * lines))
+        self.valid = bytearray(lines)
+        self.dirty = bytearray(lines)
+        self.filled = array('I', bytes(4 * self.sets))  # Valid ways per set, the lowest ones if the policy fills in order
+        self.lines = {}  # Block number (tag * sets + set_index) -> line
+        self.policy = POLICIES[self.policy_name](self.sets, blocks_per_set, self.seed)
+        self.write_backs = 0  # Dirty blocks evicted back to main memory
+
+    def _get_set_and_tag(self, address):
+        # Computes set index and tag based on the given memory address
+        set_index = (address // self.block_size_bytes) % self.sets
+        tag = address // (self.block_size_bytes * self.sets)
+        return set_index, tag
+
+    def read(self, address):
+        return self.read_set_tag(*self._get_set_and_tag(address))
+
+    def read_set_tag(self, set_index, tag):
+        line = self.lines.get(tag * self.sets + set_index)
+        if line is not None:
+            self.policy.touch(set_index, line - set_index * self.blocks_per_set)
+            return True  # Read hit
+        self.load_block(set_index, tag)
+        return False
+
+    def write(self, address):
+        return self.write_set_tag(*self._get_set_and_tag(address))
+
+    def write_set_tag(self, set_index, tag):
+        line = self.lines.get(tag * self.sets + set_index)
+        if line is not None:
+            self.dirty[line] = 1
+            self.policy.touch(set_index, line - set_index * self.blocks_per_set)
+            return True  # Write hit
+        self.load_block(set_index, tag, dirty=True)
+        return False
+
+    def load_block(self, set_index, tag, dirty=False):
+        # Fills the next invalid way, or replaces the policy's victim (which may be invalid for 'lru')
+        base = set_index * self.blocks_per_set
+        if self.policy.fills_in_order and self.filled[set_index] < self.blocks_per_set:
+            way = self.filled[set_index]
+        else:
+            way = self.policy.victim(set_index)
+        line = base + way
+        if self.valid[line]:
+            del self.lines[self.tags[line] * self.sets + set_index]
+            if self.dirty[line]:
+                self.write_back(line)
+        else:
+            self.valid[line] = 1
+            self.filled[set_index] += 1
+        self.tags[line] = tag
+        self.dirty[line] = dirty
+        self.lines[tag * self.sets + set_index] = line
+        self.policy.insert(set_index, way)
+
+    def write_back(self, line):
+        # Simulate writing the line back to main memory
+        self.dirty[line] = 0
+        self.write_backs += 1
+
+
+class PolicyWriteThroughCache(PolicyWriteBackCache):
+    # Same storage, but writes go through to memory so nothing is ever dirty
+
+    def write_set_tag(self, set_index, tag):
+        # Touches the block if it's cached, else loads it. Always counted as a miss for write.
+        line = self.lines.get(tag * self.sets + set_index)
+        if line is not None:
+            self.policy.touch(set_index, line - set_index * self.blocks_per_set)
+        else:
+            self.load_block(set_index, tag)
+            self.policy.advance()  # Like WriteThroughCache.write, the write after the load counts for LRU
+        return False
+
+
+_policy_classes = {}
+
+
+def policy_cache(policy_name, write_through=False, seed=0):
+    """
+    The cache class for a replacement policy, e.g. policy_cache('srrip') -> SRRIPWriteBackCache.
+    It takes the usual (total_size_bytes, block_size_bytes, blocks_per_set).
+    """
+    if policy_name not in POLICIES:
+        raise ValueError(f"Unknown replacement policy {policy_name!r}, expected one of {sorted(POLICIES)}")
+    key = (policy_name, write_through, seed)
+    cache_class = _policy_classes.get(key)
+    if cache_class is None:
+        base = PolicyWriteThroughCache if write_through else PolicyWriteBackCache
+        name = policy_name.upper() + base.__name__[len('Policy'):] + (f'_seed{seed}' if seed else '')
+        cache_class = _policy_classes[key] = type(name, (base,), {'policy_name': policy_name, 'seed': seed,
+                                                                  'independent_sets': POLICIES[policy_name].independent_sets})
+        globals()[name] = cache_class  # Classes pickle by name, SetPartition sends them to its workers
+    return cache_class
+
+
+def __getattr__(name):
+    # Rebuilds a policy_cache class a fresh process is asked to unpickle (not forked, so it hasn't made it yet)
+    policy, _, rest = name.partition('Write')
+    kind, _, seed = rest.partition('_seed')
+    if policy.lower() in POLICIES and kind in ('BackCache', 'ThroughCache') and (not seed or seed.isdigit()):
+        return policy_cache(policy.lower(), kind == 'ThroughCache', int(seed or 0))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
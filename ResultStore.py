@@ -0,0 +1,122 @@
+"""
+Persistent, content-addressed store of simulated CSV rows.
+
+A row is keyed by everything that determines it: the trace's SHA-256, the
+write policy ('wb', 'wt', 'wb5'), cache size, block size, associativity, hit
+time, miss penalty, engine, replacement policy and ENGINE_VERSION. The key's
+SHA-256 names a small JSON file under the store directory, which also records
+the key fields so entries can be invalidated selectively. Reads bump the file's mtime, and when
+the store grows past max_bytes the least recently used entries are deleted.
+
+Bump ENGINE_VERSION whenever a change to the simulators changes their results,
+so old rows stop matching.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+ENGINE_VERSION = 5  # 2: rows gained the Replacement column, 3: the Step5WB prefetch columns, 4/5: LRU stamping changed and restored
+DEFAULT_DIR = 'ResultCache'
+
+
+class ResultStore:
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=64 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits, self.misses = 0, 0
+        self._size = None  # Bytes on disk, worked out on the first put
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def fields(trace_sha256, kind, total_size_bytes, block_size_bytes, assoc, hit_time, miss_penalty, engine='dict', policy='lru'):
+        # The key fields of one sweep point
+        return {
+            'trace': trace_sha256.hex() if isinstance(trace_sha256, bytes) else trace_sha256,
+            'kind': kind,
+            'size': total_size_bytes,
+            'block size': block_size_bytes,
+            'assoc': assoc,
+            'hit time': hit_time,
+            'miss penalty': miss_penalty,
+            'engine': engine,
+            'policy': policy,
+            'version': ENGINE_VERSION,
+        }
+
+    def _path(self, fields):
+        key = hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, fields):
+        # The stored row for these key fields, or None
+        path = self._path(fields)
+        try:
+            with open(path) as file:
+                row = json.load(file)['row']
+            os.utime(path)  # Most recently used
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row
+
+    def put(self, fields, row):
+        # Stores a row atomically, then evicts if the store got too big
+        path = self._path(fields)
+        try:
+            old_size = os.path.getsize(path)  # Overwriting an entry, its bytes are already counted
+        except OSError:
+            old_size = 0
+        out_fd, out_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(out_fd, 'w') as out:
+                json.dump({'fields': fields, 'row': row}, out)
+            os.chmod(out_path, 0o644)  # mkstemp files are owner-only
+            os.replace(out_path, path)
+        except BaseException:
+            os.unlink(out_path)
+            raise
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in self._entries())
+        else:
+            self._size += os.path.getsize(path) - old_size
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+
+    def _evict(self):
+        # Deletes least recently used entries until the store is back under three quarters of max_bytes
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime_ns)
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= self.max_bytes * 3 // 4:
+                break
+            size -= entry.stat().st_size
+            os.unlink(entry.path)
+        self._size = size
+
+    def invalidate(self, **match):
+        """
+        Deletes stored rows, e.g. invalidate() for everything, invalidate(trace=digest_hex)
+        or invalidate(kind='wt', assoc=32) for the entries whose key fields match.
+
+        Returns:
+        - The number of entries deleted
+        """
+        removed = 0
+        for entry in self._entries():
+            if match:
+                try:
+                    with open(entry.path) as file:
+                        fields = json.load(file)['fields']
+                except (OSError, ValueError, KeyError):
+                    fields = None  # Unreadable entries go regardless
+                if fields is not None and any(fields.get(name) != value for name, value in match.items()):
+                    continue
+            os.unlink(entry.path)
+            removed += 1
+        self._size = None
+        return removed
@@ -0,0 +1,106 @@
+"""
+Same-block run-length collapsing in front of the L1 replay.
+
+In an LRU L1 every reference after the first in a run of consecutive references
+from the same stream (instruction fetch, or data reads/writes) to the same
+block is a hit, and between them nothing else touches that cache. collapse_runs
+turns each such run into one record:
+
+    (first reference type, block number, references in the run, writes after the first)
+
+simulate_runs replays the first reference of each record normally and hands the
+rest to the cache's touch_run, which does the LRU update, dirty bit and hit
+accounting for all of them at once. Instruction fetch walks through blocks a
+word at a time, so most op 2 references disappear into their run.
+"""
+from array import array
+
+from AddressDecode import log2_exact
+
+
+class CollapsedTrace:
+    """
+    A trace collapsed into same-block runs for one block size. The records of each
+    stream are in trace order; the two streams feed different caches, so their
+    records are only loosely interleaved.
+
+    - ops, blocks, counts, writes: one entry per run
+    - references: How many trace references the runs cover
+    """
+
+    def __init__(self, block_size_bytes):
+        self.block_size_bytes = block_size_bytes
+        self.ops, self.blocks = array('B'), array('Q')
+        self.counts, self.writes = array('I'), array('I')
+        self.references = 0
+
+    def __len__(self):
+        return len(self.ops)
+
+    def append(self, run):
+        reference_type, block, count, writes = run
+        self.ops.append(reference_type)
+        self.blocks.append(block)
+        self.counts.append(count)
+        self.writes.append(writes)
+        self.references += count
+
+
+def collapse_runs(trace_lines, block_size_bytes):
+    """
+    Collapses consecutive same-block references per stream (instruction: type 2, data: the rest).
+    As in WriteBack.simulate_assoc, types other than 1 (write) and 2 are data reads, recorded as type 0.
+
+    Returns:
+    - A CollapsedTrace
+    """
+    collapsed = CollapsedTrace(block_size_bytes)
+    shift = log2_exact(block_size_bytes)
+    open_runs = [None, None]  # [reference_type, block, count, writes] for the data and instruction streams
+
+    for reference_type, address in trace_lines:
+        block = address >> shift if shift is not None else address // block_size_bytes
+        stream = 1 if reference_type == 2 else 0  # Only 2 is instruction, anything else is data like in WriteBack.simulate_assoc
+        run = open_runs[stream]
+        if run is not None and run[1] == block:
+            run[2] += 1
+            if reference_type == 1:
+                run[3] += 1
+        else:
+            if run is not None:
+                collapsed.append(run)
+            open_runs[stream] = [reference_type if reference_type == 1 or reference_type == 2 else 0, block, 1, 0]  # Other ops read
+
+    for run in open_runs:
+        if run is not None:
+            collapsed.append(run)
+    return collapsed
+
+
+def simulate_runs(collapsed, total_size_bytes, assoc, cache_class):
+    """
+    Replays a CollapsedTrace through a fresh L1I/L1D pair of cache_class (any cache with touch_run).
+
+    Returns:
+    - i_hits, i_misses, d_hits, d_misses, the same as replaying the full trace
+    """
+    sets = total_size_bytes // (collapsed.block_size_bytes * assoc)
+    i_cache = cache_class(total_size_bytes, collapsed.block_size_bytes, assoc)
+    d_cache = cache_class(total_size_bytes, collapsed.block_size_bytes, assoc)
+    accessors = (d_cache.read_set_tag, d_cache.write_set_tag, i_cache.read_set_tag)  # Indexed by reference type
+    touchers = (d_cache.touch_run, d_cache.touch_run, i_cache.touch_run)
+
+    i_hits, d_hits, i_references = 0, 0, 0
+    for reference_type, block, count, writes in zip(collapsed.ops, collapsed.blocks, collapsed.counts, collapsed.writes):
+        set_index, tag = block % sets, block // sets
+        hits = 1 if accessors[reference_type](set_index, tag) else 0
+        if count > 1:
+            hits += touchers[reference_type](set_index, tag, count - 1, writes)
+        if reference_type == 2:
+            i_hits += hits
+            i_references += count
+        else:
+            d_hits += hits
+
+    d_references = collapsed.references - i_references
+    return i_hits, i_references - i_hits, d_hits, d_references - d_hits
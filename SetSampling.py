@@ -0,0 +1,237 @@
+"""
+Approximate WriteBack sweeps by set sampling, with a confidence interval on the miss rates.
+
+Sets barely interact, so simulating a random subset of them and scaling up
+gives a close estimate of the miss rate. Not an exact one per set: the LRU
+caches share one access_sequence across their sets (see LRUCache), and with
+fewer sets feeding it the stamp ties inside a set break a little differently, so
+the sample is only exact at fraction=1. Every config of the sweep gets its own
+sample: of its S sets, the ceil(fraction * S) with the lowest hash of their set
+index. One filtering pass over the trace feeds all of them at once. It looks
+each reference up by block % L, where L is the least common multiple of the
+set counts (just the largest set count for the usual power-of-two sweep), and
+appends it to the kept references of every config that sampled its set. Each
+associativity then replays only its own kept references, roughly `fraction` of
+the trace, which is where the speed-up comes from.
+
+The miss rate is a ratio estimate over the sampled sets, sum(misses) /
+sum(accesses), with the usual ratio-estimator variance (including the finite
+population correction, so sampling every set gives a zero-width interval).
+Hits and misses are extrapolated as rate * the exact access count. The interval
+needs enough sets to mean anything, so a sweep where some config would sample
+fewer than MIN_SAMPLED_SETS of its sets (and not all of them) is rejected. That
+is why the default cache is 1 MiB, where 32 ways still have 1024 sets; the
+1 KiB caches of WBCacheSimulation are small enough to simulate in full anyway.
+The interval only knows the variation between the sets it sampled: when a
+handful of hot sets carry most of the misses (a stack, a few hot arrays) a
+small sample can miss all of them, so check such traces with a larger fraction
+or a second seed before trusting a tight interval.
+"""
+import csv
+import math
+from array import array
+from functools import reduce
+
+import WriteBack
+from WriteBack import WriteBackCache
+
+MIN_SAMPLED_SETS = 30  # Fewest sampled sets per config for the normal interval to be worth printing
+Z_SCORES = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}  # Two-sided normal quantiles by confidence level
+FIELDNAMES = WriteBack.FIELDNAMES + ['Sampled fraction', 'Confidence', 'L1I miss rate', 'L1I CI low', 'L1I CI high',
+                                     'L1D miss rate', 'L1D CI low', 'L1D CI high']
+
+
+def _mix(value):
+    # 32-bit integer hash (murmur3's finalizer), spreads neighbouring set indices apart
+    value &= 0xFFFFFFFF
+    value ^= value >> 16
+    value = (value * 0x85EBCA6B) & 0xFFFFFFFF
+    value ^= value >> 13
+    value = (value * 0xC2B2AE35) & 0xFFFFFFFF
+    return value ^ (value >> 16)
+
+
+def sample_size(sets, fraction):
+    # ceil(fraction * sets), at least one set and at most all of them
+    return max(1, min(sets, math.ceil(fraction * sets)))
+
+
+def choose_sets(sets, fraction, seed=0):
+    # The sample_size(sets, fraction) set indices with the lowest hashes
+    return sorted(sorted(range(sets), key=lambda set_index: _mix(set_index ^ _mix(seed + 1)))[:sample_size(sets, fraction)])
+
+
+class SampledTrace:
+    """
+    The references of a trace that fall in one config's sampled sets.
+
+    - sets: The config's set count, sampled_sets: the set indices kept
+    - ops, addresses: array('B') and array('Q') of the kept references
+    - i_total, d_total: L1I and L1D accesses in the whole trace
+    """
+
+    def __init__(self, block_size_bytes, sets, sampled_sets):
+        self.block_size_bytes = block_size_bytes
+        self.sets = sets
+        self.sampled_sets = sampled_sets
+        self.ops, self.addresses = array('B'), array('Q')
+        self.i_total = self.d_total = 0
+
+    def __len__(self):
+        return len(self.ops)
+
+
+def sample_trace(trace_lines, block_size_bytes, set_counts, fraction, seed=0):
+    """
+    Splits out the sampled references of every set count in one pass over the trace.
+
+    Returns:
+    - A dict of set count -> SampledTrace
+    """
+    samples = {sets: SampledTrace(block_size_bytes, sets, choose_sets(sets, fraction, seed)) for sets in set(set_counts)}
+    # block % modulus decides the set index in every config, so a table over it says who keeps each reference
+    modulus = reduce(lambda a, b: a * b // math.gcd(a, b), samples)
+    keepers = [()] * modulus
+    for sample in samples.values():
+        appends = ((sample.ops.append, sample.addresses.append),)
+        for set_index in sample.sampled_sets:
+            for unit in range(set_index, modulus, sample.sets):
+                keepers[unit] += appends
+
+    totals = [0, 0, 0]
+    for reference_type, address in trace_lines:
+        totals[reference_type] += 1
+        for ops_append, addresses_append in keepers[(address // block_size_bytes) % modulus]:
+            ops_append(reference_type)
+            addresses_append(address)
+
+    for sample in samples.values():
+        sample.i_total, sample.d_total = totals[2], totals[0] + totals[1]
+    return samples
+
+
+def simulate_sampled(sampled, total_size_bytes, assoc, cache_class=WriteBackCache):
+    """
+    Replays the sampled references through a fresh L1I/L1D pair.
+
+    Returns:
+    - The per-set L1I accesses, L1I misses, L1D accesses and L1D misses (only the sampled sets are non-zero)
+    """
+    block_size_bytes, sets = sampled.block_size_bytes, sampled.sets
+    if total_size_bytes // (block_size_bytes * assoc) != sets:
+        raise ValueError(f"Sample was taken for {sets} sets, not the {total_size_bytes // (block_size_bytes * assoc)} of assoc {assoc}")
+    i_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    d_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    i_accesses, i_misses = array('Q', bytes(8 * sets)), array('Q', bytes(8 * sets))
+    d_accesses, d_misses = array('Q', bytes(8 * sets)), array('Q', bytes(8 * sets))
+
+    for reference_type, address in zip(sampled.ops, sampled.addresses):
+        set_index = (address // block_size_bytes) % sets
+        if reference_type == 2:  # Instruction read
+            i_accesses[set_index] += 1
+            if not i_cache.read(address):
+                i_misses[set_index] += 1
+        else:  # Data read/write
+            d_accesses[set_index] += 1
+            if not (d_cache.write(address) if reference_type == 1 else d_cache.read(address)):
+                d_misses[set_index] += 1
+
+    return i_accesses, i_misses, d_accesses, d_misses
+
+
+def estimate(accesses, misses, sampled_sets, total, z):
+    """
+    Ratio estimate of the miss rate over the sampled sets.
+
+    Returns:
+    - hits, misses extrapolated to the total accesses
+    - The miss rate and the half-width of its confidence interval (0 when every set was sampled,
+      None if the sampled sets saw none of the accesses)
+    """
+    sets = len(accesses)
+    sample_accesses = [accesses[set_index] for set_index in sampled_sets]
+    sample_misses = [misses[set_index] for set_index in sampled_sets]
+    sampled_total = sum(sample_accesses)
+    rate = sum(sample_misses) / sampled_total if sampled_total else 0
+
+    count = len(sampled_sets)
+    half_width = None
+    if count == sets or not total:
+        half_width = 0.0  # Exact
+    elif count > 1 and sampled_total:
+        mean_accesses = sampled_total / count
+        residuals = sum((set_misses - rate * set_accesses) ** 2
+                        for set_accesses, set_misses in zip(sample_accesses, sample_misses)) / (count - 1)
+        variance = (1 - count / sets) * residuals / (count * mean_accesses ** 2)
+        half_width = z * math.sqrt(variance)
+
+    estimated_misses = round(rate * total)
+    return total - estimated_misses, estimated_misses, rate, half_width
+
+
+def sampled_columns(rate, half_width, prefix):
+    # The miss rate and its interval, clipped to [0, 1]; blank bounds when there's no interval
+    return {
+        f'{prefix} miss rate': f"{rate:.4f}",
+        f'{prefix} CI low': f"{max(0.0, rate - half_width):.4f}" if half_width is not None else '',
+        f'{prefix} CI high': f"{min(1.0, rate + half_width):.4f}" if half_width is not None else '',
+    }
+
+
+def sampled_sweep(trace_name, fraction=1 / 32, associativities=(1, 2, 4, 8, 16, 32), total_size_bytes=1 << 20,
+                  block_size_bytes=32, confidence=0.95, seed=0, trace_lines=None, cache_class=WriteBackCache):
+    """
+    WBCacheSimulation's sweep on a sample of the sets, written to WBResults/<trace>_wb_sampled.csv.
+    Each row has the extrapolated WriteBack columns plus the miss rates with their confidence intervals.
+
+    Args:
+    - fraction: Share of each config's sets (and so roughly of the trace) that gets simulated
+    - total_size_bytes: Defaults to 1 MiB, not WBCacheSimulation's 1 KiB, so the rows don't line up with
+      WBResults/<trace>_wb.csv; every config has to sample at least MIN_SAMPLED_SETS sets (or all of them).
+      With fraction=1 the rows are exact, Verify.check_sampling checks that
+    - confidence: 0.90, 0.95 or 0.99
+    - seed: Picks a different set sample
+    """
+    if confidence not in Z_SCORES:
+        raise ValueError(f"Unsupported confidence {confidence}, expected one of {sorted(Z_SCORES)}")
+    z = Z_SCORES[confidence]
+    set_counts = {assoc: total_size_bytes // (block_size_bytes * assoc) for assoc in associativities}
+    too_few = [assoc for assoc, sets in set_counts.items() if sample_size(sets, fraction) < min(sets, MIN_SAMPLED_SETS)]
+    if too_few:
+        raise ValueError(f"A {fraction:g} sample leaves fewer than {MIN_SAMPLED_SETS} sets for assoc {too_few} "
+                         f"({', '.join(str(set_counts[assoc]) for assoc in too_few)} sets), too few for a confidence interval; "
+                         f"use a larger fraction or total_size_bytes, or WriteBack.WBCacheSimulation for the exact counts")
+
+    hit_time = 1  # H
+    miss_penalty = 100  # M
+    csv_filename = f"WBResults/{trace_name}_wb_sampled.csv"
+    if trace_lines is None:
+        from TraceFormat import load_trace
+        trace_lines = load_trace(f"traces/{trace_name}.trace")
+
+    samples = sample_trace(trace_lines, block_size_bytes, set_counts.values(), fraction, seed)
+
+    with open(csv_filename, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        writer.writeheader()
+
+        for assoc in associativities:
+            sampled = samples[set_counts[assoc]]
+            i_accesses, i_misses, d_accesses, d_misses = simulate_sampled(sampled, total_size_bytes, assoc, cache_class)
+            i_hits, i_misses, i_rate, i_half = estimate(i_accesses, i_misses, sampled.sampled_sets, sampled.i_total, z)
+            d_hits, d_misses, d_rate, d_half = estimate(d_accesses, d_misses, sampled.sampled_sets, sampled.d_total, z)
+
+            row = WriteBack.make_row(assoc, i_hits, i_misses, d_hits, d_misses, hit_time, miss_penalty)
+            row['Sampled fraction'] = f"{len(sampled.sampled_sets) / sampled.sets:.4f}"
+            row['Confidence'] = confidence
+            row.update(sampled_columns(i_rate, i_half, 'L1I'))
+            row.update(sampled_columns(d_rate, d_half, 'L1D'))
+            writer.writerow(row)
+
+    print(f"Results have been written to {csv_filename}")
+    return csv_filename
+
+
+if __name__ == '__main__':
+    filename = 'tex'  # Write 'cc', 'spice', or 'tex' here to change trace
+    sampled_sweep(filename)
@@ -0,0 +1,60 @@
+"""
+One-pass engine for the associativity sweeps.
+
+WriteBack.py and WriteThrough.py replay the whole trace once per
+associativity. A classic LRU stack-distance pass would get every associativity
+from one recency stack per set, but it assumes true LRU, and the reference
+caches aren't quite that: access_sequence only advances on hits (and, for
+write-through, on writes), so blocks loaded by back-to-back misses share a
+stamp and min() evicts the lowest way among them, and until a cache's first hit
+every set only uses way 0. Those tie-breaks depend on the ways, so a block's
+depth in one stack doesn't say whether it hits at every associativity.
+
+Here the one pass keeps each config's exact replacement state instead: every
+reference is decoded once and handed to an LRUCache.LRUSet per config, which
+keeps the ways in the order the reference min() would evict them. Every
+associativity in the sweep has its own set count, so a shared stack would not
+have been shared anyway.
+"""
+from LRUCache import LRUSet
+
+
+def sweep_associativities(trace_lines, total_size_bytes, block_size_bytes, associativities, write_through=False):
+    """
+    Gets hit/miss counts for every associativity at a fixed cache and block size.
+
+    Args:
+    - write_through: Follow WriteThroughCache's LRU updates (writes always advance its sequence) instead of WriteBackCache's
+
+    Returns:
+    - A dict mapping each associativity to three (hits, misses) pairs, indexed by
+      reference type (0 data read, 1 data write, 2 instruction read). A write-through
+      write counts as a hit here if it found its block, the caller decides how to score it.
+    """
+    configs = []
+    for assoc in associativities:
+        sets = total_size_bytes // (block_size_bytes * assoc)
+        i_sets = [LRUSet(assoc) for _ in range(sets)]
+        d_sets = [LRUSet(assoc) for _ in range(sets)]
+        sequences = [0, 0]  # access_sequence of the D and I caches
+        counts = [[0, 0], [0, 0], [0, 0]]  # [hits, misses] per reference type
+        configs.append((sets, (d_sets, d_sets, i_sets), sequences, counts))
+    advances_on_miss = (False, write_through, False)  # Indexed by reference type
+
+    for reference_type, address in trace_lines:
+        block = address // block_size_bytes
+        cache = reference_type >> 1  # 0 for data, 1 for instructions
+        for sets, sets_by_type, sequences, counts in configs:
+            cache_set = sets_by_type[reference_type][block % sets]
+            way = cache_set.ways.get(block)  # Keyed by block rather than tag, it's the same within a set
+            if way is not None:
+                cache_set.stamp(way, sequences[cache])
+                sequences[cache] += 1
+                counts[reference_type][0] += 1
+            else:
+                cache_set.replace(block, False, sequences[cache])
+                if advances_on_miss[reference_type]:
+                    sequences[cache] += 1
+                counts[reference_type][1] += 1
+
+    return {assoc: [tuple(pair) for pair in counts] for assoc, (_, _, _, counts) in zip(associativities, configs)}
@@ -9,8 +9,9 @@ This file is supposed to separate the steps 3&4 file Carter made
 I believe Carter did correctly implement the write-back cache.
 However, the project specs seem to imply that the two steps should be separated
 """
+from array import array
 
-import Step1
+from TraceStream import TraceStream
 
 
 class BaseCache:
@@ -20,24 +21,33 @@ class BaseCache:
         self.block_size = block_size
         self.set_assoc = set_assoc
         self.num_sets = self.cache_size // (self.block_size * self.set_assoc)
-        self.cache = self.initialize_cache()
+        self.tags, self.valid, self.dirty, self.youngest = self.initialize_cache()
 
     def initialize_cache(self):
         # Init cache based on size, block size, set_assoc
-        cache = []
-        for _ in range(self.num_sets):
-            sets = [{'valid': False, 'tag': None, 'LRU': 0, 'dirty': False} for _ in range(self.set_assoc)]
-            cache.append(sets)
-        return cache
-
-    def update_LRU(self, set_index, accessed_block):
-        # Increment LRU for all blocks
-        for block in self.cache[set_index]:
-            block['LRU'] += 1
-        accessed_block['LRU'] = 0  # Reset LRU for accessed block
+        # Flat arrays indexed by set_index * set_assoc + way instead of a dict per block:
+        # 8-byte tags, one byte each for the valid and dirty bits, and per set the line with LRU 0
+        lines = self.num_sets * self.set_assoc
+        return array('Q', bytes(8 * lines)), bytearray(lines), bytearray(lines), array('Q', range(0, lines, self.set_assoc))
+
+    def update_LRU(self, set_index, accessed_line):
+        # The LRU values were only ever used to find the smallest, which is always 0: the block hit last
+        # (a load also sets 0, but on the block that already had it). Before the first hit every block has 0
+        # and the first one wins. So remembering that one block per set is enough, no loop over the set.
+        self.youngest[set_index] = accessed_line
+
+    def find_line(self, set_index, tag):
+        # Index of the valid line holding tag in the set, -1 if there isn't one
+        tags, valid = self.tags, self.valid
+        base = set_index * self.set_assoc
+        for line in range(base, base + self.set_assoc):
+            if valid[line] and tags[line] == tag:
+                return line
+        return -1
 
     def get_set_index_and_tag(self, address):
-        address_int = int(address, 16)
+        # Takes the address as a hex string (like the trace file) or an int
+        address_int = int(address, 16) if isinstance(address, str) else address
         index = (address_int // self.block_size) % self.num_sets
         tag = address_int // (self.block_size * self.num_sets)
         return index, tag
@@ -58,22 +68,20 @@ class WriteBackCache(BaseCache):
             self.write_data(set_index, tag)
 
     def read_data(self, set_index, tag):
-        cache_set = self.cache[set_index]
-        for block in cache_set:
-            if block['valid'] and block['tag'] == tag:
-                self.update_LRU(set_index, block)
-                return True  # hit
+        line = self.find_line(set_index, tag)
+        if line >= 0:
+            self.update_LRU(set_index, line)
+            return True  # hit
         self.load_block_to_cache(set_index, tag, is_write=False)
         return False  # miss
 
     def write_data(self, set_index, tag):
-        cache_set = self.cache[set_index]
-        for block in cache_set:
-            if block['valid'] and block['tag'] == tag:
-                block['dirty'] = True  # Mark block as dirty
-                self.update_LRU(set_index, block)
-                self.hits += 1
-                return True  # Hit
+        line = self.find_line(set_index, tag)
+        if line >= 0:
+            self.dirty[line] = True  # Mark block as dirty
+            self.update_LRU(set_index, line)
+            self.hits += 1
+            return True  # Hit
         if self.load_block_to_cache(set_index, tag, is_write=True):
             self.hits += 1
         else:
@@ -81,28 +89,31 @@ class WriteBackCache(BaseCache):
         return False  # Miss
 
     def load_block_to_cache(self, set_index, tag, is_write):
-        lru_block = min(self.cache[set_index], key=lambda x: x['LRU'])
-        if lru_block['valid'] and lru_block['dirty']:
-            self.write_back(lru_block)
+        # Replaces the first block with the smallest LRU value
+        line = self.youngest[set_index]
+        if self.valid[line] and self.dirty[line]:
+            self.write_back(line)
             self.misses += 1
-        else:
-            pass
-        lru_block.update({'valid': True, 'tag': tag, 'LRU': 0, 'dirty': is_write})
-        return not lru_block['dirty']
+        self.valid[line] = True
+        self.tags[line] = tag
+        self.dirty[line] = is_write
+        return not is_write
 
-    def write_back(self, block):
+    def write_back(self, line):
         # Simulate writing block back to main mem
-        block['dirty'] = False
+        self.dirty[line] = False
         self.write_backs += 1  # Increment when we wb
 
 
 # ----------------------------------------------------------
 
 def process_file(file_path, cache):
-    with open(file_path, 'r') as file:
-        for line in file:
-            operation, address = line.strip(). split()
-            cache.access_cache(int(operation), address)
+    # Streams the trace (plain or compressed) in batches that are parsed in bulk,
+    # so memory stays flat however long the trace is
+    access = cache.access_cache
+    for operations, addresses in TraceStream(file_path).batches():
+        for operation, address in zip(operations, addresses):
+            access(operation, address)
 
 def simulate_caches(file_path, cache_size=1024, block_size=32, H=1, M=100):
     assoc = [1, 2, 4, 8, 16, 32]
@@ -125,5 +136,6 @@ def calculate_amat(cache, H, M):
     miss_rate = cache.misses / (cache.hits + cache.misses) if (cache.hits + cache.misses) > 0 else 0
     return H + (miss_rate * M)
 
-file_path = "traces/cc.trace"
-simulate_caches(file_path)
+if __name__ == '__main__':
+    file_path = "traces/cc.trace"
+    simulate_caches(file_path)
@@ -7,6 +7,23 @@ Builds off of the WriteBack file
 Expect to see changes only within the L2 cache sections of the results since
 we've restricted all of the parameters for the L1 caches
 """
+import hashlib
+import json
+import os
+from array import array
+
+from MissClassify import CAPACITY, COMPULSORY, CONFLICT, ShadowCache
+from Replacement import policy_cache
+from TraceFormat import BinaryTrace, load_trace, write_binary_trace
+
+L1_CONFIG = (1024, 32, 2)  # Fixed L1I/L1D total size, block size, blocks per set
+L2_SIZE = (16384, 128)  # L2 total size and block size, only its associativity is swept
+L1_STREAM_VERSION = 3  # Part of the cached L1 miss stream's key, bump when simulate_l1's results change
+FIELDNAMES = ['Assoc.', 'L1I accesses', 'L1I misses', 'L1D accesses', 'L1D misses', 'L2 accesses', 'L2 misses', 'L1I hit rate',
+              'L1D hit rate', 'L2 hit rate', 'L1I AMAT', 'L1D AMAT', 'L2 AMAT', 'L2 compulsory', 'L2 capacity', 'L2 conflict',
+              'Replacement', 'Prefetcher', 'Prefetches issued', 'Prefetch coverage', 'Prefetch accuracy', 'Prefetch timeliness',
+              'Pollution evictions']
+
 
 class WriteBackCache:
     def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
@@ -74,105 +91,246 @@ class WriteBackCache:
         block['dirty'] = False
 
 
-def WBCacheSimulation(trace_name):
+def WBCacheSimulation(trace_name, trace_lines=None, filter_l1=True, prefetcher=None, prefetch_options=None, policy='lru'):
     """
     Simulate cache given associativity for the passed traces.
     Processes each mem access in trace, calcs hits/misses, hit rates, AMAT.
+    trace_lines can be any re-iterable of (reference_type, address), e.g. a TraceStream over a .gz trace.
+    filter_l1 simulates the fixed L1s once (cached on disk) and replays only their misses into each L2,
+    filter_l1=False re-runs the whole hierarchy for every associativity.
+    L2 misses are also split into compulsory/capacity/conflict against a fully-associative shadow of the L2.
+    prefetcher names one of Prefetch.PREFETCHERS to run on the L2 (always over the L1 miss stream),
+    prefetch_options are passed on to it, e.g. {'degree': 2}.
+    policy picks the L2's replacement policy (Replacement.POLICIES, the L1s stay LRU); anything but 'lru'
+    writes to Pt5Results/<trace>_wb5_<policy>.csv and can't be combined with a prefetcher. The 3C split stays
+    relative to LRU, so its conflict column includes the policy's replacement misses (see MissClassify).
     """
     associativities = [1, 2, 4, 8, 16, 32]
     hit_time = 1  # H
     miss_penalty = 100  # M
     csv_filename = f"Pt5Results/{trace_name}_wb5.csv"
+    l2_class = WriteBackCache
+    if policy != 'lru':
+        if prefetcher:
+            raise ValueError(f"The prefetchers tag lines in Step5WB's LRU L2, they can't run with the {policy!r} policy")
+        l2_class = policy_cache(policy)
+        csv_filename = f"Pt5Results/{trace_name}_wb5_{policy}.csv"
 
-    trace_lines = read_trace_file(f"traces/{trace_name}.trace")
+    if trace_lines is None:
+        trace_lines = load_trace(f"traces/{trace_name}.trace")  # Cached binary conversion, parsed once
 
     with open(csv_filename, 'w', newline='') as csvfile:
-        fieldnames = ['Assoc.', 'L1I accesses', 'L1I misses', 'L1D accesses', 'L1D misses', 'L2 accesses', 'L2 misses', 'L1I hit rate',
-                          'L1D hit rate', 'L2 hit rate','L1I AMAT', 'L1D AMAT', 'L2 AMAT']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
         writer.writeheader()
 
+        if filter_l1 or prefetcher:
+            (i_hits, i_misses, d_hits, d_misses), l2_stream = load_l1_filtered(trace_name, trace_lines)
+        if prefetcher:
+            from Prefetch import make_prefetcher, simulate_l2_prefetch  # Prefetch builds on this module
+
         for assoc in associativities:
-            # explicitly defining the cache params for my steake
-            i_cache = WriteBackCache(1024, 32, 2)
-            d_cache = WriteBackCache(1024, 32, 2)
-            l2Cache = WriteBackCache(16384, 128, assoc)
+            l2_prefetcher = None
+            if prefetcher:
+                l2_prefetcher = make_prefetcher(prefetcher, **(prefetch_options or {}))
+                thit, tmiss, l2_breakdown = simulate_l2_prefetch(l2_stream, assoc, l2_prefetcher)
+            elif filter_l1:
+                thit, tmiss, l2_breakdown = simulate_l2(l2_stream, assoc, l2_class)
+            else:
+                i_hits, i_misses, d_hits, d_misses, thit, tmiss, l2_breakdown = simulate_assoc(trace_lines, assoc, l2_class)
+            writer.writerow(make_row(assoc, i_hits, i_misses, d_hits, d_misses, thit, tmiss, hit_time, miss_penalty, l2_breakdown,
+                                     policy, l2_prefetcher))
 
-            i_hits, i_misses, d_hits, d_misses, thit, tmiss = 0, 0, 0, 0, 0, 0
+    print(f"Results have been written to {csv_filename}")
+    return csv_filename
 
-            for line in trace_lines:
-                reference_type, address = line  # Directly unpack the tuple
 
-                # Determine cache and action
-                if reference_type == 2:  # Instruction read
-                    if i_cache.read(address):
-                        i_hits += 1
+def simulate_assoc(trace_lines, assoc, l2_class=None):
+    # Replays the trace through the fixed L1I/L1D pair and an L2 of the given associativity (and l2_class, if not the LRU one)
+    # Returns i_hits, i_misses, d_hits, d_misses, thit, tmiss and the L2 [compulsory, conflict, capacity] breakdown
+    # explicitly defining the cache params for my steake
+    i_cache = WriteBackCache(*L1_CONFIG)
+    d_cache = WriteBackCache(*L1_CONFIG)
+    l2Cache = (l2_class or WriteBackCache)(*L2_SIZE, assoc)
+    l2_shadow = ShadowCache(*L2_SIZE)  # Fully-associative L2 for the 3C split
+    l2_breakdown = [0, 0, 0]
+
+    i_hits, i_misses, d_hits, d_misses, thit, tmiss = 0, 0, 0, 0, 0, 0
+
+    for line in trace_lines:
+        reference_type, address = line  # Directly unpack the tuple
+
+        # Determine cache and action
+        if reference_type == 2:  # Instruction read
+            if i_cache.read(address):
+                i_hits += 1
+            else:
+                i_misses += 1
+
+                # first, check L2 cache if instruction is there
+                # if instruction is in L2 cache, load into i_cache
+                # if not, store instruction to L2 cache
+                miss_class = l2_shadow.access_address(address)
+                if l2Cache.read(address):
+                    thit += 1
+                else:
+                    tmiss += 1
+                    l2_breakdown[miss_class] += 1
+
+        else:  # Data read/write
+            if reference_type == 1:
+                if d_cache.write(address):
+                    d_misses += 1
+                else:
+                    if d_cache.read(address):
+                        d_hits += 1
                     else:
-                        i_misses += 1
+                        d_misses += 1
 
-                        # first, check L2 cache if instruction is there
-                        # if instruction is in L2 cache, load into i_cache
-                        # if not, store instruction to L2 cache
+                        # same as the i_cache process
+                        # first, check L2 cache if data is there
+                        # if instruction is in L2 cache, load into d_cache
+                        # if not, store data to L2 cache
+                        miss_class = l2_shadow.access_address(address)
                         if l2Cache.read(address):
                             thit += 1
                         else:
                             tmiss += 1
+                            l2_breakdown[miss_class] += 1
 
-                else:  # Data read/write
-                    if reference_type == 1:
-                        if d_cache.write(address):
-                            d_misses += 1
-                        else:
-                            if d_cache.read(address):
-                                d_hits += 1
-                            else:
-                                d_misses += 1
-
-                                # same as the i_cache process
-                                # first, check L2 cache if data is there
-                                # if instruction is in L2 cache, load into d_cache
-                                # if not, store data to L2 cache
-                                if l2Cache.read(address):
-                                    thit += 1
-                                else:
-                                    tmiss += 1
-
-            i_miss_rate = i_misses / (i_hits + i_misses) if (i_hits + i_misses) else 0
-            d_miss_rate = d_misses / (d_hits + d_misses) if (d_hits + d_misses) else 0
-            l2MissRate = tmiss / (thit + tmiss) if (thit + tmiss) > 0 else 0  # calculating miss rate for l2 cache
-
-            i_hit_rate = 1 - i_miss_rate if (i_hits + i_misses) else 0
-            d_hit_rate = 1 - d_miss_rate if (d_hits + d_misses) else 0
-            l2HitRate = 1 - l2MissRate if (tmiss + thit) else 0
-
-            i_amat = hit_time + (i_miss_rate * miss_penalty)
-            d_amat = hit_time + (d_miss_rate * miss_penalty)
-            amat = hit_time + ((i_miss_rate + d_miss_rate) / 2) * (10 + l2MissRate * miss_penalty)
-
-            # we can expect the L1 caches to remain constant bc of the params we gave them
-            # print(f"i_hits: {i_hits}, i_misses: {d_hits}, L1I miss rate: {i_miss_rate}, L1I hit rate: {i_hit_rate}")
-
-            # the L2 cache MUST change bc it's the only place where we're changing anything
-            # print(f"thit: {thit}, tmiss: {tmiss}, L2MissRate: {l2MissRate}, L2HitRate: {l2HitRate}, amat: {amat}")
-
-            writer.writerow({
-                'Assoc.': assoc,
-                'L1I accesses': i_hits,
-                'L1I misses': i_misses,
-                'L1D accesses': d_hits,
-                'L1D misses': d_misses,
-                'L2 accesses': thit,
-                'L2 misses': tmiss,
-                'L1I hit rate': f"{i_hit_rate:.4f}",
-                'L1D hit rate': f"{d_hit_rate:.4f}",
-                'L2 hit rate': f"{l2HitRate: .4f}",
-                'L1I AMAT': f"{i_amat:.2f}",
-                'L1D AMAT': f"{d_amat:.2f}",
-                'L2 AMAT': f"{amat:.2f}"
-            })
+    return i_hits, i_misses, d_hits, d_misses, thit, tmiss, l2_breakdown
 
-    print(f"Results have been written to {csv_filename}")
-    return csv_filename
+
+def simulate_l1(trace_lines):
+    """
+    Runs only the fixed L1I/L1D pair and records every read it sends to the L2.
+    The L1s never see the L2's state, so this stream is the same for every L2 config.
+
+    Returns:
+    - (i_hits, i_misses, d_hits, d_misses) for the L1s
+    - The L2 stream as (ops, addresses) arrays; the op is the reference type that missed in L1
+    """
+    i_cache = WriteBackCache(*L1_CONFIG)
+    d_cache = WriteBackCache(*L1_CONFIG)
+    ops, addresses = array('B'), array('Q')
+
+    i_hits, i_misses, d_hits, d_misses = 0, 0, 0, 0
+
+    for reference_type, address in trace_lines:
+        if reference_type == 2:  # Instruction read
+            if i_cache.read(address):
+                i_hits += 1
+            else:
+                i_misses += 1
+                ops.append(reference_type)
+                addresses.append(address)
+
+        elif reference_type == 1:  # Data write, same flow as simulate_assoc
+            if d_cache.write(address):
+                d_misses += 1
+            elif d_cache.read(address):
+                d_hits += 1
+            else:
+                d_misses += 1
+                ops.append(reference_type)
+                addresses.append(address)
+
+    return (i_hits, i_misses, d_hits, d_misses), (ops, addresses)
+
+
+def simulate_l2(l2_stream, assoc, l2_class=None):
+    # Replays a recorded L1 miss stream into an L2 of the given associativity (and l2_class, if not the LRU one)
+    # Returns thit, tmiss and the L2 [compulsory, conflict, capacity] breakdown
+    l2Cache = (l2_class or WriteBackCache)(*L2_SIZE, assoc)
+    classify = ShadowCache(*L2_SIZE).access_address
+    l2_breakdown = [0, 0, 0]
+    thit, tmiss = 0, 0
+    for address in l2_stream[1]:
+        miss_class = classify(address)
+        if l2Cache.read(address):
+            thit += 1
+        else:
+            tmiss += 1
+            l2_breakdown[miss_class] += 1
+    return thit, tmiss, l2_breakdown
+
+
+def load_l1_filtered(trace_name, trace_lines):
+    """
+    simulate_l1 with an on-disk cache in traces/, keyed by the trace's SHA-256 and the L1 config.
+    The stream is kept in the binary trace format with the L1 counters in a JSON sidecar.
+    Traces without a digest (e.g. a TraceStream) are filtered in memory and not cached.
+    """
+    digest = getattr(trace_lines, 'source_sha256', None)
+    if digest is None:
+        return simulate_l1(trace_lines)
+
+    key = hashlib.sha256(digest + repr(('Step5WB', L1_CONFIG, L1_STREAM_VERSION)).encode()).hexdigest()[:16]
+    base_path = f"traces/{trace_name}.l1-{key}"
+    try:
+        with open(base_path + '.json') as file:
+            counts = tuple(json.load(file)['l1_counts'])
+        with BinaryTrace(base_path + '.bin') as stream:
+            # Copied out so the mapping can be closed, the stream is only the L1 misses
+            return counts, (array('B', stream.ops), array('Q', stream.addresses))
+    except (OSError, ValueError, KeyError):
+        pass
+
+    counts, (ops, addresses) = simulate_l1(trace_lines)
+    write_binary_trace(base_path + '.bin', ops, addresses, digest)
+    with open(base_path + '.json.tmp', 'w') as file:
+        json.dump({'trace_sha256': digest.hex(), 'l1_config': L1_CONFIG, 'l1_counts': counts}, file)
+    os.replace(base_path + '.json.tmp', base_path + '.json')
+    return counts, (ops, addresses)
+
+
+def make_row(assoc, i_hits, i_misses, d_hits, d_misses, thit, tmiss, hit_time, miss_penalty, l2_breakdown=None, policy='lru',
+             prefetcher=None):
+    # Calcs hit rates and AMATs from the counts and formats them as a Pt5Results CSV row
+    # The L2 3C columns are left empty unless its [compulsory, conflict, capacity] breakdown is given,
+    # the prefetch columns unless the Prefetch.Prefetcher that ran on the L2 is
+    i_miss_rate = i_misses / (i_hits + i_misses) if (i_hits + i_misses) else 0
+    d_miss_rate = d_misses / (d_hits + d_misses) if (d_hits + d_misses) else 0
+    l2MissRate = tmiss / (thit + tmiss) if (thit + tmiss) > 0 else 0  # calculating miss rate for l2 cache
+
+    i_hit_rate = 1 - i_miss_rate if (i_hits + i_misses) else 0
+    d_hit_rate = 1 - d_miss_rate if (d_hits + d_misses) else 0
+    l2HitRate = 1 - l2MissRate if (tmiss + thit) else 0
+
+    i_amat = hit_time + (i_miss_rate * miss_penalty)
+    d_amat = hit_time + (d_miss_rate * miss_penalty)
+    amat = hit_time + ((i_miss_rate + d_miss_rate) / 2) * (10 + l2MissRate * miss_penalty)
+
+    # we can expect the L1 caches to remain constant bc of the params we gave them
+    # print(f"i_hits: {i_hits}, i_misses: {d_hits}, L1I miss rate: {i_miss_rate}, L1I hit rate: {i_hit_rate}")
+
+    # the L2 cache MUST change bc it's the only place where we're changing anything
+    # print(f"thit: {thit}, tmiss: {tmiss}, L2MissRate: {l2MissRate}, L2HitRate: {l2HitRate}, amat: {amat}")
+
+    return {
+        'Assoc.': assoc,
+        'L1I accesses': i_hits,
+        'L1I misses': i_misses,
+        'L1D accesses': d_hits,
+        'L1D misses': d_misses,
+        'L2 accesses': thit,
+        'L2 misses': tmiss,
+        'L1I hit rate': f"{i_hit_rate:.4f}",
+        'L1D hit rate': f"{d_hit_rate:.4f}",
+        'L2 hit rate': f"{l2HitRate: .4f}",
+        'L1I AMAT': f"{i_amat:.2f}",
+        'L1D AMAT': f"{d_amat:.2f}",
+        'L2 AMAT': f"{amat:.2f}",
+        'L2 compulsory': l2_breakdown[COMPULSORY] if l2_breakdown else '',
+        'L2 capacity': l2_breakdown[CAPACITY] if l2_breakdown else '',
+        'L2 conflict': l2_breakdown[CONFLICT] if l2_breakdown else '',
+        'Replacement': policy,
+        'Prefetcher': prefetcher.name if prefetcher else 'none',
+        'Prefetches issued': prefetcher.issued if prefetcher else '',
+        'Prefetch coverage': f"{prefetcher.coverage(tmiss):.4f}" if prefetcher else '',
+        'Prefetch accuracy': f"{prefetcher.accuracy():.4f}" if prefetcher else '',
+        'Prefetch timeliness': f"{prefetcher.timeliness():.4f}" if prefetcher else '',
+        'Pollution evictions': prefetcher.pollution if prefetcher else ''
+    }
 
 
 def read_trace_file(file_path):
@@ -199,6 +357,6 @@ def read_trace_file(file_path):
     return trace_lines
 
 
-filename = ('spice')  # Write 'cc', 'spice', or 'tex' here to change trace
-trace_lines = read_trace_file(f"traces/{filename}.trace")
-WBCacheSimulation(filename)
+if __name__ == '__main__':
+    filename = ('spice')  # Write 'cc', 'spice', or 'tex' here to change trace
+    WBCacheSimulation(filename)
@@ -0,0 +1,139 @@
+"""
+Process-pool sweep runner across traces and cache configurations.
+
+Every (trace, kind, cache size, block size, associativity) point is an
+independent simulation, so run_sweep fans them out over a ProcessPoolExecutor.
+Each trace is converted to the binary format once in the parent; workers only
+get its path and memory-map it, so the trace is shared through the page cache
+instead of being pickled to every process.
+
+Kinds map onto the existing scripts and CSV layouts:
+- 'wb':  WriteBack.py L1I/L1D sweep -> WBResults/<trace>_wb.csv
+- 'wt':  WriteThrough.py L1I/L1D sweep -> WTResults/<trace>_wt.csv
+- 'wb5': Step5WB.py L2 sweep behind the fixed L1s -> Pt5Results/<trace>_wb5.csv
+"""
+import csv
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import product
+
+import Step5WB
+import WriteBack
+import WriteThrough
+from MissClassify import shadow_classes
+from Replacement import policy_cache
+from TraceFormat import BinaryTrace, load_trace
+
+RESULT_DIRS = {'wb': 'WBResults', 'wt': 'WTResults', 'wb5': 'Pt5Results'}
+FIELDNAMES = {'wb': WriteBack.FIELDNAMES, 'wt': WriteThrough.FIELDNAMES, 'wb5': Step5WB.FIELDNAMES}
+DEFAULT_CONFIG = (1024, 32)  # L1 total size and block size used by the scripts
+
+_open_traces = {}  # Binary traces already mapped in this worker, keyed by path
+_shadow_classes = {}  # 3C shadow classes already computed in this worker, keyed by (path, size, block size)
+
+
+def _worker_trace(binary_path):
+    # Maps each binary trace once per worker process and reuses it for later points
+    trace = _open_traces.get(binary_path)
+    if trace is None:
+        trace = _open_traces[binary_path] = BinaryTrace(binary_path, verify=False)  # Parent already verified it
+    return trace
+
+
+def run_point(kind, binary_path, total_size_bytes, block_size_bytes, assoc, hit_time=1, miss_penalty=100, policy='lru'):
+    """
+    Simulates one sweep point in a worker and returns its CSV row.
+    The 'wb5' L1s and L2 size are fixed by Step5WB, so it only uses assoc.
+    policy picks the replacement policy (see Replacement.POLICIES); 'lru' runs the usual dict caches.
+    """
+    trace_lines = _worker_trace(binary_path)
+    if kind == 'wb':
+        key = (binary_path, total_size_bytes, block_size_bytes)
+        classes = _shadow_classes.get(key)
+        if classes is None:
+            classes = _shadow_classes[key] = shadow_classes(trace_lines, total_size_bytes, block_size_bytes)
+        cache_class = WriteBack.WriteBackCache if policy == 'lru' else policy_cache(policy)
+        *counts, i_breakdown, d_breakdown = WriteBack.simulate_classified(trace_lines, classes, total_size_bytes, block_size_bytes,
+                                                                          assoc, cache_class)
+        return WriteBack.make_row(assoc, *counts, hit_time, miss_penalty, i_breakdown, d_breakdown, policy)
+    if kind == 'wt':
+        simulation = WriteThrough.CacheSimulation(total_size_bytes, block_size_bytes, hit_time, miss_penalty)
+        cache_class = None if policy == 'lru' else policy_cache(policy, write_through=True)
+        return WriteThrough.make_row(assoc, simulation.simulate_trace(assoc, trace_lines, cache_class), policy)
+    if kind == 'wb5':
+        l2_class = None if policy == 'lru' else policy_cache(policy)  # Only the L2 changes policy, the L1s are fixed
+        *counts, l2_breakdown = Step5WB.simulate_assoc(trace_lines, assoc, l2_class)
+        return Step5WB.make_row(assoc, *counts, hit_time, miss_penalty, l2_breakdown, policy)
+    raise ValueError(f"Unknown sweep kind {kind!r}, expected one of {sorted(RESULT_DIRS)}")
+
+
+def result_filename(kind, trace_name, total_size_bytes, block_size_bytes, policy='lru'):
+    # The scripts' default config keeps the usual CSV name, other configs get their sizes (and policy) appended
+    name = f"{trace_name}_{kind}"
+    if (total_size_bytes, block_size_bytes) != DEFAULT_CONFIG:
+        name += f"_{total_size_bytes}_{block_size_bytes}"
+    if policy != 'lru':
+        name += f"_{policy}"
+    return os.path.join(RESULT_DIRS[kind], name + '.csv')
+
+
+def run_sweep(trace_names, kinds=('wb', 'wt', 'wb5'), associativities=(1, 2, 4, 8, 16, 32),
+              cache_sizes=(1024,), block_sizes=(32,), hit_time=1, miss_penalty=100, max_workers=None, store=None,
+              policies=('lru',)):
+    """
+    Runs every point of the sweep in parallel and writes one CSV per
+    (kind, trace, cache size, block size), rows in associativity order.
+
+    Args:
+    - trace_names: Traces under traces/, e.g. ['cc', 'spice', 'tex']
+    - kinds: Any of 'wb', 'wt', 'wb5'
+    - associativities, cache_sizes, block_sizes: The grid of cache parameters ('wb5' only sweeps associativities)
+    - policies: Replacement policies to sweep, any of Replacement.POLICIES ('wb5' applies them to the L2)
+    - max_workers: Worker processes, defaults to the number of CPUs
+    - store: Optional ResultStore; points already in it aren't simulated again, new ones are added
+
+    Returns:
+    - The list of CSV files written
+    """
+    binary_paths, digests = {}, {}
+    for trace_name in trace_names:
+        trace = load_trace(f"traces/{trace_name}.trace")  # Converts (once) and checks the cached binary trace
+        binary_paths[trace_name] = os.path.abspath(trace.file_path)
+        digests[trace_name] = trace.source_sha256
+        trace.close()
+
+    futures = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for kind, trace_name, policy in product(kinds, trace_names, policies):
+            configs = [DEFAULT_CONFIG] if kind == 'wb5' else list(product(cache_sizes, block_sizes))
+            for (total_size_bytes, block_size_bytes), assoc in product(configs, associativities):
+                key = (kind, trace_name, total_size_bytes, block_size_bytes, policy)
+                fields = row = None
+                if store is not None:
+                    fields = store.fields(digests[trace_name], kind, total_size_bytes, block_size_bytes, assoc, hit_time,
+                                          miss_penalty, policy=policy)
+                    row = store.get(fields)
+                if row is None:
+                    row = executor.submit(run_point, kind, binary_paths[trace_name], total_size_bytes,
+                                          block_size_bytes, assoc, hit_time, miss_penalty, policy)
+                futures.setdefault(key, []).append((fields, row))
+
+        csv_filenames = []
+        for (kind, trace_name, total_size_bytes, block_size_bytes, policy), points in futures.items():
+            csv_filename = result_filename(kind, trace_name, total_size_bytes, block_size_bytes, policy)
+            with open(csv_filename, 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES[kind])
+                writer.writeheader()
+                for fields, row in points:
+                    if isinstance(row, Future):
+                        row = row.result()
+                        if fields is not None:
+                            store.put(fields, row)
+                    writer.writerow(row)
+            print(f"Results have been written to {csv_filename}")
+            csv_filenames.append(csv_filename)
+    return csv_filenames
+
+
+if __name__ == '__main__':
+    run_sweep(['cc', 'spice', 'tex'])
@@ -0,0 +1,244 @@
+"""
+Event-driven timing model for the L1I/L1D(/L2) hierarchy.
+
+The scripts estimate AMAT after the fact from miss rates and a fixed penalty.
+TimingModel instead replays the trace against a cycle clock:
+- each level has its own hit latency; DRAM has a latency plus a channel that
+  moves dram_bytes_per_cycle, so back-to-back misses queue behind each other
+- L1D misses take an MSHR; a miss to a block that's already in flight merges
+  into its MSHR instead of going out again, and with every MSHR busy the core
+  waits for the earliest one to finish
+- dirty blocks evicted towards DRAM go into a bounded writeback buffer that
+  drains over the same channel; when it's full the eviction waits
+- the core issues one reference per cycle; instruction fetch misses and load
+  misses block it (blocking_loads=False lets loads run ahead like stores do,
+  bounded only by the MSHRs), store misses only hold their MSHR
+
+The caches are the functional WriteBackCache, so the L1 hits and misses are the
+same as WriteBack.py's (the L2 sees every L1 miss, unlike Step5WB's). The event
+queue is a heap of MSHR completion times plus a FIFO of writeback drain times,
+and both are only touched on misses.
+
+L1 write-backs are written into the L2 off the critical path; if that misses
+in the L2, the fill is counted as DRAM traffic but nobody waits for it.
+"""
+import csv
+import heapq
+import os
+from collections import deque
+
+from WriteBack import WriteBackCache
+
+FIELDNAMES = ['L2 assoc.', 'References', 'Cycles', 'Cycles per reference', 'Fetch stall', 'Load stall', 'MSHR full stall',
+              'Writeback full stall', 'MSHR merges', 'L1I misses', 'L1D misses', 'L2 misses', 'DRAM bytes read',
+              'DRAM bytes written', 'DRAM bytes per cycle']
+
+
+class TimedWriteBackCache(WriteBackCache):
+    # WriteBackCache that remembers the addresses of the dirty blocks it evicts
+
+    def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
+        super().__init__(total_size_bytes, block_size_bytes, blocks_per_set)
+        self.evicted = []  # Addresses of written-back blocks, emptied by the TimingModel
+        self._loading_set = 0
+
+    def load_block(self, set_index, tag, dirty=False):
+        self._loading_set = set_index
+        super().load_block(set_index, tag, dirty)
+
+    def write_back(self, block):
+        self.evicted.append((block['tag'] * self.sets + self._loading_set) * self.block_size_bytes)
+        super().write_back(block)
+
+
+class TimingModel:
+    def __init__(self, l1_config=(1024, 32, 2), l2_config=(16384, 128, 8), l1_hit=1, l2_hit=10, dram_latency=100,
+                 dram_bytes_per_cycle=8, mshrs=4, writeback_entries=8, blocking_loads=True):
+        """
+        Args:
+        - l1_config: (total size, block size, ways) of the L1I and of the L1D
+        - l2_config: (total size, block size, ways) of the unified L2, or None to go straight to DRAM
+        - l1_hit, l2_hit, dram_latency: Latencies in cycles
+        - dram_bytes_per_cycle: DRAM channel bandwidth
+        - mshrs: Outstanding L1D misses allowed
+        - writeback_entries: Size of the writeback buffer in front of DRAM
+        """
+        self.i_cache = TimedWriteBackCache(*l1_config)
+        self.d_cache = TimedWriteBackCache(*l1_config)
+        self.l2_cache = TimedWriteBackCache(*l2_config) if l2_config else None
+        self.l1_block = l1_config[1]
+        self.dram_block = l2_config[1] if l2_config else l1_config[1]  # Bytes per DRAM transfer
+        self.transfer_cycles = max(1, -(-self.dram_block // dram_bytes_per_cycle))
+        self.l1_hit, self.l2_hit, self.dram_latency = l1_hit, l2_hit, dram_latency
+        self.mshrs, self.writeback_entries, self.blocking_loads = mshrs, writeback_entries, blocking_loads
+
+        self.now = 0
+        self.dram_free_at = 0  # Cycle the DRAM channel can start its next transfer
+        self.in_flight = {}  # L1D block number -> cycle its fill completes
+        self.mshr_heap = []  # (completion cycle, block number) of the in-flight misses
+        self.writeback_buffer = deque()  # Drain completion cycles, oldest first
+
+        self.references = 0
+        self.fetch_stall = self.load_stall = self.mshr_stall = self.writeback_stall = 0
+        self.mshr_merges = 0
+        self.i_misses = self.d_misses = self.l2_misses = 0
+        self.dram_reads = self.dram_writes = 0
+
+    # ------------------------------------------------------------ memory side
+
+    def _dram_transfer(self, start):
+        # Queues one block on the DRAM channel at cycle start, returns when the transfer finishes
+        begin = max(start, self.dram_free_at)
+        self.dram_free_at = begin + self.transfer_cycles
+        return self.dram_free_at
+
+    def _dram_read(self, start):
+        self.dram_reads += 1
+        return self._dram_transfer(start + self.dram_latency)
+
+    def _dram_write_back(self):
+        # Puts one dirty block in the writeback buffer, waiting for a free entry if it's full
+        buffer = self.writeback_buffer
+        while buffer and buffer[0] <= self.now:
+            buffer.popleft()
+        if len(buffer) >= self.writeback_entries:
+            self.writeback_stall += buffer[0] - self.now
+            self.now = buffer.popleft()
+        self.dram_writes += 1
+        buffer.append(self._dram_transfer(self.now))
+
+    def _drain_evictions(self, cache):
+        # Sends a cache's freshly evicted dirty blocks on towards DRAM
+        evicted = cache.evicted
+        while evicted:
+            address = evicted.pop()
+            if cache is self.l2_cache or self.l2_cache is None:
+                self._dram_write_back()
+            else:
+                if not self.l2_cache.write(address):
+                    self.l2_misses += 1
+                    self._dram_read(self.now)  # Off the critical path, only costs bandwidth
+                self._drain_evictions(self.l2_cache)
+
+    def _fill_latency(self, address):
+        # Cycles from an L1 miss until its block arrives
+        if self.l2_cache is None:
+            return self._dram_read(self.now) - self.now
+        hit = self.l2_cache.read(address)
+        self._drain_evictions(self.l2_cache)
+        if hit:
+            return self.l2_hit
+        self.l2_misses += 1
+        return self._dram_read(self.now + self.l2_hit) - self.now
+
+    # ------------------------------------------------------------ core side
+
+    def _retire(self):
+        # Frees the MSHRs whose fills have completed
+        heap, in_flight = self.mshr_heap, self.in_flight
+        while heap and heap[0][0] <= self.now:
+            _, block = heapq.heappop(heap)
+            if in_flight.get(block, -1) <= self.now:
+                in_flight.pop(block, None)
+
+    def _data_miss(self, address, block, is_load):
+        # Allocates an MSHR (waiting for one if they're all busy) and sends the miss out
+        if len(self.mshr_heap) >= self.mshrs:
+            ready = self.mshr_heap[0][0]
+            self.mshr_stall += ready - self.now
+            self.now = ready
+            self._retire()
+        latency = self._fill_latency(address)  # May itself wait on the writeback buffer
+        ready = self.now + latency
+        heapq.heappush(self.mshr_heap, (ready, block))
+        self.in_flight[block] = ready
+        if is_load and self.blocking_loads:
+            self.load_stall += ready - self.now
+            self.now = ready
+
+    def access(self, reference_type, address):
+        # Advances the clock over one trace reference
+        self.references += 1
+        self.now += self.l1_hit
+        if self.mshr_heap and self.mshr_heap[0][0] <= self.now:
+            self._retire()
+
+        if reference_type == 2:  # Instruction fetch, always blocking
+            if not self.i_cache.read(address):
+                self.i_misses += 1
+                latency = self._fill_latency(address)
+                self.fetch_stall += latency
+                self.now += latency
+            return
+
+        block = address // self.l1_block
+        is_load = reference_type == 0
+        ready = self.in_flight.get(block)
+        hit = self.d_cache.write(address) if reference_type == 1 else self.d_cache.read(address)
+        if self.d_cache.evicted:
+            self._drain_evictions(self.d_cache)
+        if ready is not None and ready > self.now:
+            # Block is still on its way: merge into the in-flight miss
+            self.mshr_merges += 1
+            if is_load and self.blocking_loads:
+                self.load_stall += ready - self.now
+                self.now = ready
+        elif not hit:
+            self.d_misses += 1
+            self._data_miss(address, block, is_load)
+
+    def run(self, trace_lines):
+        access = self.access
+        for reference_type, address in trace_lines:
+            access(reference_type, address)
+        return self.results()
+
+    def results(self):
+        # Totals so far; the clock runs on until every outstanding fill and write-back is done
+        cycles = max([self.now, self.dram_free_at] + [ready for ready, _ in self.mshr_heap])
+        return {
+            'References': self.references,
+            'Cycles': cycles,
+            'Cycles per reference': f"{cycles / self.references if self.references else 0:.3f}",
+            'Fetch stall': self.fetch_stall,
+            'Load stall': self.load_stall,
+            'MSHR full stall': self.mshr_stall,
+            'Writeback full stall': self.writeback_stall,
+            'MSHR merges': self.mshr_merges,
+            'L1I misses': self.i_misses,
+            'L1D misses': self.d_misses,
+            'L2 misses': self.l2_misses,
+            'DRAM bytes read': self.dram_reads * self.dram_block,
+            'DRAM bytes written': self.dram_writes * self.dram_block,
+            'DRAM bytes per cycle': f"{(self.dram_reads + self.dram_writes) * self.dram_block / cycles if cycles else 0:.3f}"
+        }
+
+
+def timing_sweep(trace_name, associativities=(1, 2, 4, 8, 16, 32), l2_size=(16384, 128), trace_lines=None,
+                 output_dir='TimingResults', **model_args):
+    """
+    Runs the timing model over the Step5WB hierarchy (l2_size is the L2's total and block size)
+    for each L2 associativity and writes one CSV row each.
+    model_args go to TimingModel (latencies, bandwidth, MSHRs, writeback buffer...).
+    """
+    if trace_lines is None:
+        from TraceFormat import load_trace
+        trace_lines = load_trace(f"traces/{trace_name}.trace")
+    os.makedirs(output_dir, exist_ok=True)
+    csv_filename = os.path.join(output_dir, f"{trace_name}_timing.csv")
+
+    with open(csv_filename, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for assoc in associativities:
+            row = TimingModel(l2_config=(*l2_size, assoc), **model_args).run(trace_lines)
+            row['L2 assoc.'] = assoc
+            writer.writerow(row)
+
+    print(f"Results have been written to {csv_filename}")
+    return csv_filename
+
+
+if __name__ == '__main__':
+    filename = 'tex'  # Write 'cc', 'spice', or 'tex' here to change trace
+    timing_sweep(filename)
@@ -0,0 +1,223 @@
+"""
+Compact binary trace format, memory-mapped and cached next to the text traces.
+
+A text trace 'traces/cc.trace' is converted once to 'traces/cc.trace.bin':
+
+    header (128 bytes) | op column (uint8 * count) | pad to 8 | address column (uint64 * count)
+
+The header records the source file's size, mtime and SHA-256 so load_trace can
+tell when the cached file is stale, plus a CRC-32 of both columns. Loading maps
+the file and hands out memoryviews over the columns, so nothing is parsed and
+the trace doesn't have to fit in RAM as Python tuples.
+"""
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+
+MAGIC = b'CTRC'
+VERSION = 1
+HEADER = struct.Struct('<4sHBxQQQI32s')  # magic, version, big-endian flag, count, src size, src mtime_ns, crc32, src sha256
+HEADER_SIZE = 128  # Header is padded out to here
+MTIME_OFFSET = struct.calcsize('<4sHBxQQ')
+CHUNK_LINES = 1 << 20
+
+
+class BinaryTrace:
+    """
+    A memory-mapped binary trace. Iterating yields (reference_type, address)
+    tuples, so it can be passed anywhere a list from read_trace_file is used.
+
+    - ops: memoryview of uint8 reference types
+    - addresses: memoryview of uint64 addresses
+    """
+
+    def __init__(self, file_path, verify=True):
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = read_header(self._mmap)
+        if header is None:
+            self._mmap.close()
+            raise ValueError(f"{file_path} is not a binary trace")
+        self.count = header['count']
+        self.source_size = header['source_size']
+        self.source_mtime_ns = header['source_mtime_ns']
+        self.source_sha256 = header['source_sha256']
+
+        self._view = memoryview(self._mmap)  # Released with the column views in close(), or the mmap won't close
+        address_offset = _address_offset(self.count)
+        self.ops = self._view[HEADER_SIZE:HEADER_SIZE + self.count]
+        self.addresses = self._view[address_offset:address_offset + 8 * self.count].cast('Q')
+        if verify and zlib.crc32(self.addresses, zlib.crc32(self.ops)) != header['crc32']:
+            self.close()
+            raise ValueError(f"{file_path} failed its checksum")
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return zip(self.ops, self.addresses)
+
+    def close(self):
+        self.ops.release()
+        self.addresses.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _address_offset(count):
+    # Address column starts on the next 8-byte boundary after the op column
+    return HEADER_SIZE + (count + 7) // 8 * 8
+
+
+def read_header(buffer):
+    # Parses the header at the start of buffer, None if it isn't one of ours (or from another byte order)
+    if len(buffer) < HEADER_SIZE:
+        return None
+    magic, version, big_endian, count, size, mtime_ns, crc, digest = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION or big_endian != (sys.byteorder == 'big'):
+        return None
+    return {'count': count, 'source_size': size, 'source_mtime_ns': mtime_ns, 'crc32': crc, 'source_sha256': digest}
+
+
+def file_digest(file_path):
+    # SHA-256 of the file contents, read in 1 MiB chunks
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def convert_trace(text_path, binary_path=None):
+    """
+    Converts a text trace ("<reference_type> <hex address>" per line) to the binary format.
+
+    The columns are streamed to temporary files in chunks, so memory stays constant
+    however long the trace is. The finished file is renamed into place atomically.
+
+    Returns:
+    - The path of the binary trace
+    """
+    binary_path = binary_path or text_path + '.bin'
+    directory = os.path.dirname(os.path.abspath(binary_path))
+    source = os.stat(text_path)
+    digest = hashlib.sha256()
+    count, crc_ops = 0, 0
+
+    with tempfile.TemporaryFile(dir=directory) as address_file:
+        out_fd, out_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(out_fd, 'wb') as out, open(text_path, 'rb') as text:
+                out.write(bytes(HEADER_SIZE))
+                ops, addresses = array('B'), array('Q')
+                for line in text:
+                    digest.update(line)
+                    parts = line.split()
+                    if len(parts) == 2:
+                        ops.append(int(parts[0]))
+                        addresses.append(int(parts[1], 16))
+                        if len(ops) == CHUNK_LINES:
+                            crc_ops = zlib.crc32(ops, crc_ops)
+                            count += len(ops)
+                            ops.tofile(out)
+                            addresses.tofile(address_file)
+                            ops, addresses = array('B'), array('Q')
+                crc_ops = zlib.crc32(ops, crc_ops)
+                count += len(ops)
+                ops.tofile(out)
+                addresses.tofile(address_file)
+
+                # Pad the op column, then append the address column and its checksum
+                out.write(bytes(_address_offset(count) - HEADER_SIZE - count))
+                crc = crc_ops
+                address_file.seek(0)
+                for chunk in iter(lambda: address_file.read(1 << 20), b''):
+                    crc = zlib.crc32(chunk, crc)
+                address_file.seek(0)
+                shutil.copyfileobj(address_file, out)
+
+                out.seek(0)
+                out.write(HEADER.pack(MAGIC, VERSION, sys.byteorder == 'big', count, source.st_size,
+                                      source.st_mtime_ns, crc, digest.digest()))
+            os.chmod(out_path, 0o644)  # mkstemp files are owner-only
+            os.replace(out_path, binary_path)
+        except BaseException:
+            os.unlink(out_path)
+            raise
+    return binary_path
+
+
+def write_binary_trace(binary_path, ops, addresses, source_sha256=bytes(32)):
+    """
+    Writes in-memory (ops, addresses) columns straight to a binary trace, e.g. a
+    filtered stream derived from another trace. source_sha256 should identify
+    what it was derived from; there is no text source, so size and mtime are 0.
+    """
+    ops, addresses = array('B', ops), array('Q', addresses)
+    directory = os.path.dirname(os.path.abspath(binary_path))
+    out_fd, out_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(out_fd, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, VERSION, sys.byteorder == 'big', len(ops), 0, 0,
+                                  zlib.crc32(addresses, zlib.crc32(ops)), source_sha256))
+            out.write(bytes(HEADER_SIZE - HEADER.size))
+            ops.tofile(out)
+            out.write(bytes(_address_offset(len(ops)) - HEADER_SIZE - len(ops)))
+            addresses.tofile(out)
+        os.chmod(out_path, 0o644)  # mkstemp files are owner-only
+        os.replace(out_path, binary_path)
+    except BaseException:
+        os.unlink(out_path)
+        raise
+    return binary_path
+
+
+def is_current(text_path, binary_path):
+    """
+    Checks whether binary_path is a valid conversion of the current text_path.
+    Matching size and mtime is trusted as-is; otherwise the source is re-hashed
+    and the cached file is still used if the contents didn't actually change.
+    """
+    try:
+        with open(binary_path, 'rb') as file:
+            header = read_header(file.read(HEADER_SIZE))
+    except OSError:
+        return False
+    if header is None:
+        return False
+    source = os.stat(text_path)
+    if header['source_size'] != source.st_size:
+        return False
+    if header['source_mtime_ns'] == source.st_mtime_ns:
+        return True
+    if file_digest(text_path) != header['source_sha256']:
+        return False
+    # Only touched: record the new mtime so the next check doesn't re-hash
+    with open(binary_path, 'r+b') as file:
+        file.seek(MTIME_OFFSET)
+        file.write(struct.pack('<Q', source.st_mtime_ns))
+    return True
+
+
+def load_trace(text_path, verify=True):
+    """
+    Returns a BinaryTrace for the given text trace, converting it first if there
+    is no cached '<text_path>.bin' or the text trace changed since it was made.
+    """
+    binary_path = text_path + '.bin'
+    if not is_current(text_path, binary_path):
+        convert_trace(text_path, binary_path)
+    return BinaryTrace(binary_path, verify)
@@ -0,0 +1,99 @@
+"""
+Streaming, constant-memory trace reader for plain and compressed traces.
+
+TraceStream reads a trace in fixed-size batches instead of building the whole
+list up front, so a trace of any size runs in the memory of one batch. The
+compression is detected from the file's magic bytes: gzip, bz2 and xz/lzma come
+from the standard library, and zstd is used when the interpreter ships
+compression.zstd (Python 3.14+).
+
+A TraceStream can be iterated more than once (each pass re-opens the file), so
+it can be handed to any of the simulators in place of a read_trace_file list.
+"""
+import bz2
+import gzip
+import lzma
+from array import array
+from itertools import chain
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+BATCH_BYTES = 1 << 20  # Roughly 75k references per batch for typical traces
+
+MAGIC_OPENERS = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+    (b'\x28\xb5\x2f\xfd', zstd.open if zstd else None),
+]
+
+
+def open_trace(file_path):
+    # Opens a trace for binary reading, decompressing it based on its magic bytes
+    with open(file_path, 'rb') as file:
+        magic = file.read(6)
+    for prefix, opener in MAGIC_OPENERS:
+        if magic.startswith(prefix):
+            if opener is None:
+                raise ValueError(f"{file_path} is zstd-compressed, which needs Python 3.14's compression.zstd")
+            return opener(file_path, 'rb')
+    return open(file_path, 'rb')
+
+
+def parse_batch(data):
+    """
+    Parses a chunk of complete trace lines into (ops, addresses) arrays.
+    Lines that don't have exactly two fields are skipped, like read_trace_file does.
+    """
+    lines = data.splitlines()
+    if all(count == 2 for count in map(len, map(bytes.split, lines))):
+        # Every line is well formed, so the flat token list alternates op, address: parse the columns straight from it
+        tokens = data.split()
+        return array('B', map(int, tokens[0::2])), array('Q', [int(address, 16) for address in tokens[1::2]])
+    ops, addresses = array('B'), array('Q')
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 2:
+            ops.append(int(parts[0]))
+            addresses.append(int(parts[1], 16))
+    return ops, addresses
+
+
+class TraceStream:
+    """
+    Re-iterable stream over a (possibly compressed) text trace.
+
+    - batches() yields (ops, addresses) arrays, one pair per chunk of the file
+    - iterating yields (reference_type, address) tuples, like read_trace_file's list
+    """
+
+    def __init__(self, file_path, batch_bytes=BATCH_BYTES):
+        self.file_path = file_path
+        self.batch_bytes = batch_bytes
+
+    def batches(self):
+        with open_trace(self.file_path) as file:
+            leftover = b''
+            while True:
+                chunk = file.read(self.batch_bytes)
+                if not chunk:
+                    break
+                # Hold back the partial last line until the next chunk completes it
+                cut = chunk.rfind(b'\n') + 1
+                if cut == 0:
+                    leftover += chunk
+                    continue
+                ops, addresses = parse_batch(leftover + chunk[:cut])
+                leftover = chunk[cut:]
+                if ops:
+                    yield ops, addresses
+            if leftover.strip():
+                ops, addresses = parse_batch(leftover)
+                if ops:
+                    yield ops, addresses
+
+    def __iter__(self):
+        return chain.from_iterable(zip(ops, addresses) for ops, addresses in self.batches())
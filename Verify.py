@@ -0,0 +1,312 @@
+"""
+Golden-result differential harness for the fast cache engines.
+
+The dict-based WriteBackCache/WriteThroughCache are the reference semantics.
+Every alternative engine is checked against them on the same trace:
+- cache classes with the same read/write API (array, LRU) are compared on every
+  single hit/miss decision, and the first divergent access is reported;
+- engines that only produce totals (one-pass sweep, pre-decoded, lockstep,
+  run-length) are compared on their counters;
+- set-partitioned simulation can't run the LRU caches (their sets share one
+  access_sequence), so it is compared with a plain replay of a policy whose sets
+  are independent;
+- set sampling is only an estimate, but with every set sampled it has to give
+  the exact counts.
+Each check also records the engine's speedup over the reference, and the
+reference rows are diffed against the checked-in WBResults/, WTResults/ and
+Pt5Results/ CSVs; a CSV that differs fails the run unless the diff is turned
+off (verify_trace(name, csv_diff=False), or --no-csv-diff on the command line).
+"""
+import csv
+import sys
+import time
+from itertools import islice
+
+import Step5WB
+import WriteBack
+import WriteThrough
+from AddressDecode import DecodedTrace, simulate_decoded
+from ArrayCache import ArrayWriteBackCache, ArrayWriteThroughCache
+from LRUCache import LRUWriteBackCache, LRUWriteThroughCache
+from MissClassify import shadow_classes
+from Replacement import policy_cache
+from RunLength import collapse_runs, simulate_runs
+from Lockstep import LockstepSimulation
+from SetPartition import simulate_partitioned
+from SetSampling import Z_SCORES, estimate, sample_trace, simulate_sampled
+from StackDistance import sweep_associativities
+from TraceFormat import load_trace
+
+ASSOCIATIVITIES = [1, 2, 4, 8, 16, 32]
+REFERENCE_CLASSES = {'wb': WriteBack.WriteBackCache, 'wt': WriteThrough.WriteThroughCache}
+CANDIDATE_CLASSES = {
+    'wb': {'array': ArrayWriteBackCache, 'lru': LRUWriteBackCache, 'policy-lru': policy_cache('lru')},
+    'wt': {'array': ArrayWriteThroughCache, 'lru': LRUWriteThroughCache, 'policy-lru': policy_cache('lru', write_through=True)},
+}
+
+
+def record_decisions(trace_lines, total_size_bytes, block_size_bytes, assoc, cache_class):
+    """
+    Replays the trace through an L1I/L1D pair and records every hit (1) or miss (0).
+
+    Returns:
+    - (decisions bytearray, seconds)
+    """
+    i_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    d_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    accessors = (d_cache.read, d_cache.write, i_cache.read)  # Indexed by reference type
+    decisions = bytearray()
+    append = decisions.append
+    start = time.perf_counter()
+    for reference_type, address in trace_lines:
+        append(accessors[reference_type](address))
+    return decisions, time.perf_counter() - start
+
+
+def check_decisions(trace_lines, kind, engine, total_size_bytes=1024, block_size_bytes=32, associativities=ASSOCIATIVITIES):
+    """
+    Compares a candidate cache class against the reference on every access.
+
+    Returns:
+    - One report dict per associativity: match, first_mismatch (index, reference_type,
+      address, reference decision) or None, and the speedup
+    """
+    reference_class, candidate_class = REFERENCE_CLASSES[kind], CANDIDATE_CLASSES[kind][engine]
+    reports = []
+    for assoc in associativities:
+        expected, reference_seconds = record_decisions(trace_lines, total_size_bytes, block_size_bytes, assoc, reference_class)
+        actual, candidate_seconds = record_decisions(trace_lines, total_size_bytes, block_size_bytes, assoc, candidate_class)
+        first_mismatch = None
+        if expected != actual:
+            index = next(i for i, (a, b) in enumerate(zip(expected, actual)) if a != b)
+            reference_type, address = next(islice(iter(trace_lines), index, None))
+            first_mismatch = (index, reference_type, address, bool(expected[index]))
+        reports.append(_report(kind, engine, assoc, first_mismatch is None, reference_seconds, candidate_seconds, first_mismatch=first_mismatch))
+    return reports
+
+
+def reference_counts(trace_lines, kind, total_size_bytes, block_size_bytes, assoc):
+    # The reference (i_hits, i_misses, d_hits, d_misses) for one associativity
+    if kind == 'wb':
+        return WriteBack.simulate_assoc(trace_lines, total_size_bytes, block_size_bytes, assoc)
+    return WriteThrough.CacheSimulation(total_size_bytes, block_size_bytes).simulate_trace(assoc, trace_lines)[:4]
+
+
+def counter_engines(trace_lines, kind, total_size_bytes, block_size_bytes, associativities):
+    """
+    Runs each counters-only engine once over all associativities.
+
+    Returns:
+    - {engine: ({assoc: (i_hits, i_misses, d_hits, d_misses)}, seconds)}
+    """
+    reference_class = REFERENCE_CLASSES[kind]
+    results = {}
+
+    start = time.perf_counter()
+    sweep = sweep_associativities(trace_lines, total_size_bytes, block_size_bytes, associativities, write_through=kind == 'wt')
+    counts = {}
+    for assoc, ((read_hits, read_misses), (write_hits, write_misses), (i_hits, i_misses)) in sweep.items():
+        if kind == 'wb':
+            counts[assoc] = (i_hits, i_misses, read_hits + write_hits, read_misses + write_misses)
+        else:
+            counts[assoc] = (i_hits, i_misses, read_hits, read_misses + write_hits + write_misses)
+    results['stack'] = (counts, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    decoded = DecodedTrace(trace_lines, block_size_bytes)
+    counts = {assoc: simulate_decoded(decoded, total_size_bytes, assoc, reference_class) for assoc in associativities}
+    results['decoded'] = (counts, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    rows = LockstepSimulation([(reference_class, total_size_bytes, block_size_bytes, assoc) for assoc in associativities]).run(trace_lines)
+    counts = {row['Assoc.']: (row['L1I accesses'], row['L1I misses'], row['L1D accesses'], row['L1D misses']) for row in rows}
+    results['lockstep'] = (counts, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    collapsed = collapse_runs(trace_lines, block_size_bytes)
+    counts = {assoc: simulate_runs(collapsed, total_size_bytes, assoc, reference_class) for assoc in associativities}
+    results['runs'] = (counts, time.perf_counter() - start)
+    return results
+
+
+def check_counters(trace_lines, kind, total_size_bytes=1024, block_size_bytes=32, associativities=ASSOCIATIVITIES):
+    """
+    Compares every counters-only engine against the reference.
+
+    Returns:
+    - One report dict per (engine, associativity), with the mismatching counters if any.
+      The speedup compares the engine's whole sweep against the reference's whole sweep.
+    """
+    expected, reference_seconds = {}, 0.0
+    for assoc in associativities:
+        start = time.perf_counter()
+        expected[assoc] = tuple(reference_counts(trace_lines, kind, total_size_bytes, block_size_bytes, assoc))
+        reference_seconds += time.perf_counter() - start
+
+    reports = []
+    for engine, (counts, seconds) in counter_engines(trace_lines, kind, total_size_bytes, block_size_bytes, associativities).items():
+        for assoc in associativities:
+            actual = tuple(counts[assoc])
+            reports.append(_report(kind, engine, assoc, actual == expected[assoc], reference_seconds, seconds,
+                                   expected=expected[assoc], actual=actual))
+    return reports
+
+
+def check_partition(trace_lines, kind, policy='plru', total_size_bytes=1024, block_size_bytes=32, associativities=ASSOCIATIVITIES,
+                    max_workers=2):
+    """
+    Compares SetPartition against a plain replay of the same cache class. The LRU caches share their
+    access_sequence across sets and can't be partitioned, so this runs a policy with independent sets.
+
+    Returns:
+    - One report dict per associativity, engine 'partition-<policy>'
+    """
+    cache_class = policy_cache(policy, write_through=kind == 'wt')
+    reports = []
+    for assoc in associativities:
+        start = time.perf_counter()
+        expected = WriteBack.simulate_assoc(trace_lines, total_size_bytes, block_size_bytes, assoc, cache_class)
+        reference_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = simulate_partitioned(trace_lines, total_size_bytes, block_size_bytes, assoc, cache_class, max_workers)
+        reports.append(_report(kind, f'partition-{policy}', assoc, tuple(actual) == tuple(expected), reference_seconds,
+                               time.perf_counter() - start, expected=tuple(expected), actual=tuple(actual)))
+    return reports
+
+
+def check_sampling(trace_lines, total_size_bytes=1 << 20, block_size_bytes=32, associativities=ASSOCIATIVITIES):
+    """
+    Checks that SetSampling with every set sampled (fraction=1) gives exactly WriteBack.simulate_assoc's
+    counts, at SetSampling's default 1 MiB cache.
+
+    Returns:
+    - One report dict per associativity, engine 'sampling'
+    """
+    set_counts = {assoc: total_size_bytes // (block_size_bytes * assoc) for assoc in associativities}
+    start = time.perf_counter()
+    samples = sample_trace(trace_lines, block_size_bytes, set_counts.values(), 1.0)
+    split_seconds = time.perf_counter() - start
+    reports = []
+    for assoc in associativities:
+        start = time.perf_counter()
+        expected = WriteBack.simulate_assoc(trace_lines, total_size_bytes, block_size_bytes, assoc)
+        reference_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        sampled = samples[set_counts[assoc]]
+        i_accesses, i_misses, d_accesses, d_misses = simulate_sampled(sampled, total_size_bytes, assoc)
+        i_hits, i_misses, _, i_half = estimate(i_accesses, i_misses, sampled.sampled_sets, sampled.i_total, Z_SCORES[0.95])
+        d_hits, d_misses, _, d_half = estimate(d_accesses, d_misses, sampled.sampled_sets, sampled.d_total, Z_SCORES[0.95])
+        actual = (i_hits, i_misses, d_hits, d_misses)
+        seconds = time.perf_counter() - start + split_seconds / len(associativities)
+        reports.append(_report('wb', 'sampling', assoc, actual == tuple(expected) and i_half == d_half == 0, reference_seconds,
+                               seconds, expected=tuple(expected), actual=actual))
+    return reports
+
+
+def _report(kind, engine, assoc, match, reference_seconds, candidate_seconds, **details):
+    report = {'kind': kind, 'engine': engine, 'assoc': assoc, 'match': match,
+              'speedup': round(reference_seconds / candidate_seconds, 2) if candidate_seconds else None}
+    report.update(details)
+    return report
+
+
+def reference_rows(trace_lines, kind, hit_time=1, miss_penalty=100, associativities=ASSOCIATIVITIES):
+    # The CSV rows the reference scripts would write for this trace
+    if kind == 'wt':
+        simulation = WriteThrough.CacheSimulation(H=hit_time, M=miss_penalty)
+        return [WriteThrough.make_row(assoc, simulation.simulate_trace(assoc, trace_lines)) for assoc in associativities]
+    rows = []
+    if kind == 'wb':
+        classes = shadow_classes(trace_lines, 1024, 32)
+        for assoc in associativities:
+            *counts, i_breakdown, d_breakdown = WriteBack.simulate_classified(trace_lines, classes, 1024, 32, assoc)
+            rows.append(WriteBack.make_row(assoc, *counts, hit_time, miss_penalty, i_breakdown, d_breakdown))
+    else:
+        for assoc in associativities:
+            *counts, l2_breakdown = Step5WB.simulate_assoc(trace_lines, assoc)
+            rows.append(Step5WB.make_row(assoc, *counts, hit_time, miss_penalty, l2_breakdown))
+    return rows
+
+
+def diff_csv(csv_filename, rows):
+    """
+    Diffs freshly computed rows against a checked-in CSV.
+
+    Returns:
+    - A list of (row number, column, checked-in value, computed value); checked-in
+      columns the rows don't have are reported as a header mismatch in row 0.
+      Columns only the rows have (e.g. the 3C breakdown) are newer and not compared.
+    """
+    with open(csv_filename, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        expected_rows = list(reader)
+        fieldnames = reader.fieldnames
+
+    differences = []
+    if rows and not set(fieldnames) <= set(rows[0]):
+        differences.append((0, 'header', fieldnames, list(rows[0])))
+        return differences
+    for number, (expected, actual) in enumerate(zip(expected_rows, rows), 1):
+        for column in fieldnames:
+            if expected[column] != str(actual[column]):
+                differences.append((number, column, expected[column], str(actual[column])))
+    if len(expected_rows) != len(rows):
+        differences.append((len(rows) + 1, 'rows', len(expected_rows), len(rows)))
+    return differences
+
+
+def csv_layout(csv_filename, kind):
+    # The reference rows a checked-in CSV was written with: cc_wb.csv and spice_wb.csv are Step5WB sweeps
+    with open(csv_filename, newline='') as csvfile:
+        fieldnames = next(csv.reader(csvfile), [])
+    return 'wb5' if kind == 'wb' and 'L2 accesses' in fieldnames else kind
+
+
+def verify_trace(trace_name, csv_diff=True):
+    """
+    Runs every check for one trace under traces/ and prints a summary.
+
+    Args:
+    - csv_diff: Also diff the reference rows against the checked-in CSVs; a CSV that differs
+      fails the run, a missing one is only reported. False skips the diffs altogether
+
+    Returns:
+    - True if every engine matched the reference and every checked-in CSV matched its rows
+    """
+    trace_lines = load_trace(f"traces/{trace_name}.trace")
+    reports = []
+    for kind in ('wb', 'wt'):
+        for engine in CANDIDATE_CLASSES[kind]:
+            reports += check_decisions(trace_lines, kind, engine)
+        reports += check_counters(trace_lines, kind)
+        reports += check_partition(trace_lines, kind)
+    reports += check_sampling(trace_lines)
+
+    for report in reports:
+        status = 'ok' if report['match'] else 'MISMATCH'
+        print(f"{report['kind']:>3} {report['engine']:>10} assoc={report['assoc']:<3} {status:>8} speedup={report['speedup']}x")
+        if not report['match']:
+            print(f"    {dict((key, value) for key, value in report.items() if key in ('first_mismatch', 'expected', 'actual'))}")
+
+    csvs_match = True
+    if csv_diff:
+        for kind, csv_filename in (('wb', f"WBResults/{trace_name}_wb.csv"), ('wt', f"WTResults/{trace_name}_wt.csv"),
+                                   ('wb5', f"Pt5Results/{trace_name}_wb5.csv")):
+            try:
+                differences = diff_csv(csv_filename, reference_rows(trace_lines, csv_layout(csv_filename, kind)))
+            except OSError:
+                print(f"{csv_filename}: not found")
+                continue
+            print(f"{csv_filename}: {'matches' if not differences else f'{len(differences)} differences'}")
+            for difference in differences[:10]:
+                print(f"    row {difference[0]} {difference[1]}: checked in {difference[2]!r}, computed {difference[3]!r}")
+            csvs_match = csvs_match and not differences
+
+    return all(report['match'] for report in reports) and csvs_match
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    csv_diff = '--no-csv-diff' not in args  # Only check the engines against each other
+    names = [arg for arg in args if arg != '--no-csv-diff'] or ['cc', 'spice', 'tex']
+    sys.exit(0 if all([verify_trace(name, csv_diff) for name in names]) else 1)
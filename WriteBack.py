@@ -7,6 +7,19 @@ This code represents an implementation of steps 3 & 4 for CS
 """
 import csv
 
+from AddressDecode import decode_trace, simulate_decoded
+from ArrayCache import ArrayWriteBackCache
+from LRUCache import LRUWriteBackCache
+from MissClassify import CAPACITY, COMPULSORY, CONFLICT, ShadowCache
+from Replacement import policy_cache
+from RunLength import collapse_runs, simulate_runs
+from SetPartition import check_independent, simulate_partitioned
+from StackDistance import sweep_associativities
+from TraceFormat import load_trace
+
+FIELDNAMES = ['Assoc.', 'L1I accesses', 'L1I misses', 'L1D accesses', 'L1D misses', 'L1I hit rate', 'L1D hit rate', 'L1I AMAT', 'L1D AMAT',
+              'L1I compulsory', 'L1I capacity', 'L1I conflict', 'L1D compulsory', 'L1D capacity', 'L1D conflict', 'Replacement']
+
 
 class WriteBackCache:
     def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
@@ -18,6 +31,7 @@ class WriteBackCache:
         self.sets = total_size_bytes // (block_size_bytes * blocks_per_set)
         self.cache = self._create_cache()
         self.access_sequence = 0  # To manage LRU policy
+        self.write_backs = 0  # Dirty blocks evicted back to main memory
 
     def _create_cache(self):
         # Initialize cache with sets, each containing blocks with a valid bit, dirty bit, tag, and LRU counter
@@ -31,7 +45,10 @@ class WriteBackCache:
 
     def read(self, address):
         # Updates LRU counter on hit, calls load_block to fetch and load block if miss
-        set_index, tag = self._get_set_and_tag(address)
+        return self.read_set_tag(*self._get_set_and_tag(address))
+
+    def read_set_tag(self, set_index, tag):
+        # read() for an address already decoded into set index and tag
         for block in self.cache[set_index]:
             if block['valid'] and block['tag'] == tag:
                 # Update LRU counter on hit
@@ -44,7 +61,10 @@ class WriteBackCache:
 
     def write(self, address):
         # Writes through to main. Updates LRU if block is in cache. Else, load into cache.
-        set_index, tag = self._get_set_and_tag(address)
+        return self.write_set_tag(*self._get_set_and_tag(address))
+
+    def write_set_tag(self, set_index, tag):
+        # write() for an address already decoded into set index and tag
         for block in self.cache[set_index]:
             if block['tag'] == tag:
                 # Update the block as dirty and LRU counter on hit
@@ -56,6 +76,18 @@ class WriteBackCache:
         self.load_block(set_index, tag, dirty=True)
         return False
 
+    def touch_run(self, set_index, tag, repeats, writes):
+        # Bulk version of repeats more hits on a block that was just accessed, writes of them being writes
+        # Returns how many of them count as hits
+        for block in self.cache[set_index]:
+            if block['valid'] and block['tag'] == tag:
+                if writes:
+                    block['dirty'] = True
+                block['lru_counter'] = self.access_sequence + repeats - 1
+                self.access_sequence += repeats
+                return repeats
+        raise ValueError(f"touch_run on a block that isn't cached (set {set_index}, tag {tag})")
+
     def load_block(self, set_index, tag, dirty=False):
         # Finds the LRU block to replace
         lru_block = min(self.cache[set_index], key=lambda x: x['lru_counter'])
@@ -72,11 +104,32 @@ class WriteBackCache:
         # Simulate writing the block back to main memory
         # Actual write-back logic to main memory would go here
         block['dirty'] = False
+        self.write_backs += 1
+
 
+CACHE_CLASSES = {'dict': WriteBackCache, 'array': ArrayWriteBackCache, 'lru': LRUWriteBackCache}  # Replay engines
 
-def WBCacheSimulation(trace_name):
+
+def WBCacheSimulation(trace_name, engine='dict', trace_lines=None, store=None, policy='lru'):
     """ Sims cache given associativity for the passed traces.
         Processes each mem access in trace, calcs hits/misses, hit rates, AMAT.
+        engine='stack' gets every associativity from one pass over the trace (StackDistance) instead of one replay each,
+        engine='array' replays with the compact ArrayWriteBackCache, engine='lru' with the O(1) LRUWriteBackCache,
+        engine='partition' splits the trace by set and simulates the sets in parallel (only for policies whose sets are
+        independent, see SetPartition; the LRU caches share one access_sequence across sets),
+        engine='decoded' replays block numbers decoded once per trace (shared with the WT/WB sweep of the same trace),
+        engine='runs' collapses same-block runs once and replays one record per run (RunLength).
+        trace_lines can be any re-iterable of (reference_type, address), e.g. a TraceStream over a .gz trace,
+        or a Pipeline.PipelinedTrace to read ahead on a background thread (its stall times get printed).
+        The replay engines (dict, array, lru) also split every miss into compulsory/capacity/conflict against a
+        fully-associative shadow (MissClassify) run alongside each replay, so memory stays constant;
+        the counters-only engines leave those columns empty.
+        store is an optional ResultStore: rows already in it are reused and only the missing associativities
+        are simulated (only for traces with a digest, i.e. binary traces from load_trace).
+        policy picks the replacement policy (Replacement.POLICIES). Anything but 'lru' replays with
+        Replacement.policy_cache(policy) and needs engine='dict' or 'partition', since the other engines are LRU only;
+        its rows go to WBResults/<trace>_wb_<policy>.csv. The 3C split stays relative to LRU, so its conflict
+        columns include the policy's replacement misses (see MissClassify).
     """
     associativities = [1, 2, 4, 8, 16, 32]
     total_size_bytes = 1024
@@ -84,53 +137,170 @@ def WBCacheSimulation(trace_name):
     hit_time = 1  # H
     miss_penalty = 100  # M
     csv_filename = f"WBResults/{trace_name}_wb.csv"
+    cache_class = CACHE_CLASSES.get(engine)
+    if policy != 'lru':
+        if engine not in ('dict', 'partition'):
+            raise ValueError(f"engine {engine!r} is LRU only, use engine='dict' for the {policy!r} policy")
+        cache_class = policy_cache(policy)
+        csv_filename = f"WBResults/{trace_name}_wb_{policy}.csv"
+    if engine == 'partition':
+        cache_class = cache_class or WriteBackCache
+        check_independent(cache_class)  # Before the CSV gets truncated
+
+    if trace_lines is None:
+        trace_lines = load_trace(f"traces/{trace_name}.trace")  # Cached binary conversion, parsed once
 
-    trace_lines = read_trace_file(f"traces/{trace_name}.trace")
+    keys, stored = {}, {}
+    trace_sha256 = getattr(trace_lines, 'source_sha256', None)
+    if store is not None and trace_sha256 is not None:
+        for assoc in associativities:
+            keys[assoc] = store.fields(trace_sha256, 'wb', total_size_bytes, block_size_bytes, assoc, hit_time, miss_penalty, engine,
+                                       policy)
+            row = store.get(keys[assoc])
+            if row is not None:
+                stored[assoc] = row
+    missing = [assoc for assoc in associativities if assoc not in stored]
 
     with open(csv_filename, 'w', newline='') as csvfile:
-        fieldnames = ['Assoc.', 'L1I accesses', 'L1I misses', 'L1D accesses', 'L1D misses', 'L1I hit rate', 'L1D hit rate', 'L1I AMAT', 'L1D AMAT']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
         writer.writeheader()
 
+        if missing:  # Shared set-up for the associativities that still need simulating
+            if engine == 'stack':
+                sweep = sweep_associativities(trace_lines, total_size_bytes, block_size_bytes, missing)
+            elif engine == 'decoded':
+                decoded = decode_trace(trace_lines, block_size_bytes)
+            elif engine == 'runs':
+                collapsed = collapse_runs(trace_lines, block_size_bytes)
+
         for assoc in associativities:
-            i_cache = WriteBackCache(total_size_bytes, block_size_bytes, assoc)
-            d_cache = WriteBackCache(total_size_bytes, block_size_bytes, assoc)
-
-            i_hits, i_misses, d_hits, d_misses = 0, 0, 0, 0
-
-            for reference_type, address in trace_lines:
-                if reference_type == 2:  # Instruction read
-                    if i_cache.read(address):
-                        i_hits += 1
-                    else:
-                        i_misses += 1
-                else:  # Data read/write
-                    if d_cache.write(address) if reference_type == 1 else d_cache.read(address):
-                        d_hits += 1
-                    else:
-                        d_misses += 1
-
-            i_miss_rate = i_misses / (i_hits + i_misses) if (i_hits + i_misses) else 0
-            d_miss_rate = d_misses / (d_hits + d_misses) if (d_hits + d_misses) else 0
-            i_amat = hit_time + (i_miss_rate * miss_penalty)
-            d_amat = hit_time + (d_miss_rate * miss_penalty)
-
-            writer.writerow({
-                'Assoc.': assoc,
-                'L1I accesses': i_hits,
-                'L1I misses': i_misses,
-                'L1D accesses': d_hits,
-                'L1D misses': d_misses,
-                'L1I hit rate': f"{i_hits / (i_hits + i_misses) if (i_hits + i_misses) else 0:.4f}",
-                'L1D hit rate': f"{d_hits / (d_hits + d_misses) if (d_hits + d_misses) else 0:.4f}",
-                'L1I AMAT': f"{i_amat:.2f}",
-                'L1D AMAT': f"{d_amat:.2f}"
-            })
+            if assoc in stored:
+                writer.writerow(stored[assoc])
+                continue
+
+            if engine in CACHE_CLASSES:
+                # Classified as it goes rather than from a shared shadow_classes(), which would hold a byte per
+                # reference and break constant-memory streaming of a TraceStream
+                i_hits, i_misses, d_hits, d_misses, i_breakdown, d_breakdown = simulate_classified(
+                    trace_lines, None, total_size_bytes, block_size_bytes, assoc, cache_class)
+            else:
+                if engine == 'stack':
+                    (read_hits, read_misses), (write_hits, write_misses), (i_hits, i_misses) = sweep[assoc]
+                    d_hits, d_misses = read_hits + write_hits, read_misses + write_misses
+                elif engine == 'decoded':
+                    i_hits, i_misses, d_hits, d_misses = simulate_decoded(decoded, total_size_bytes, assoc, WriteBackCache)
+                elif engine == 'partition':
+                    i_hits, i_misses, d_hits, d_misses = simulate_partitioned(trace_lines, total_size_bytes, block_size_bytes, assoc, cache_class)
+                elif engine == 'runs':
+                    i_hits, i_misses, d_hits, d_misses = simulate_runs(collapsed, total_size_bytes, assoc, WriteBackCache)
+                else:
+                    raise ValueError(f"Unknown engine {engine!r}")
+                i_breakdown, d_breakdown = None, None  # Needs per-access decisions
+
+            row = make_row(assoc, i_hits, i_misses, d_hits, d_misses, hit_time, miss_penalty, i_breakdown, d_breakdown, policy)
+            if assoc in keys:
+                store.put(keys[assoc], row)
+            writer.writerow(row)
 
     print(f"Results have been written to {csv_filename}")
+    if hasattr(trace_lines, 'stall_report'):  # PipelinedTrace
+        print(trace_lines.stall_report())
     return csv_filename
 
 
+def make_row(assoc, i_hits, i_misses, d_hits, d_misses, hit_time, miss_penalty, i_breakdown=None, d_breakdown=None, policy='lru'):
+    # Calcs hit rates and AMAT from the counts and formats them as a WBResults CSV row
+    # The 3C columns are left empty unless the [compulsory, conflict, capacity] breakdowns are given
+    i_miss_rate = i_misses / (i_hits + i_misses) if (i_hits + i_misses) else 0
+    d_miss_rate = d_misses / (d_hits + d_misses) if (d_hits + d_misses) else 0
+    i_amat = hit_time + (i_miss_rate * miss_penalty)
+    d_amat = hit_time + (d_miss_rate * miss_penalty)
+
+    return {
+        'Assoc.': assoc,
+        'L1I accesses': i_hits,
+        'L1I misses': i_misses,
+        'L1D accesses': d_hits,
+        'L1D misses': d_misses,
+        'L1I hit rate': f"{i_hits / (i_hits + i_misses) if (i_hits + i_misses) else 0:.4f}",
+        'L1D hit rate': f"{d_hits / (d_hits + d_misses) if (d_hits + d_misses) else 0:.4f}",
+        'L1I AMAT': f"{i_amat:.2f}",
+        'L1D AMAT': f"{d_amat:.2f}",
+        'L1I compulsory': i_breakdown[COMPULSORY] if i_breakdown else '',
+        'L1I capacity': i_breakdown[CAPACITY] if i_breakdown else '',
+        'L1I conflict': i_breakdown[CONFLICT] if i_breakdown else '',
+        'L1D compulsory': d_breakdown[COMPULSORY] if d_breakdown else '',
+        'L1D capacity': d_breakdown[CAPACITY] if d_breakdown else '',
+        'L1D conflict': d_breakdown[CONFLICT] if d_breakdown else '',
+        'Replacement': policy
+    }
+
+
+def simulate_assoc(trace_lines, total_size_bytes, block_size_bytes, assoc, cache_class=WriteBackCache):
+    # Replays the trace through a fresh L1I/L1D pair, returns i_hits, i_misses, d_hits, d_misses
+    i_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    d_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+
+    i_hits, i_misses, d_hits, d_misses = 0, 0, 0, 0
+
+    for reference_type, address in trace_lines:
+        if reference_type == 2:  # Instruction read
+            if i_cache.read(address):
+                i_hits += 1
+            else:
+                i_misses += 1
+        else:  # Data read/write
+            if d_cache.write(address) if reference_type == 1 else d_cache.read(address):
+                d_hits += 1
+            else:
+                d_misses += 1
+
+    return i_hits, i_misses, d_hits, d_misses
+
+
+def simulate_classified(trace_lines, classes, total_size_bytes, block_size_bytes, assoc, cache_class=WriteBackCache):
+    """
+    simulate_assoc that also files every miss under its 3C class.
+
+    Args:
+    - classes: shadow_classes() of the same trace and cache size, or None to run the shadows alongside the
+      caches instead (constant memory, so fine for streamed traces, but the shadows run again every call)
+
+    Returns:
+    - i_hits, i_misses, d_hits, d_misses, and the L1I and L1D [compulsory, conflict, capacity] breakdowns
+    """
+    i_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    d_cache = cache_class(total_size_bytes, block_size_bytes, assoc)
+    accessors = (d_cache.read, d_cache.write, i_cache.read)  # Indexed by reference type
+    i_breakdown, d_breakdown = [0, 0, 0], [0, 0, 0]
+    breakdowns = (d_breakdown, d_breakdown, i_breakdown)
+
+    i_accesses, accesses = 0, 0
+    if classes is None:
+        # The shadows have to see every access, not just the misses, to keep their LRU order
+        i_shadow = ShadowCache(total_size_bytes, block_size_bytes)
+        d_shadow = ShadowCache(total_size_bytes, block_size_bytes)
+        shadows = (d_shadow.access, d_shadow.access, i_shadow.access)
+        for reference_type, address in trace_lines:
+            accesses += 1
+            if reference_type == 2:
+                i_accesses += 1
+            miss_class = shadows[reference_type](address // block_size_bytes)
+            if not accessors[reference_type](address):
+                breakdowns[reference_type][miss_class] += 1
+    else:
+        accesses = len(classes)
+        for (reference_type, address), miss_class in zip(trace_lines, classes):
+            if reference_type == 2:
+                i_accesses += 1
+            if not accessors[reference_type](address):
+                breakdowns[reference_type][miss_class] += 1
+
+    i_misses, d_misses = sum(i_breakdown), sum(d_breakdown)
+    d_accesses = accesses - i_accesses
+    return i_accesses - i_misses, i_misses, d_accesses - d_misses, d_misses, i_breakdown, d_breakdown
+
+
 def read_trace_file(file_path):
     """
     Reads a trace file and returns a list of (reference_type, address) tuples.
@@ -155,6 +325,6 @@ def read_trace_file(file_path):
     return trace_lines
 
 
-filename = 'tex'  # Write 'cc', 'spice', or 'tex' here to change trace
-trace_lines = read_trace_file(f"traces/{filename}.trace")
-WBCacheSimulation(filename)
+if __name__ == '__main__':
+    filename = 'tex'  # Write 'cc', 'spice', or 'tex' here to change trace
+    WBCacheSimulation(filename)
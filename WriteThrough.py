@@ -7,6 +7,17 @@ This code represents an implementation of steps 1 & 2 for CS
 """
 import csv
 
+from AddressDecode import decode_trace, simulate_decoded
+from ArrayCache import ArrayWriteThroughCache
+from LRUCache import LRUWriteThroughCache
+from Replacement import policy_cache
+from RunLength import collapse_runs, simulate_runs
+from StackDistance import sweep_associativities
+from TraceFormat import load_trace
+
+FIELDNAMES = ['Assoc.', 'L1I accesses', 'L1I misses', 'L1D accesses', 'L1D misses', 'L1I hit rate',
+              'L1D hit rate', 'L1I AMAT', 'L1D AMAT', 'Replacement']
+
 
 class WriteThroughCache:
     def __init__(self, total_size_bytes, block_size_bytes, blocks_per_set):
@@ -18,6 +29,7 @@ class WriteThroughCache:
         self.sets = total_size_bytes // (block_size_bytes * blocks_per_set)
         self.cache = self._create_cache()
         self.access_sequence = 0  # To manage LRU policy
+        self.write_backs = 0  # Writes go straight to memory, so this stays 0
 
     def _create_cache(self):
         # Initializes cache with sets, each containing blocks with a valid bit, tag, and LRU counter
@@ -31,7 +43,10 @@ class WriteThroughCache:
 
     def read(self, address):
         # Updates LRU counter on hit, calls load_block to fetch and load block if miss
-        set_index, tag = self._get_set_and_tag(address)
+        return self.read_set_tag(*self._get_set_and_tag(address))
+
+    def read_set_tag(self, set_index, tag):
+        # read() for an address already decoded into set index and tag
         for block in self.cache[set_index]:
             if block['valid'] and block['tag'] == tag:
                 block['lru_counter'] = self.access_sequence
@@ -43,7 +58,10 @@ class WriteThroughCache:
 
     def write(self, address):
         # Writes through to main. Updates LRU if block is in cache. Else, load into cache.
-        set_index, tag = self._get_set_and_tag(address)
+        return self.write_set_tag(*self._get_set_and_tag(address))
+
+    def write_set_tag(self, set_index, tag):
+        # write() for an address already decoded into set index and tag
         block_loaded = False
         for block in self.cache[set_index]:
             if block['tag'] == tag:
@@ -56,6 +74,16 @@ class WriteThroughCache:
         self.access_sequence += 1
         return False  # Always count as a miss for write
 
+    def touch_run(self, set_index, tag, repeats, writes):
+        # Bulk version of repeats more accesses to a block that was just accessed, writes of them being writes
+        # Returns how many of them count as hits; writes always count as misses
+        for block in self.cache[set_index]:
+            if block['valid'] and block['tag'] == tag:
+                block['lru_counter'] = self.access_sequence + repeats - 1
+                self.access_sequence += repeats
+                return repeats - writes
+        raise ValueError(f"touch_run on a block that isn't cached (set {set_index}, tag {tag})")
+
     def load_block(self, set_index, tag):
         # Finds the LRU block to replace
         lru_block = min(self.cache[set_index], key=lambda x: x['lru_counter'])
@@ -64,6 +92,9 @@ class WriteThroughCache:
         lru_block['lru_counter'] = self.access_sequence
 
 
+CACHE_CLASSES = {'dict': WriteThroughCache, 'array': ArrayWriteThroughCache, 'lru': LRUWriteThroughCache}  # Replay engines
+
+
 class CacheSimulation:
     def __init__(self, total_size_bytes=1024, block_size_bytes=32, H=1, M=100):
         # Initializes sim with default cache and block size, as well as hit time and miss penalty
@@ -72,13 +103,15 @@ class CacheSimulation:
         self.H = H
         self.M = M
 
-    def simulate_trace(self, associativity, trace_lines):
+    def simulate_trace(self, associativity, trace_lines, cache_class=None):
         """ Sims cache given associativity for the passed traces.
             Processes each mem access in trace, calcs hits/misses, hit rates, AMAT.
+            cache_class defaults to WriteThroughCache, ArrayWriteThroughCache is the compact backend.
         """
         # Create caches
-        i_cache = WriteThroughCache(self.total_size_bytes, self.block_size_bytes, associativity)
-        d_cache = WriteThroughCache(self.total_size_bytes, self.block_size_bytes, associativity)
+        cache_class = cache_class or WriteThroughCache
+        i_cache = cache_class(self.total_size_bytes, self.block_size_bytes, associativity)
+        d_cache = cache_class(self.total_size_bytes, self.block_size_bytes, associativity)
 
         # Track hits and misses
         i_hits, i_misses, d_hits, d_misses = 0, 0, 0, 0
@@ -102,6 +135,9 @@ class CacheSimulation:
                     else:
                         d_misses += 1  # If it does not exist in d-cache, miss
 
+        return self.make_results(i_hits, i_misses, d_hits, d_misses)
+
+    def make_results(self, i_hits, i_misses, d_hits, d_misses):
         # Return hits and misses along with AMAT
         i_miss_rate = i_misses / (i_hits + i_misses) if (i_hits + i_misses) > 0 else 0  # calc miss rate for i-cache
         d_miss_rate = d_misses / (d_hits + d_misses) if (d_hits + d_misses) > 0 else 0  # calc miss rate for d-cache
@@ -115,37 +151,109 @@ class CacheSimulation:
 
         return (i_hits, i_misses, d_hits, d_misses, i_hit_rate, d_hit_rate, i_amat, d_amat)
 
-    def run_simulation(self, trace_name):
-        # Run sims and write to CSV
+    def sweep_trace(self, associativities, trace_lines):
+        """ Gets the simulate_trace results for every associativity from one pass (StackDistance).
+            Writes still allocate and update LRU, but always count as data misses.
+        """
+        sweep = sweep_associativities(trace_lines, self.total_size_bytes, self.block_size_bytes, associativities, write_through=True)
+        results = {}
+        for assoc in associativities:
+            (read_hits, read_misses), (write_hits, write_misses), (i_hits, i_misses) = sweep[assoc]
+            d_hits, d_misses = read_hits, read_misses + write_hits + write_misses
+
+            results[assoc] = self.make_results(i_hits, i_misses, d_hits, d_misses)
+        return results
+
+    def run_simulation(self, trace_name, engine='dict', trace_lines=None, store=None, policy='lru'):
+        # Run sims and write to CSV, engine='stack' does every associativity in one pass,
+        # engine='array' replays with the compact ArrayWriteThroughCache, engine='lru' with the O(1) LRUWriteThroughCache,
+        # engine='decoded' replays block numbers decoded once per trace (shared with the WT/WB sweep of the same trace),
+        # engine='runs' collapses same-block runs once and replays one record per run
+        # trace_lines can be any re-iterable of (reference_type, address), e.g. a TraceStream,
+        # or a Pipeline.PipelinedTrace to read ahead on a background thread
+        # store is an optional ResultStore, only the associativities it doesn't have yet get simulated
+        # policy picks the replacement policy (Replacement.POLICIES), anything but 'lru' replays with
+        # Replacement.policy_cache(policy, write_through=True), needs engine='dict' and writes WTResults/<trace>_wt_<policy>.csv
         associativities = [1, 2, 4, 8, 16, 32]
         trace_file_path = f"traces/{trace_name}.trace"
         csv_filename = f"WTResults/{trace_name}_wt.csv"
+        cache_class = CACHE_CLASSES.get(engine)
+        if policy != 'lru':
+            if engine != 'dict':
+                raise ValueError(f"engine {engine!r} is LRU only, use engine='dict' for the {policy!r} policy")
+            cache_class = policy_cache(policy, write_through=True)
+            csv_filename = f"WTResults/{trace_name}_wt_{policy}.csv"
+
+        if trace_lines is None:
+            trace_lines = load_trace(trace_file_path)  # Cached binary conversion, parsed once
+
+        keys, stored = {}, {}
+        trace_sha256 = getattr(trace_lines, 'source_sha256', None)
+        if store is not None and trace_sha256 is not None:
+            for assoc in associativities:
+                keys[assoc] = store.fields(trace_sha256, 'wt', self.total_size_bytes, self.block_size_bytes, assoc, self.H, self.M, engine,
+                                           policy)
+                row = store.get(keys[assoc])
+                if row is not None:
+                    stored[assoc] = row
+        missing = [assoc for assoc in associativities if assoc not in stored]
+
+        if missing:  # Shared set-up for the associativities that still need simulating
+            if engine == 'stack':
+                sweep = self.sweep_trace(missing, trace_lines)
+            elif engine == 'decoded':
+                decoded = decode_trace(trace_lines, self.block_size_bytes)
+            elif engine == 'runs':
+                collapsed = collapse_runs(trace_lines, self.block_size_bytes)
 
         with open(csv_filename, 'w', newline='') as csvfile:
-            fieldnames = ['Assoc.', 'L1I accesses', 'L1I misses', 'L1D accesses', 'L1D misses', 'L1I hit rate',
-                          'L1D hit rate', 'L1I AMAT', 'L1D AMAT']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
             writer.writeheader()
 
             for assoc in associativities:
-                i_hits, i_misses, d_hits, d_misses, i_hit_rate, d_hit_rate, i_amat, d_amat = self.simulate_trace(assoc, trace_lines)
-
-                writer.writerow({
-                    'Assoc.': assoc,
-                    'L1I accesses': i_hits,
-                    'L1I misses': i_misses,
-                    'L1D accesses': d_hits,
-                    'L1D misses': d_misses,
-                    'L1I hit rate': f"{i_hit_rate:.4f}",
-                    'L1D hit rate': f"{d_hit_rate:.4f}",
-                    'L1I AMAT': f"{i_amat:.2f}",
-                    'L1D AMAT': f"{d_amat:.2f}"
-                })
+                if assoc in stored:
+                    writer.writerow(stored[assoc])
+                    continue
+
+                if engine == 'stack':
+                    results = sweep[assoc]
+                elif engine == 'decoded':
+                    results = self.make_results(*simulate_decoded(decoded, self.total_size_bytes, assoc, WriteThroughCache))
+                elif engine == 'runs':
+                    results = self.make_results(*simulate_runs(collapsed, self.total_size_bytes, assoc, WriteThroughCache))
+                elif cache_class is not None:
+                    results = self.simulate_trace(assoc, trace_lines, cache_class)
+                else:
+                    raise ValueError(f"Unknown engine {engine!r}")
+
+                row = make_row(assoc, results, policy)
+                if assoc in keys:
+                    store.put(keys[assoc], row)
+                writer.writerow(row)
 
         print(f"Results have been written to {csv_filename}")
+        if hasattr(trace_lines, 'stall_report'):  # PipelinedTrace
+            print(trace_lines.stall_report())
         return csv_filename
 
 
+def make_row(assoc, results, policy='lru'):
+    # Formats a simulate_trace result tuple as a WTResults CSV row
+    i_hits, i_misses, d_hits, d_misses, i_hit_rate, d_hit_rate, i_amat, d_amat = results
+    return {
+        'Assoc.': assoc,
+        'L1I accesses': i_hits,
+        'L1I misses': i_misses,
+        'L1D accesses': d_hits,
+        'L1D misses': d_misses,
+        'L1I hit rate': f"{i_hit_rate:.4f}",
+        'L1D hit rate': f"{d_hit_rate:.4f}",
+        'L1I AMAT': f"{i_amat:.2f}",
+        'L1D AMAT': f"{d_amat:.2f}",
+        'Replacement': policy
+    }
+
+
 def read_trace_file(file_path):
     """ Reads a trace file and returns a list of (reference_type, address) tuples. """
     trace_lines = []
@@ -160,7 +268,8 @@ def read_trace_file(file_path):
     return trace_lines
 
 
-filename = 'spice'  # Write 'cc', 'spice', or 'tex' here to change trace
-trace_lines = read_trace_file(f"traces/{filename}.trace")
-simulation = CacheSimulation()
-csv_file = simulation.run_simulation(filename)
+if __name__ == '__main__':
+    filename = 'spice'  # Write 'cc', 'spice', or 'tex' here to change trace
+    simulation = CacheSimulation()
+    csv_file = simulation.run_simulation(filename)
+
@@ -0,0 +1,80 @@
+import pytest
+
+import Benchmark
+import Checkpoint
+import WriteBack
+import WriteThrough
+from TraceFormat import load_trace
+from TraceStream import TraceStream
+
+TRACE = Benchmark.mixed_trace(12000, seed=11)
+
+
+def _interrupt_after(monkeypatch, regions):
+    # Makes run_region raise once it has completed `regions` regions, like a run killed between checkpoints
+    run_region = Checkpoint.run_region
+    calls = []
+
+    def interrupted(*args):
+        if len(calls) == regions:
+            raise KeyboardInterrupt
+        calls.append(None)
+        return run_region(*args)
+    monkeypatch.setattr(Checkpoint, 'run_region', interrupted)
+
+
+@pytest.mark.parametrize('cache_class', [WriteBack.WriteBackCache, WriteThrough.WriteThroughCache])
+def test_resume_matches_an_uninterrupted_run(tmp_path, monkeypatch, cache_class):
+    checkpoint_path = str(tmp_path / 'run.ckpt')
+    with monkeypatch.context() as patch:
+        _interrupt_after(patch, 2)
+        with pytest.raises(KeyboardInterrupt):
+            Checkpoint.simulate_checkpointed(TRACE, 1024, 32, 4, checkpoint_path, 5000, cache_class)
+    _, offset, _, _, finished = Checkpoint.load_checkpoint(checkpoint_path)
+    assert (offset, finished) == (10000, False)
+
+    resumed = Checkpoint.simulate_checkpointed(TRACE, 1024, 32, 4, checkpoint_path, 5000, cache_class)
+    assert resumed == tuple(WriteBack.simulate_assoc(TRACE, 1024, 32, 4, cache_class))
+    assert Checkpoint.load_checkpoint(checkpoint_path)[4]
+
+
+def test_resume_from_a_binary_trace(tmp_path, monkeypatch):
+    text_path = str(tmp_path / 'mixed.trace')
+    Benchmark.write_trace(text_path, TRACE)
+    checkpoint_path = str(tmp_path / 'run.ckpt')
+    with load_trace(text_path) as trace:
+        with monkeypatch.context() as patch:
+            _interrupt_after(patch, 1)
+            with pytest.raises(KeyboardInterrupt):
+                Checkpoint.simulate_checkpointed(trace, 1024, 32, 2, checkpoint_path, 4000)
+        assert Checkpoint.simulate_checkpointed(trace, 1024, 32, 2, checkpoint_path, 4000) == WriteBack.simulate_assoc(TRACE, 1024, 32, 2)
+
+
+def test_refuses_other_traces_configs_and_finished_runs(tmp_path, monkeypatch):
+    checkpoint_path = str(tmp_path / 'run.ckpt')
+    with monkeypatch.context() as patch:
+        _interrupt_after(patch, 1)
+        with pytest.raises(KeyboardInterrupt):
+            Checkpoint.simulate_checkpointed(TRACE, 1024, 32, 4, checkpoint_path, 5000)
+
+    with pytest.raises(ValueError, match='different trace'):
+        Checkpoint.simulate_checkpointed(Benchmark.mixed_trace(12000, seed=12), 1024, 32, 4, checkpoint_path, 5000)
+    with pytest.raises(ValueError, match='different cache config'):
+        Checkpoint.simulate_checkpointed(TRACE, 1024, 32, 8, checkpoint_path, 5000)
+    stream_path = str(tmp_path / 'mixed.trace')
+    Benchmark.write_trace(stream_path, TRACE)
+    with pytest.raises(ValueError, match='no digest'):
+        Checkpoint.simulate_checkpointed(TraceStream(stream_path), 1024, 32, 4, checkpoint_path, 5000)
+
+    Checkpoint.simulate_checkpointed(TRACE, 1024, 32, 4, checkpoint_path, 5000)
+    with pytest.raises(ValueError, match='already finished'):
+        Checkpoint.simulate_checkpointed(TRACE, 1024, 32, 4, checkpoint_path, 5000)
+
+
+def test_warm_start_continues_from_the_checkpoint(tmp_path):
+    checkpoint_path = str(tmp_path / 'warm.ckpt')
+    Checkpoint.simulate_checkpointed(TRACE[:8000], 1024, 32, 4, checkpoint_path, 8000)
+    full = WriteBack.simulate_assoc(TRACE, 1024, 32, 4)
+    warm_up = WriteBack.simulate_assoc(TRACE[:8000], 1024, 32, 4)
+    region = Checkpoint.simulate_warm(checkpoint_path, TRACE)
+    assert tuple(a + b for a, b in zip(warm_up, region)) == tuple(full)
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import Benchmark
+from TraceFormat import BinaryTrace, convert_trace, file_digest, is_current, load_trace, write_binary_trace
+from WriteBack import read_trace_file
+
+
+@pytest.fixture
+def text_trace(tmp_path):
+    # A small mixed trace with a blank line and a malformed one, which every reader skips
+    path = tmp_path / 'mixed.trace'
+    Benchmark.write_trace(path, Benchmark.mixed_trace(5000, seed=3))
+    with open(path, 'a') as file:
+        file.write("\n0 1f 2\n2 400\n")
+    return str(path)
+
+
+def test_binary_round_trip(text_trace):
+    expected = read_trace_file(text_trace)
+    with BinaryTrace(convert_trace(text_trace)) as trace:
+        assert len(trace) == len(expected)
+        assert list(trace) == expected
+        assert trace.source_sha256 == file_digest(text_trace)
+
+
+def test_load_trace_reuses_and_refreshes_the_conversion(text_trace):
+    load_trace(text_trace).close()
+    binary_path = text_trace + '.bin'
+    assert is_current(text_trace, binary_path)
+    converted = os.stat(binary_path).st_ino  # A new conversion is renamed into place, so it'd be a new file
+
+    # Touching the text trace doesn't change its contents, so the conversion is kept
+    os.utime(text_trace)
+    with load_trace(text_trace) as trace:
+        assert list(trace) == read_trace_file(text_trace)
+    assert os.stat(binary_path).st_ino == converted
+
+    with open(text_trace, 'a') as file:
+        file.write("1 abc\n")
+    assert not is_current(text_trace, binary_path)
+    with load_trace(text_trace) as trace:
+        assert list(trace)[-1] == (1, 0xabc)
+
+
+def test_write_binary_trace_round_trip(tmp_path):
+    trace_lines = Benchmark.random_trace(3000, seed=5)
+    ops = [reference_type for reference_type, _ in trace_lines]
+    addresses = [address for _, address in trace_lines]
+    digest = bytes(range(32))
+    with BinaryTrace(write_binary_trace(str(tmp_path / 'stream.bin'), ops, addresses, digest)) as trace:
+        assert list(trace) == trace_lines
+        assert trace.source_sha256 == digest
+
+
+def test_corrupt_binary_trace_fails_its_checksum(text_trace):
+    binary_path = convert_trace(text_trace)
+    with open(binary_path, 'r+b') as file:
+        file.seek(-1, os.SEEK_END)
+        last = file.read(1)
+        file.seek(-1, os.SEEK_END)
+        file.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match='checksum'):
+        BinaryTrace(binary_path)
@@ -0,0 +1,37 @@
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+import Benchmark
+from TraceStream import TraceStream
+from WriteBack import read_trace_file
+
+
+@pytest.fixture
+def text_trace(tmp_path):
+    path = tmp_path / 'zipf.trace'
+    Benchmark.write_trace(path, Benchmark.zipf_trace(5000, seed=7))
+    with open(path, 'a') as file:
+        file.write("bad line here\n2 1c")  # Malformed line, and a last line without its newline
+    return path
+
+
+@pytest.mark.parametrize('opener', [open, gzip.open, bz2.open, lzma.open], ids=['plain', 'gzip', 'bz2', 'xz'])
+def test_round_trip(text_trace, tmp_path, opener):
+    expected = read_trace_file(text_trace)
+    path = tmp_path / 'copy.trace'
+    with opener(path, 'wb') as out:
+        out.write(text_trace.read_bytes())
+    stream = TraceStream(str(path), batch_bytes=4096)  # Small batches, so lines get split across reads
+    assert list(stream) == expected
+    assert list(stream) == expected  # Re-iterable, every pass re-opens the file
+
+
+def test_batches_cover_the_trace(text_trace):
+    batches = list(TraceStream(str(text_trace), batch_bytes=1000).batches())
+    assert len(batches) > 1
+    ops = [reference_type for batch_ops, _ in batches for reference_type in batch_ops]
+    addresses = [address for _, batch_addresses in batches for address in batch_addresses]
+    assert list(zip(ops, addresses)) == read_trace_file(text_trace)
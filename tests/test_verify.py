@@ -0,0 +1,102 @@
+import csv
+
+import pytest
+
+import Benchmark
+import Verify
+
+TRACES = {name: Benchmark.GENERATORS[name](20000, seed=429) for name in ('mixed', 'zipf', 'strided')}
+
+# The original WriteBack/WriteThrough scripts' counts on mixed_trace(20000, seed=429) at 1 KiB / 32 B,
+# (i_hits, i_misses, d_hits, d_misses); every engine is checked against these through the reference caches
+PINNED_COUNTS = {
+    'wb': {1: (11795, 3225, 1759, 3221), 4: (11792, 3228, 1516, 3464), 32: (11791, 3229, 1482, 3498)},
+    'wt': {1: (11795, 3225, 1108, 3872), 4: (11792, 3228, 966, 4014), 32: (11791, 3229, 943, 4037)},
+}
+
+
+def _mismatches(reports):
+    return [(report['engine'], report['assoc'], report.get('first_mismatch') or (report.get('expected'), report.get('actual')))
+            for report in reports if not report['match']]
+
+
+@pytest.mark.parametrize('kind', ['wb', 'wt'])
+def test_reference_counts_are_pinned(kind):
+    for assoc, counts in PINNED_COUNTS[kind].items():
+        assert tuple(Verify.reference_counts(TRACES['mixed'], kind, 1024, 32, assoc)) == counts
+
+
+@pytest.mark.parametrize('trace_name', sorted(TRACES))
+@pytest.mark.parametrize('kind', ['wb', 'wt'])
+def test_check_decisions(kind, trace_name):
+    reports = []
+    for engine in Verify.CANDIDATE_CLASSES[kind]:
+        reports += Verify.check_decisions(TRACES[trace_name], kind, engine)
+    assert len(reports) == len(Verify.CANDIDATE_CLASSES[kind]) * len(Verify.ASSOCIATIVITIES)
+    assert _mismatches(reports) == []
+
+
+@pytest.mark.parametrize('trace_name', sorted(TRACES))
+@pytest.mark.parametrize('kind', ['wb', 'wt'])
+def test_check_counters(kind, trace_name):
+    reports = Verify.check_counters(TRACES[trace_name], kind)
+    assert {report['engine'] for report in reports} == {'stack', 'decoded', 'lockstep', 'runs'}
+    assert _mismatches(reports) == []
+
+
+@pytest.mark.parametrize('kind', ['wb', 'wt'])
+def test_check_partition(kind):
+    assert _mismatches(Verify.check_partition(TRACES['mixed'], kind)) == []
+
+
+def test_partition_refuses_lru():
+    with pytest.raises(ValueError, match="can't be simulated apart"):
+        Verify.check_partition(TRACES['mixed'], 'wb', policy='lru')
+
+
+def test_check_sampling():
+    assert _mismatches(Verify.check_sampling(TRACES['mixed'])) == []
+
+
+def test_diff_csv_reports_changed_cells(tmp_path):
+    rows = Verify.reference_rows(TRACES['mixed'], 'wt', associativities=[1, 4, 32])
+    fieldnames = ['Assoc.', 'L1I accesses', 'L1I misses', 'L1D accesses', 'L1D misses', 'L1I hit rate', 'L1D hit rate',
+                  'L1I AMAT', 'L1D AMAT']  # The checked-in WTResults layout
+
+    def write(checked_in):
+        with open(tmp_path / 'mixed_wt.csv', 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(checked_in)
+        return tmp_path / 'mixed_wt.csv'
+
+    assert Verify.diff_csv(write(rows), rows) == []
+    changed = [dict(row) for row in rows]
+    changed[1]['L1I misses'] = 1
+    assert Verify.diff_csv(write(changed), rows) == [(2, 'L1I misses', '1', str(rows[1]['L1I misses']))]
+
+
+def test_verify_trace_fails_on_a_differing_csv(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for directory in ('traces', 'WBResults', 'WTResults', 'Pt5Results'):
+        (tmp_path / directory).mkdir()
+    trace_lines = Benchmark.mixed_trace(3000, seed=1)
+    Benchmark.write_trace(tmp_path / 'traces' / 'tiny.trace', trace_lines)
+    checked_in = {'WBResults/tiny_wb.csv': 'wb', 'WTResults/tiny_wt.csv': 'wt', 'Pt5Results/tiny_wb5.csv': 'wb5'}
+    for csv_filename, kind in checked_in.items():
+        rows = Verify.reference_rows(trace_lines, kind)
+        with open(csv_filename, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    assert Verify.verify_trace('tiny')
+
+    with open('WTResults/tiny_wt.csv', newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    rows[0]['L1D misses'] = '0'
+    with open('WTResults/tiny_wt.csv', 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    assert not Verify.verify_trace('tiny')
+    assert Verify.verify_trace('tiny', csv_diff=False)